@@ -0,0 +1,118 @@
+"""
+Benchmark: throughput and turn latency of the AI path under concurrent sessions
+
+Drives N StorySessions in parallel for T turns each through a single pooled
+AIClient. By default an in-process mock Gemini server (mock_gemini.py) is
+started, so the benchmark runs offline and is reproducible with --seed;
+--base-url points it at another server instead.
+
+Usage:
+    python benchmarks/bench_ai_load.py [--sessions 20] [--turns 5] [--latency 0.2] [--rate-429 0.05]
+    python benchmarks/bench_ai_load.py --base-url http://127.0.0.1:8090/v1beta
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gemini import add_mock_arguments, mock_from_args
+from src.core.story_session import StorySession
+from src.services.ai_service import AIClient
+
+SYSTEM_PROMPT = "Tu es le narrateur d'une aventure. Termine chaque réponse par 4 choix numérotés."
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def play_session(ai, turns, rng, latencies, stats, structured_output=False):
+    session = StorySession(ai, structured_output=structured_output)
+    session.engine.add_system_message(SYSTEM_PROMPT)
+    user_input = "Commence l'aventure."
+
+    def on_retry(_retries_left):
+        stats["format_retries"] += 1
+
+    for _ in range(turns):
+        start = time.perf_counter()
+        try:
+            _, choices = await session.play_turn(user_input, on_retry=on_retry)
+        except Exception:
+            stats["errors"] += 1
+            break
+        latencies.append(time.perf_counter() - start)
+        if not choices:
+            stats["failed_turns"] += 1
+            break
+        stats["turns"] += 1
+        user_input = rng.choice(choices)
+    session.cancel_background_tasks()
+    for path, count in session.repair_stats.items():
+        stats["repairs"][path] = stats["repairs"].get(path, 0) + count
+
+
+async def run(args):
+    runner = mock = None
+    base_url = args.base_url
+    if not base_url:
+        mock = mock_from_args(args)
+        runner = await mock.start(port=args.mock_port)
+        base_url = f"http://127.0.0.1:{args.mock_port}/v1beta"
+        os.environ.setdefault("GEMINI_API_KEY", "mock")
+
+    latencies = []
+    stats = {"turns": 0, "format_retries": 0, "failed_turns": 0, "errors": 0, "repairs": {}}
+    rng = random.Random(args.seed)
+    try:
+        async with AIClient(base_url=base_url, pool_limit=args.sessions, pool_limit_per_host=args.sessions) as ai:
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                play_session(ai, args.turns, random.Random(rng.random()), latencies, stats, args.structured_output)
+                for _ in range(args.sessions)
+            ))
+            elapsed = time.perf_counter() - started
+    finally:
+        if runner:
+            await runner.cleanup()
+
+    print(f"{args.sessions} sessions x {args.turns} turns against {base_url}")
+    print(f"  completed turns   {stats['turns']} in {elapsed:.2f}s ({stats['turns'] / elapsed:.2f} turns/s)")
+    if latencies:
+        print(f"  turn latency      p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.0f} ms, p99 {percentile(latencies, 99) * 1000:.0f} ms, "
+              f"mean {statistics.mean(latencies) * 1000:.0f} ms")
+    print(f"  AI requests       {ai.request_count} ({ai.retry_count} HTTP retries: {ai.retries_by_class})")
+    print(f"  scheduler         {ai.scheduler.stats()}")
+    print(f"  circuit breaker   {ai.circuit_breaker.state}, tripped {ai.circuit_breaker.trips} time(s)")
+    print(f"  format retries    {stats['format_retries']}, failed turns {stats['failed_turns']}, errors {stats['errors']}")
+    print(f"  repair paths      {stats['repairs']}")
+    if mock:
+        print(f"  mock server       {mock.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--base-url", default="", help="use this server instead of the in-process mock")
+    parser.add_argument("--mock-port", type=int, default=8091, help="port of the in-process mock")
+    parser.add_argument("--structured-output", action="store_true", help="request JSON {narrative, choices} responses")
+    parser.add_argument("--verbose", action="store_true", help="show the client's warnings and errors")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
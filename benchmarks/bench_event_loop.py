@@ -0,0 +1,123 @@
+"""
+Benchmark: idle CPU and callback latency of the Tk/asyncio integrations
+
+Compares the legacy polling loop (update() + asyncio.sleep(0.01)) with the
+event-driven TkAsyncioBridge. Latency is measured from a completion signalled
+by another thread (as aiohttp's socket would) until a Tk callback runs.
+Without a display, a bare Tcl interpreter is used instead of a Tk window;
+both modes then pump the same Tcl event loop.
+
+Usage:
+    python benchmarks/bench_event_loop.py [--idle 3] [--samples 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import tkinter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ui.event_loop import TkAsyncioBridge
+
+
+def make_root():
+    try:
+        root = tkinter.Tk()
+        root.withdraw()
+        return root, True
+    except tkinter.TclError:
+        return tkinter.Tcl(), False
+
+
+async def measure(root, loop, idle_seconds, samples):
+    """Idle CPU over a quiet period, then latency from a network-style
+    completion on another thread until a Tk callback reacts to it."""
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+    latencies = []
+    for _ in range(samples):
+        future = loop.create_future()
+        sent_at = []
+
+        def complete():
+            time.sleep(0.005)
+            sent_at.append(time.perf_counter())
+            loop.call_soon_threadsafe(future.set_result, None)
+
+        threading.Thread(target=complete).start()
+        await future
+
+        # Comme une mise à jour de l'UI après une réponse réseau
+        rendered = loop.create_future()
+
+        def render():
+            latencies.append((time.perf_counter() - sent_at[0]) * 1000)
+            loop.call_soon_threadsafe(rendered.set_result, None)
+
+        root.after_idle(render)
+        await rendered
+    return idle_cpu, latencies
+
+
+def run_poll(idle_seconds, samples):
+    root, _ = make_root()
+    loop = asyncio.new_event_loop()
+    result = {}
+
+    async def main():
+        task = loop.create_task(measure(root, loop, idle_seconds, samples))
+        while not task.done():
+            root.update()
+            await asyncio.sleep(0.01)
+        result["value"] = task.result()
+
+    loop.run_until_complete(main())
+    loop.close()
+    return result["value"]
+
+
+def run_event(idle_seconds, samples):
+    root, _ = make_root()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bridge = TkAsyncioBridge(root, loop)
+    bridge.start()
+    task = loop.create_task(measure(root, loop, idle_seconds, samples))
+    bridge.wake()
+    while not task.done():
+        root.tk.dooneevent(0)
+    bridge.stop()
+    loop.close()
+    return task.result()
+
+
+def report(name, idle_cpu, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<6} idle CPU {idle_cpu:6.2%}   callback latency "
+          f"mean {statistics.mean(latencies):6.2f} ms  p95 {p95:6.2f} ms  max {latencies[-1]:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds of idle time to measure CPU over")
+    parser.add_argument("--samples", type=int, default=50, help="number of cross-thread wake-ups")
+    args = parser.parse_args()
+
+    _, has_display = make_root()
+    print(f"Tk display: {'yes' if has_display else 'no (bare Tcl interpreter)'}")
+    report("poll", *run_poll(args.idle, args.samples))
+    if TkAsyncioBridge.is_supported(tkinter.Tcl(), asyncio.new_event_loop()):
+        report("event", *run_event(args.idle, args.samples))
+    else:
+        print("event  not supported on this platform (no Tk file handlers)")
+
+
+if __name__ == "__main__":
+    main()
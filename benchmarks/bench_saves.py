@@ -0,0 +1,83 @@
+"""
+Benchmark: size and load time of JSON vs compressed binary (.isave) saves
+
+Builds a synthetic story of T turns, writes it in both formats, then measures
+how long it takes to open each save and prepare the first turn after loading
+(context window + the narratives shown on screen), and how many messages the
+binary save had to decode for it.
+
+Usage:
+    python benchmarks/bench_saves.py [--turns 1000 10000] [--words 120]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.engine import GameEngine
+from src.services import data_service as dm
+from src.services.save_codec import write_save
+from src.services.save_journal import SaveJournal
+
+WORDS = "le héros avance dans la forêt sombre où un dragon ancien garde un trésor oublié depuis des siècles".split()
+RENDERED_TURNS = 30
+
+
+def build_story(turns, words, rng):
+    story_log = [{"role": "system", "content": "Tu es le narrateur d'une aventure."}]
+    for turn in range(turns):
+        story_log.append({"role": "user", "content": f"Choix {turn}"})
+        narrative = " ".join(rng.choice(WORDS) for _ in range(words))
+        story_log.append({"role": "assistant", "content": f"{narrative}\n\n1. Avancer\n2. Fuir\n3. Parler\n4. Attendre"})
+    return {"story_log": story_log, "hero_name": "Tim", "world_state": {"lieu": "forêt"},
+            "synopsis": "", "summary_upto": 0, "metadata": {"universe": "Fantasy Classique"}}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def first_turn(save_data):
+    engine = GameEngine()
+    engine.load_game_state(save_data)
+    engine.build_request_messages()
+    engine.get_narratives(limit=RENDERED_TURNS)
+
+
+def bench(turns, words, directory):
+    save_data = build_story(turns, words, random.Random(turns))
+    json_path = os.path.join(directory, f"bench_{turns}.json")
+    binary_path = os.path.join(directory, f"bench_{turns}.isave")
+    _, json_write = timed(lambda: dm.atomic_write_json(json_path, save_data))
+    _, binary_write = timed(lambda: write_save(binary_path, save_data))
+
+    print(f"{turns} turns ({len(save_data['story_log'])} messages)")
+    for label, path, write_ms in (("json", json_path, json_write), ("isave", binary_path, binary_write)):
+        loaded, open_ms = timed(lambda: SaveJournal.read(path))
+        _, first_ms = timed(lambda: first_turn(loaded))
+        story_log = loaded["story_log"]
+        decoded = getattr(story_log, "loaded_count", len(story_log))
+        print(f"  {label:6} {os.path.getsize(path) / 1024:9.0f} KiB   write {write_ms:7.1f} ms   "
+              f"open {open_ms:7.1f} ms   first turn {first_ms:6.1f} ms   decoded {decoded} messages")
+        if hasattr(story_log, "close"):
+            story_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[1000, 10000], help="story lengths to measure")
+    parser.add_argument("--words", type=int, default=120, help="words per narrative")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        for turns in args.turns:
+            bench(turns, args.words, directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: memory and request-build time of the story log at 1k/10k turns
+
+Compares the previous representation (a list of {"role", "content"} dicts,
+whose Gemini payload was rebuilt and fully serialized on every request) with
+StoryLog (slotted messages whose serialized `contents` entries are cached).
+Request build covers packing the context window, building the payload and
+encoding the request body, measured over consecutive turns so the cache
+behaves as in a game. --full-context sends the whole history, as a
+single-request-per-turn worst case. Memory is the size of the log structure
+right after loading; message texts are shared by both and not counted.
+
+Usage:
+    python benchmarks/bench_story_log.py [--turns 1000 10000] [--requests 50] [--full-context]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.context_window import ContextWindow
+from src.core.story_log import StoryLog
+from src.services.ai_service import AIClient, encode_payload
+
+WORDS = "le héros avance dans la forêt sombre où un dragon ancien garde un trésor oublié depuis des siècles".split()
+
+
+def build_messages(turns, words, rng):
+    messages = [{"role": "system", "content": "Tu es le narrateur d'une aventure."}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Choix {turn}"})
+        narrative = " ".join(rng.choice(WORDS) for _ in range(words))
+        messages.append({"role": "assistant", "content": f"{narrative}\n\n1. Avancer\n2. Fuir\n3. Parler\n4. Attendre"})
+    return messages
+
+
+def measure_memory(make):
+    gc.collect()
+    tracemalloc.start()
+    log = make()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return log, size
+
+
+def previous_body(messages, generation_config):
+    """Request body as built before StoryLog: new dicts and a full json.dumps per request"""
+    contents = [
+        {"role": "user" if m.get("role") in ["system", "user"] else "model", "parts": [{"text": m["content"]}]}
+        for m in messages
+    ]
+    return json.dumps({"contents": contents, "generationConfig": generation_config}, ensure_ascii=False).encode("utf-8")
+
+
+def measure_requests(log, build_body, requests, window):
+    timings = []
+    for turn in range(requests):
+        log.append({"role": "user", "content": f"Nouveau choix {turn}"})
+        start = time.perf_counter()
+        build_body(window.pack(log))
+        timings.append((time.perf_counter() - start) * 1000)
+        log.append({"role": "assistant", "content": f"Suite {turn}\n\n1. a\n2. b\n3. c\n4. d"})
+    return statistics.median(timings), max(timings)
+
+
+def bench(turns, words, requests, full_context):
+    messages = build_messages(turns, words, random.Random(turns))
+    generation_config = {"temperature": 0.8, "maxOutputTokens": 8192}
+    client = AIClient.__new__(AIClient)
+    budget = 10 ** 9 if full_context else 12000
+
+    dict_log, dict_bytes = measure_memory(lambda: [dict(m) for m in messages])
+    story_log, story_bytes = measure_memory(lambda: StoryLog(messages))
+    dict_median, dict_max = measure_requests(
+        dict_log, lambda packed: previous_body(packed, generation_config), requests, ContextWindow(budget))
+    story_median, story_max = measure_requests(
+        story_log, lambda packed: encode_payload(client._build_payload(packed)), requests, ContextWindow(budget))
+
+    print(f"{turns} turns ({len(messages)} messages){', full context' if full_context else ''}")
+    print(f"  dict list  {dict_bytes / 1024:9.0f} KiB   request build p50 {dict_median:7.2f} ms, max {dict_max:7.2f} ms")
+    print(f"  StoryLog   {story_bytes / 1024:9.0f} KiB   request build p50 {story_median:7.2f} ms, max {story_max:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[1000, 10000], help="story lengths to measure")
+    parser.add_argument("--words", type=int, default=120, help="words per narrative")
+    parser.add_argument("--requests", type=int, default=50, help="consecutive requests measured")
+    parser.add_argument("--full-context", action="store_true", help="send the whole history instead of a 12k-token window")
+    args = parser.parse_args()
+    for turns in args.turns:
+        bench(turns, args.words, args.requests, args.full_context)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Local stand-in for the Gemini API, for benchmarks and offline development
+
+Serves generateContent and streamGenerateContent (SSE) with valid
+`candidates` responses and usageMetadata. Latency, token throughput and
+failure modes (SAFETY / MAX_TOKENS finish reasons, 429s, malformed payloads,
+responses without choices) are tunable.
+
+Usage:
+    python benchmarks/mock_gemini.py --port 8090 --latency 0.3 --tokens-per-second 200 --rate-429 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8090/v1beta GEMINI_API_KEY=mock python run_game.py
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+WORDS = (
+    "le vent souffle sur la lande tandis que les torches vacillent dans la nuit "
+    "une silhouette approche lentement du campement et murmure un nom oublié"
+).split()
+
+
+class MockGeminiServer:
+    """Configurable fake Gemini endpoint"""
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0.0, output_tokens: int = 300,
+                 rate_429: float = 0.0, retry_after: float = 1.0, rate_safety: float = 0.0,
+                 rate_max_tokens: float = 0.0, rate_malformed: float = 0.0, rate_bad_format: float = 0.0,
+                 seed: int | None = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_safety = rate_safety
+        self.rate_max_tokens = rate_max_tokens
+        self.rate_malformed = rate_malformed
+        self.rate_bad_format = rate_bad_format
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "safety": 0, "max_tokens": 0, "malformed": 0, "bad_format": 0}
+
+        self.app = web.Application()
+        self.app.router.add_post("/v1beta/models/{model_method}", self.handle)
+
+    def _story(self, max_tokens: int, structured: bool = False) -> tuple:
+        """Narrative + 4 numbered choices, about `output_tokens` long (JSON when a responseSchema is set)"""
+        n_words = max(8, min(self.output_tokens, max_tokens) * 3 // 4)
+        narrative = " ".join(self.rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+        choices = [f"Option {i} : {self.rng.choice(WORDS)} {self.rng.choice(WORDS)}" for i in range(1, 5)]
+        if structured:
+            # Le schéma impose 4 choix : seul un texte tronqué peut encore être invalide
+            return json.dumps({"narrative": narrative, "choices": choices}, ensure_ascii=False), n_words + 24
+        if self.rng.random() < self.rate_bad_format:
+            self.stats["bad_format"] += 1
+            return narrative, n_words
+        numbered = "\n".join(f"{i}. {choice}" for i, choice in enumerate(choices, 1))
+        return f"{narrative}\n\n{numbered}", n_words + 24
+
+    @staticmethod
+    def _prompt_tokens(body: dict) -> int:
+        chars = sum(len(part.get("text", "")) for c in body.get("contents", []) for part in c.get("parts", []))
+        return max(1, chars // 4)
+
+    def _candidate(self, text: str, finish_reason: str | None) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        return candidate
+
+    def _usage(self, prompt_tokens: int, output_tokens: int) -> dict:
+        return {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        }
+
+    async def handle(self, request):
+        self.stats["requests"] += 1
+        model_method = request.match_info["model_method"]
+        body = await request.json()
+        await asyncio.sleep(self.latency)
+
+        if self.rng.random() < self.rate_429:
+            self.stats["429"] += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Resource has been exhausted (mock).", "status": "RESOURCE_EXHAUSTED"}},
+                status=429, headers={"Retry-After": str(self.retry_after)},
+            )
+
+        generation_config = body.get("generationConfig", {})
+        max_tokens = generation_config.get("maxOutputTokens", 8192)
+        text, output_tokens = self._story(max_tokens, generation_config.get("responseMimeType") == "application/json")
+        prompt_tokens = self._prompt_tokens(body)
+
+        finish_reason = "STOP"
+        roll = self.rng.random()
+        if roll < self.rate_safety:
+            self.stats["safety"] += 1
+            finish_reason = "SAFETY"
+        elif roll < self.rate_safety + self.rate_max_tokens:
+            self.stats["max_tokens"] += 1
+            finish_reason = "MAX_TOKENS"
+            text = text[: len(text) // 2]
+
+        malformed = self.rng.random() < self.rate_malformed
+        if malformed:
+            self.stats["malformed"] += 1
+
+        if model_method.endswith(":streamGenerateContent"):
+            return await self._stream(request, text, finish_reason, prompt_tokens, output_tokens, malformed)
+
+        if self.tokens_per_second:
+            await asyncio.sleep(output_tokens / self.tokens_per_second)
+        if malformed:
+            return web.Response(text=self.rng.choice(['{"candidates": [', '{"candidates": []}', '{"candidates": [{"content": {}}]}']),
+                                content_type="application/json")
+        if finish_reason == "STOP":
+            self.stats["ok"] += 1
+        return web.json_response({
+            "candidates": [self._candidate(text, finish_reason)],
+            "usageMetadata": self._usage(prompt_tokens, output_tokens),
+            "modelVersion": "mock",
+        })
+
+    async def _stream(self, request, text, finish_reason, prompt_tokens, output_tokens, malformed):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = text.split(" ")
+        chunk_words = 12
+        for start in range(0, len(words), chunk_words):
+            piece = " ".join(words[start:start + chunk_words])
+            if start + chunk_words < len(words):
+                piece += " "
+            if self.tokens_per_second:
+                await asyncio.sleep(chunk_words / self.tokens_per_second)
+            last = start + chunk_words >= len(words)
+            chunk = {"candidates": [self._candidate(piece, finish_reason if last else None)]}
+            if last:
+                chunk["usageMetadata"] = self._usage(prompt_tokens, output_tokens)
+            payload = "{\"candidates\": [" if malformed and last else json.dumps(chunk)
+            await response.write(f"data: {payload}\r\n\r\n".encode("utf-8"))
+        if finish_reason == "STOP" and not malformed:
+            self.stats["ok"] += 1
+        await response.write_eof()
+        return response
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8090) -> web.AppRunner:
+        """Serve in the running event loop; returns the runner to clean up"""
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="output throughput (0 = instant)")
+    parser.add_argument("--output-tokens", type=int, default=300, help="approximate length of each response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests rejected with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After header sent with 429s")
+    parser.add_argument("--rate-safety", type=float, default=0.0, help="fraction of SAFETY finish reasons")
+    parser.add_argument("--rate-max-tokens", type=float, default=0.0, help="fraction of MAX_TOKENS finish reasons")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="fraction of malformed payloads")
+    parser.add_argument("--rate-bad-format", type=float, default=0.0, help="fraction of stories without numbered choices")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+
+
+def mock_from_args(args) -> MockGeminiServer:
+    return MockGeminiServer(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+        rate_429=args.rate_429, retry_after=args.retry_after, rate_safety=args.rate_safety,
+        rate_max_tokens=args.rate_max_tokens, rate_malformed=args.rate_malformed,
+        rate_bad_format=args.rate_bad_format, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server = mock_from_args(args)
+    print(f"Mock Gemini listening on http://{args.host}:{args.port}/v1beta")
+    web.run_app(server.app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
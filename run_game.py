@@ -3,26 +3,104 @@ INFINITE STORY - Main Entry Point
 
 A text-based RPG adventure game with AI-powered storytelling.
 Modular architecture with clean separation of concerns.
+
+Usage:
+    python run_game.py
+    python run_game.py --headless --universe "Fantasy Classique" --style Classique --turns 10 --policy random
+    python run_game.py --serve --port 8080
 """
+import argparse
 import asyncio
 import logging
+import sys
+
+from dotenv import load_dotenv
+
+# Avant tout import de src : plusieurs modules lisent leurs réglages à l'import
+load_dotenv()
 
-from src.ui.main_window import RPGApp
 from src.utils.logger_config import setup_logging
 
 
+def positive_int(value: str) -> int:
+    """argparse type: an integer >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="INFINITE STORY")
+    parser.add_argument("--headless", action="store_true", help="play in the console, without the Tk window")
+    parser.add_argument("--universe", default="Fantasy Classique", help="universe name (preset or custom)")
+    parser.add_argument("--custom-universe", default="", help="free-form universe description, overrides --universe")
+    parser.add_argument("--style", default="Classique", help="narrative style name")
+    parser.add_argument("--hero", default="Tim", help="hero name")
+    parser.add_argument("--turns", type=positive_int, default=5, help="number of turns to play")
+    parser.add_argument("--policy", choices=("first", "random", "scripted"), default="first", help="how choices are picked")
+    parser.add_argument("--script", default="", help="comma-separated 1-based choice numbers for --policy scripted")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for --policy random")
+    parser.add_argument("--quiet", action="store_true", help="only print the final statistics")
+    parser.add_argument("--structured-output", action="store_true", help="request JSON {narrative, choices} responses (headless and server)")
+    parser.add_argument("--serve", action="store_true", help="run the multi-session HTTP/WebSocket game server")
+    parser.add_argument("--host", default="127.0.0.1", help="server bind address")
+    parser.add_argument("--port", type=int, default=8080, help="server port")
+    parser.add_argument("--max-concurrent-requests", type=int, default=32, help="server-wide limit of simultaneous AI requests")
+    parser.add_argument("--idle-timeout", type=float, default=900, help="seconds before an idle server session is moved to the save store")
+    return parser.parse_args()
+
+
+def run_headless(args):
+    """Headless entry point (no customtkinter needed)."""
+    from src.ui.headless import run_headless as play
+
+    script = [int(n) for n in args.script.split(",") if n.strip()]
+    return asyncio.run(play(
+        universe=args.universe,
+        style=args.style,
+        hero=args.hero,
+        turns=args.turns,
+        policy=args.policy,
+        script=script,
+        custom_universe_prompt=args.custom_universe,
+        seed=args.seed,
+        quiet=args.quiet,
+        structured_output=args.structured_output
+    ))
+
+
 def main():
     """Main application entry point."""
+    args = parse_args()
     setup_logging()
     logging.info("Starting INFINITE STORY application...")
-    
+
+    if args.headless:
+        try:
+            sys.exit(run_headless(args))
+        finally:
+            logging.info("Application shutdown complete.")
+
+    if args.serve:
+        from src.server.game_server import run_server
+
+        try:
+            run_server(args.host, args.port, args.max_concurrent_requests, args.idle_timeout,
+                       structured_output=args.structured_output)
+        finally:
+            logging.info("Application shutdown complete.")
+        return
+
     try:
+        from src.ui.main_window import RPGApp
+
         app = RPGApp()
-        asyncio.run(app.run())
+        app.run_forever()
     except KeyboardInterrupt:
         logging.info("Application terminated by user.")
     except Exception as e:
-        logging.critical(f"Critical error occurred: {e}", exc_info=True)
+        logging.critical("Critical error occurred: %s", e, exc_info=True)
         input("Press Enter to exit...")
     finally:
         logging.info("Application shutdown complete.")
@@ -0,0 +1,133 @@
+"""
+Choice parser - splits AI responses into narrative and choices in a single pass
+"""
+import json
+import logging
+import re
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Marqueur de choix ("1." "2)" "-" "*") suivi d'au moins un espace, puis le texte du choix
+CHOICE_LINE = re.compile(r"^\s*(?:\d+[.)]|[-*])\s(.*)$")
+
+# Schéma Gemini (responseSchema) du mode de sortie structurée
+STORY_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "narrative": {"type": "STRING"},
+        "choices": {"type": "ARRAY", "items": {"type": "STRING"}, "minItems": 4, "maxItems": 4},
+    },
+    "required": ["narrative", "choices"],
+    "propertyOrdering": ["narrative", "choices"],
+}
+
+
+def parse_choice_line(line: str) -> Optional[str]:
+    """Return the choice text if the line is a numbered or bulleted choice"""
+    match = CHOICE_LINE.match(line)
+    return match.group(1).strip() if match else None
+
+
+def split_story(text: str) -> Tuple[str, List[str]]:
+    """Split a plain-text response into (narrative, choices), one pass over its lines"""
+    choices, narrative = [], []
+    for line in text.strip().split("\n"):
+        match = CHOICE_LINE.match(line)
+        if match:
+            choices.append(match.group(1).strip())
+        else:
+            narrative.append(line)
+
+    if not choices and len(narrative) > 4:
+        choices = narrative[-4:]
+        narrative = narrative[:-4]
+        logging.warning("Used fallback choice extraction logic.")
+
+    logging.debug("Extracted %s choices and narrative part.", len(choices))
+    return "\n".join(narrative).strip(), choices
+
+
+def parse_structured(text: str) -> Optional[Tuple[str, List[str]]]:
+    """Decode a structured-output response ({narrative, choices}); None if it is not one"""
+    if not text.lstrip().startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("narrative"), str) or not isinstance(data.get("choices"), list):
+        return None
+    # Certains modèles numérotent quand même les choix
+    choices = [parse_choice_line(str(c)) or str(c).strip() for c in data["choices"] if str(c).strip()]
+    return data["narrative"].strip(), choices
+
+
+def truncated_narrative(text: str) -> str:
+    """Narrative part of a response cut off by the output token limit (plain text or partial JSON)"""
+    if text.lstrip().startswith("{"):
+        match = re.search(r'"narrative"\s*:\s*"((?:[^"\\]|\\.)*)', text)
+        if not match:
+            return ""
+        # Un échappement \uXXXX coupé en deux est abandonné
+        raw = re.sub(r"\\u[0-9a-fA-F]{0,3}$", "", match.group(1))
+        try:
+            return json.loads(f'"{raw}"').strip()
+        except ValueError:
+            return ""
+    # Les choix viennent après le récit : on s'arrête au premier, sans doute incomplet
+    narrative = []
+    for line in text.strip().split("\n"):
+        if CHOICE_LINE.match(line):
+            break
+        narrative.append(line)
+    return "\n".join(narrative).strip()
+
+
+def format_story(narrative: str, choices: List[str]) -> str:
+    """Canonical text form of a turn, as stored in the story log"""
+    numbered = "\n".join(f"{i}. {choice}" for i, choice in enumerate(choices, 1))
+    return f"{narrative}\n\n{numbered}" if numbered else narrative
+
+
+def normalize_response(text: str) -> str:
+    """Convert a structured-output response to the canonical text form; other text is returned as is"""
+    parsed = parse_structured(text)
+    return format_story(*parsed) if parsed is not None else text
+
+
+class ChoiceParser:
+    """Memoized parser for the messages of one story.
+
+    Results are cached per message content (bounded LRU), so rendering a loaded
+    transcript or re-reading the last turn never parses the same message twice.
+    The hero name is substituted before parsing, hence `clear()` when it changes.
+    """
+
+    def __init__(self, hero_name: str = "Tim", max_entries: int = 2048):
+        self.hero_name = hero_name
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+
+    def set_hero_name(self, hero_name: str):
+        self.hero_name = hero_name
+        self.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    def extract(self, text: str) -> Tuple[str, List[str]]:
+        """Parse without memoization"""
+        text = text.replace("{hero_name}", self.hero_name)
+        return parse_structured(text) or split_story(text)
+
+    def parse(self, content: str) -> Tuple[str, List[str]]:
+        """Memoized extract() for a message of the story log"""
+        parsed = self._cache.get(content)
+        if parsed is not None:
+            self._cache.move_to_end(content)
+            return parsed
+        parsed = self.extract(content)
+        self._cache[content] = parsed
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return parsed
@@ -0,0 +1,89 @@
+"""
+Token-budgeted context window - decides which messages are sent to the AI
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class ContextWindow:
+    """Packs the story history into a fixed token budget.
+
+    Leading system messages, pinned messages (world state) and the synopsis of
+    older turns are always kept; the world-state facts are limited to
+    `facts_ratio` of the budget (most recent first, see `select_facts`). The remaining budget is filled with the most
+    recent turns; older turns are evicted and counted in `evicted_count` so they can be
+    summarized. Messages are read by index, newest first, so a lazily loaded
+    story log only materializes the turns that fit.
+    """
+
+    def __init__(self, token_budget: int = 12000, facts_ratio: float = 0.15):
+        self.token_budget = token_budget
+        self.facts_ratio = facts_ratio
+        self.evicted_count = 0
+
+    def count(self, message: Dict) -> int:
+        """Token estimate for a message, cached on the message itself"""
+        tokens = message.get("tokens")
+        if tokens is None:
+            tokens = estimate_tokens(message["content"])
+            message["tokens"] = tokens
+        return tokens
+
+    def select_facts(self, facts: Dict[str, str]) -> List[str]:
+        """`key: value` lines of the most recent facts that fit the facts budget, oldest first"""
+        budget = int(self.token_budget * self.facts_ratio)
+        lines = []
+        # Les faits sont rangés du plus ancien au plus récent (mise à jour = déplacé à la fin)
+        for key, value in reversed(facts.items()):
+            line = f"{key}: {value}"
+            cost = estimate_tokens(line) + 1
+            if cost > budget:
+                break
+            budget -= cost
+            lines.append(line)
+        if len(lines) < len(facts):
+            logging.debug("Context window: pinned %s of %s world-state facts.", len(lines), len(facts))
+        lines.reverse()
+        return lines
+
+    def pack(self, messages: Sequence[Dict], pinned: Sequence[Dict] = (), summary: Optional[Dict] = None,
+             history_start: int = 0) -> List[Dict]:
+        """Return the messages to send, newest turns first to fill the budget.
+
+        History before `history_start` (already covered by the summary) is skipped.
+        """
+        head_len = 0
+        while head_len < len(messages) and messages[head_len]["role"] == "system":
+            head_len += 1
+        head = [messages[i] for i in range(head_len)] + list(pinned)
+        first, end = max(head_len, history_start), len(messages)
+
+        budget = self.token_budget - sum(self.count(m) for m in head)
+        if summary is not None:
+            budget -= self.count(summary)
+
+        start = end
+        while start > first and budget - self.count(messages[start - 1]) >= 0:
+            budget -= self.count(messages[start - 1])
+            start -= 1
+
+        # Toujours garder au moins le dernier message (la demande du joueur)
+        if start == end and end > first:
+            start -= 1
+        # Commencer l'historique sur un tour du joueur
+        while first < start < end - 1 and messages[start]["role"] != "user":
+            start += 1
+
+        self.evicted_count = start - first
+        if self.evicted_count:
+            logging.info("Context window: kept %s messages, evicted %s older messages.", end - start, self.evicted_count)
+
+        packed = head
+        if summary is not None:
+            packed = packed + [summary]
+        return packed + [messages[i] for i in range(start, end)]
@@ -2,27 +2,52 @@
 Game engine core - pure game logic without UI dependencies
 """
 import logging
-import re
 from typing import Dict, List, Optional, Tuple, Any
 
+from .choice_parser import ChoiceParser, parse_choice_line
+from .context_window import ContextWindow
+from .story_log import StoryLog
+from .token_budget import TokenUsage
+
+# Faits gardés dans l'état du monde ; au-delà, les moins récemment mis à jour sont oubliés
+MAX_WORLD_FACTS = 200
+
 
 class GameEngine:
     """Core game engine handling story state and game logic"""
     
     def __init__(self):
-        self.story_log: List[Dict[str, str]] = []
+        self.story_log = StoryLog()
         self.world_state: Dict[str, str] = {}
         self.hero_name: str = "Tim"
+        # Informations d'affichage de la partie (univers, style) pour le catalogue des sauvegardes
+        self.metadata: Dict[str, str] = {}
         self.debug_mode: bool = True
+        self.context_window = ContextWindow()
+        # Synopsis des tours sortis de la fenêtre de contexte
+        self.synopsis: str = ""
+        self.summary_upto: int = 0
+        self.pending_summary: Tuple[int, int] = (0, 0)
+        # Récit et choix déjà extraits, par contenu de message
+        self.parser = ChoiceParser(self.hero_name)
+        # Tokens consommés par cette partie (le compteur quotidien est partagé, voir DailyUsage)
+        self.token_usage = TokenUsage()
         
     def clear_game_state(self):
         """Reset game state for new game"""
         self.story_log.clear()
         self.world_state.clear()
+        self.metadata = {}
+        self.synopsis = ""
+        self.summary_upto = 0
+        self.pending_summary = (0, 0)
+        self.parser.clear()
+        self.token_usage = TokenUsage()
         
     def set_hero_name(self, name: str):
         """Set the hero's name"""
         self.hero_name = name.strip() or "Aventurier"
+        self.parser.set_hero_name(self.hero_name)
         
     def add_system_message(self, content: str):
         """Add system message to story log"""
@@ -41,6 +66,62 @@ class GameEngine:
         if self.story_log:
             self.story_log.pop()
             
+    def build_request_messages(self) -> List[Dict[str, str]]:
+        """Messages to send to the AI, packed into the context window budget"""
+        pinned = []
+        facts = self.context_window.select_facts(self.world_state)
+        if facts:
+            pinned.append({"role": "system", "content": "Faits établis:\n" + "\n".join(facts)})
+
+        head_len = self._count_leading_system_messages()
+        start = max(head_len, self.summary_upto)
+        summary = None
+        if self.synopsis:
+            summary = {"role": "system", "content": f"Résumé des événements précédents:\n{self.synopsis}"}
+
+        messages = self.context_window.pack(self.story_log, pinned, summary, history_start=start)
+        self.pending_summary = (start, start + self.context_window.evicted_count)
+        return messages
+
+    def get_messages_to_summarize(self, max_messages: Optional[int] = None,
+                                  max_tokens: Optional[int] = None) -> Tuple[List[Dict[str, str]], int]:
+        """Oldest turns evicted from the context window that the synopsis does not cover yet.
+
+        At most `max_messages` messages / `max_tokens` tokens are returned (at
+        least one message); the rest is left for the next pass.
+        """
+        start, end = self.pending_summary
+        if start != max(self._count_leading_system_messages(), self.summary_upto) or end <= start:
+            return [], self.summary_upto
+        if max_messages is not None:
+            end = min(end, start + max_messages)
+        if max_tokens is not None:
+            # Lecture message par message : un journal chargé paresseusement ne décode que le lot
+            stop, spent = start, 0
+            while stop < end:
+                spent += self.context_window.count(self.story_log[stop])
+                if spent > max_tokens and stop > start:
+                    break
+                stop += 1
+            end = stop
+        return self.story_log[start:end], end
+
+    def _count_leading_system_messages(self) -> int:
+        count = 0
+        while count < len(self.story_log) and self.story_log[count]["role"] == "system":
+            count += 1
+        return count
+
+    def apply_summary(self, synopsis: str, upto: int):
+        """Replace the summarized turns by the new synopsis"""
+        self.synopsis = synopsis.strip()
+        self.summary_upto = upto
+        # Le reste des tours évincés attend la passe suivante
+        start, end = self.pending_summary
+        if start < upto < end:
+            self.pending_summary = (upto, end)
+        logging.info("Synopsis updated, covers story log up to message %s.", upto)
+
     def build_system_prompt(self, base_prompt: str, style_instruction: str) -> str:
         """Build adaptive system prompt based on game phase"""
         
@@ -120,51 +201,75 @@ class GameEngine:
         
         return f"Contexte récent: {story_start}"
         
+    def parse_choice_line(self, line: str) -> Optional[str]:
+        """Return the choice text if the line is a numbered or bulleted choice"""
+        return parse_choice_line(line)
+
     def extract_choices(self, text: str) -> Tuple[str, List[str]]:
         """Extract narrative and choices from AI response"""
-        text = text.replace("{hero_name}", self.hero_name)
-        lines = text.strip().split("\n")
-        choices, narrative = [], []
-        
-        for line in lines:
-            if re.match(r"^\s*(\d+[\.\)]|[-*])\s", line):
-                choices.append(re.sub(r"^\s*(\d+[\.\)]|[-*])\s*", "", line).strip())
-            else:
-                narrative.append(line)
-                
-        if not choices and len(narrative) > 4:
-            choices = narrative[-4:]
-            narrative = narrative[:-4]
-            logging.warning("Used fallback choice extraction logic.")
-            
-        logging.debug(f"Extracted {len(choices)} choices and narrative part.")
-        return "\n".join(narrative).strip(), choices
+        return self.parser.extract(text)
         
+    def parse_message(self, content: str) -> Tuple[str, List[str]]:
+        """Cached extract_choices for a message of the story log"""
+        return self.parser.parse(content)
+
+    def get_narratives(self, limit: Optional[int] = None) -> List[str]:
+        """Narrative part of the assistant messages in story order (only the last `limit` ones if given)"""
+        narratives = []
+        # Parcours depuis la fin : un journal chargé paresseusement ne lit que les tours affichés
+        for index in range(len(self.story_log) - 1, -1, -1):
+            if limit is not None and len(narratives) >= limit:
+                break
+            msg = self.story_log[index]
+            if msg["role"] == "assistant":
+                narratives.append(self.parse_message(msg["content"])[0])
+        narratives.reverse()
+        return narratives
+
+
     def update_world_state_from_facts(self, raw_facts: str):
-        """Update world state from extracted facts"""
+        """Update world state from extracted facts (most recently updated last, at most MAX_WORLD_FACTS)"""
+        # Même clé à la casse près : un seul fait, déplacé en fin comme le plus récent
+        keys = {key.casefold(): key for key in self.world_state}
         for line in raw_facts.split('\n'):
             if ':' in line:
                 key, value = line.split(':', 1)
                 key = key.strip()
                 value = value.strip()
                 if key and value:
+                    self.world_state.pop(keys.get(key.casefold(), key), None)
                     self.world_state[key] = value
-                    logging.info(f"Updated world state: {key} = {value}")
+                    keys[key.casefold()] = key
+                    logging.info("Updated world state: %s = %s", key, value)
+        for key in list(self.world_state)[:-MAX_WORLD_FACTS]:
+            del self.world_state[key]
                     
     def load_game_state(self, save_data: Dict[str, Any]):
         """Load game state from save data"""
-        self.story_log = save_data.get("story_log", [])
+        self.story_log = StoryLog(save_data.get("story_log", []))
         self.world_state = save_data.get("world_state", {})
+        self.hero_name = save_data.get("hero_name", self.hero_name)
+        self.metadata = save_data.get("metadata", {})
+        self.synopsis = save_data.get("synopsis", "")
+        self.summary_upto = save_data.get("summary_upto", 0)
+        self.pending_summary = (0, 0)
+        self.parser.set_hero_name(self.hero_name)
+        self.token_usage = TokenUsage.from_json(save_data.get("token_usage"))
         
     def get_save_data(self) -> Dict[str, Any]:
         """Get current game state for saving"""
         return {
             "story_log": self.story_log,
-            "world_state": self.world_state
+            "world_state": self.world_state,
+            "hero_name": self.hero_name,
+            "synopsis": self.synopsis,
+            "summary_upto": self.summary_upto,
+            "metadata": self.metadata,
+            "token_usage": self.token_usage.to_json()
         }
         
     def get_last_narrative_and_choices(self) -> Tuple[str, List[str]]:
         """Get narrative and choices from last assistant message"""
         if self.story_log and self.story_log[-1]["role"] == "assistant":
-            return self.extract_choices(self.story_log[-1]["content"])
+            return self.parse_message(self.story_log[-1]["content"])
         return "", []
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Speculative prefetch of the next turn for every displayed choice
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from .context_window import estimate_tokens
+
+
+class TurnPrefetcher:
+    """Generates the next turn for each choice while the player is still reading.
+
+    Each choice gets its own branch of the story log (the current log plus the
+    prompt the choice would produce). Requests are bounded by a semaphore and by
+    a per-round token budget; when the player picks a choice the matching task is
+    handed over and the other branches are cancelled or discarded. Branches
+    are requested with the generation options of the turn they stand in for.
+
+    `wasted_tokens` estimates the tokens spent on discarded branches: prompt and
+    response of the completed ones, the prompt of those cancelled in flight.
+    """
+
+    def __init__(self, ai, max_concurrency: int = 4, token_budget: int = 40000):
+        self.ai = ai
+        self.token_budget = token_budget
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._prompts: Dict[str, str] = {}
+        self._costs: Dict[str, int] = {}
+        # Branches dont la requête est partie (le prompt est déjà facturé)
+        self._sent: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.rounds = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+
+    def start(self, story_log: List[Dict[str, str]], prompts: Dict[str, str],
+              options: Optional[Dict[str, Any]] = None):
+        """Launch one background completion per choice (choice -> user prompt) with the request `options`"""
+        self.cancel()
+        self.rounds += 1
+        base_tokens = sum(estimate_tokens(m["content"]) for m in story_log)
+        spent = 0
+
+        for choice, prompt in prompts.items():
+            cost = base_tokens + estimate_tokens(prompt)
+            if spent + cost > self.token_budget:
+                logging.info("Prefetch budget reached (%s/%s tokens), skipping remaining choices.", spent, self.token_budget)
+                break
+            spent += cost
+            branch = list(story_log) + [{"role": "user", "content": prompt}]
+            self._prompts[choice] = prompt
+            self._costs[choice] = cost
+            self._tasks[choice] = asyncio.create_task(self._run(branch, options or {}))
+
+        logging.debug("Prefetching %s choices (~%s input tokens).", len(self._tasks), spent)
+
+    async def _run(self, branch: List[Dict[str, str]], options: Dict[str, Any]) -> str:
+        async with self._semaphore:
+            self._sent.add(asyncio.current_task())
+            return await self.ai.complete(branch, priority=self.ai.PRIORITY_PREFETCH, **options)
+
+    def take(self, choice: str, prompt: str) -> Optional[asyncio.Task]:
+        """Return the prefetch task for the chosen branch and drop the others"""
+        if not self._tasks:
+            return None
+
+        task = self._tasks.get(choice)
+        if task is not None and self._prompts[choice] != prompt:
+            # Le contexte a changé depuis le lancement : la branche n'est plus valide (jetée par cancel())
+            task = None
+        elif task is not None:
+            del self._tasks[choice]
+
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.cancel()
+
+        total = self.hits + self.misses
+        logging.info(
+            "Prefetch %s - hit rate: %s/%s (%.0f%%), wasted tokens (est.): %s",
+            "hit" if task else "miss", self.hits, total, 100 * self.hits / total, self.wasted_tokens,
+        )
+        return task
+
+    def cancel(self):
+        """Cancel or discard every pending branch"""
+        for choice, task in self._tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                # Réponse déjà générée mais inutilisée
+                self.wasted_tokens += self._costs[choice] + estimate_tokens(task.result())
+            elif not task.done():
+                if task in self._sent:
+                    # Requête en vol : le prompt est dépensé, la réponse partielle n'est pas connue
+                    self.wasted_tokens += self._costs[choice]
+                task.cancel()
+        self._tasks.clear()
+        self._prompts.clear()
+        self._costs.clear()
+        self._sent.clear()
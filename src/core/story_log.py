@@ -0,0 +1,200 @@
+"""
+Compact story log - slotted messages with cached token counts and request fragments
+"""
+import itertools
+import json
+from collections.abc import MutableSequence
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class Role(Enum):
+    SYSTEM = "system"
+    USER = "user"
+    ASSISTANT = "assistant"
+
+    @property
+    def gemini_role(self) -> str:
+        # Gemini n'a que "user" et "model" : les consignes système passent côté utilisateur
+        return "model" if self is Role.ASSISTANT else "user"
+
+
+ROLES_BY_NAME = {role.value: role for role in Role}
+
+
+class Message:
+    """One story message.
+
+    Behaves like the {"role", "content"} dict it replaces (`msg["role"]`,
+    `msg.get("tokens")`...), but keeps its role as a shared enum member and
+    caches its token estimate and its serialized Gemini `contents` entry.
+    """
+
+    __slots__ = ("role", "content", "tokens", "_gemini")
+
+    def __init__(self, role: Role, content: str, tokens: Optional[int] = None):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+        self._gemini: Optional[tuple] = None
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Message":
+        if isinstance(data, Message):
+            return data
+        return cls(ROLES_BY_NAME.get(data["role"], Role.USER), data["content"], data.get("tokens"))
+
+    def __getitem__(self, key: str):
+        if key == "role":
+            return self.role.value
+        if key == "content":
+            return self.content
+        if key == "tokens" and self.tokens is not None:
+            return self.tokens
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __setitem__(self, key: str, value):
+        if key == "role":
+            self.role = ROLES_BY_NAME.get(value, Role.USER)
+        elif key == "content":
+            self.content = value
+            self.tokens = None
+        elif key == "tokens":
+            self.tokens = value
+            return
+        else:
+            raise KeyError(key)
+        self._gemini = None
+
+    def __repr__(self):
+        return f"Message({self.role.value!r}, {self.content[:40]!r})"
+
+    def gemini(self) -> tuple:
+        """(contents entry, its UTF-8 JSON) for a Gemini request, built once"""
+        if self._gemini is None:
+            entry = {"role": self.role.gemini_role, "parts": [{"text": self.content}]}
+            self._gemini = (entry, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        return self._gemini
+
+    def to_json(self) -> Dict[str, Any]:
+        data = {"role": self.role.value, "content": self.content}
+        if self.tokens is not None:
+            data["tokens"] = self.tokens
+        return data
+
+
+class StoryLog(MutableSequence):
+    """The story history as a sequence of Message.
+
+    Dicts given to it are converted on insertion, so callers keep appending
+    {"role", "content"} dicts. Built from a list, every message is converted
+    at once. Built from another sequence (a lazily loaded save), messages are
+    only converted when first read; appending or truncating at the end keeps
+    that mapping, other structural changes materialize the log first.
+    """
+
+    def __init__(self, messages: Iterable = ()):
+        if isinstance(messages, (list, tuple)):
+            self._source = None
+            self._items: List[Optional[Message]] = [Message.from_dict(m) for m in messages]
+        else:
+            self._source = messages
+            self._items = [None] * len(messages)
+
+    @property
+    def source(self):
+        return self._source
+
+    def _load(self, index: int) -> Message:
+        item = self._items[index]
+        if item is None:
+            item = self._items[index] = Message.from_dict(self._source[index])
+        return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(*index.indices(len(self._items)))]
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError("story log index out of range")
+        return self._load(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.materialize()
+            self._items[index] = [Message.from_dict(m) for m in value]
+        else:
+            self._items[index] = Message.from_dict(value)
+
+    def __delitem__(self, index):
+        size = len(self._items)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            at_end = step == 1 and stop >= size
+        else:
+            at_end = index in (-1, size - 1)
+        if self._source is not None and not at_end:
+            # Supprimer au milieu décalerait les indices des messages encore dans la source
+            self.materialize()
+        del self._items[index]
+
+    def insert(self, index, value):
+        if self._source is not None and index < len(self._items):
+            self.materialize()
+        self._items.insert(index, Message.from_dict(value))
+
+    def clear(self):
+        self._items = []
+        self.close()
+
+    def __iter__(self):
+        # Les messages non chargés sont convertis à la volée, sans être gardés
+        raw = itertools.chain(self._source, itertools.repeat(None)) if self._source is not None else itertools.repeat(None)
+        for item, data in zip(self._items, raw):
+            yield item if item is not None else Message.from_dict(data)
+
+    def count_role(self, role: str) -> int:
+        """Number of messages with `role`, without loading unloaded ones when the source can tell"""
+        role_at = getattr(self._source, "role_at", None)
+        count = 0
+        for index, item in enumerate(self._items):
+            if item is not None:
+                count += item.role.value == role
+            elif role_at is not None:
+                count += role_at(index) == role
+            else:
+                count += self._source[index]["role"] == role
+        return count
+
+    def materialize(self):
+        """Convert every message and drop the source"""
+        if self._source is not None:
+            self._items = list(self)
+            self.close()
+
+    def rebase(self, source):
+        """Read unloaded messages from `source` from now on (same messages, e.g. a rewritten save)"""
+        self.close()
+        self._source = source
+
+    def close(self):
+        close = getattr(self._source, "close", None)
+        if close is not None:
+            close()
+        self._source = None
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return [message.to_json() for message in self]
@@ -0,0 +1,310 @@
+"""
+Story session - UI-free orchestration of a game on top of GameEngine and an AI client
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..utils.tracing import tracer
+from .choice_parser import STORY_RESPONSE_SCHEMA, format_story, normalize_response, split_story, truncated_narrative
+from .engine import GameEngine
+from .prefetch import TurnPrefetcher
+from .summarizer import StorySummarizer
+from .token_budget import LEVEL_EXCEEDED, LEVEL_NAMES, LEVEL_NORMAL, DailyUsage, MeteredClient, TokenBudget, describe
+from .world_state import WorldStatePipeline
+
+# Réparation d'une réponse sans 4 choix : petite requête ciblée au lieu d'une régénération complète
+REPAIR_MAX_OUTPUT_TOKENS = 160
+# Réponse tronquée (MAX_TOKENS) : fin de la scène en plus des choix
+CONTINUATION_MAX_OUTPUT_TOKENS = 400
+MIN_REPAIRABLE_NARRATIVE = 80
+
+
+def _join_continuation(narrative: str, ending: str) -> str:
+    """Append the end of a scene to its truncated beginning"""
+    if not ending:
+        return narrative
+    # Coupé au milieu d'un mot ou d'une phrase : la suite reprend sur la même ligne
+    separator = "" if narrative[-1:].isspace() or ending[:1] in ",.;:!?…" else " "
+    return narrative + separator + ending
+
+
+class StorySession:
+    """Plays an adventure: new game, turns with retries, background work.
+
+    Front-ends (the Tk window, the headless runner) only render what
+    `play_turn` returns. Generation can be customized per turn through
+    `generate(messages, use_cache)`, e.g. to stream the response on screen.
+    With `structured_output`, the default generation asks the API for
+    `{narrative, choices}` JSON, which rules out most malformed responses.
+
+    A response without exactly 4 choices is repaired before falling back to
+    a full regeneration: extra choices are trimmed, and missing ones are
+    requested alone for the narrative already generated. `repair_stats`
+    counts which path each malformed response took. A response cut off by
+    the output token limit keeps its partial narrative: the end of the scene
+    and the 4 choices are requested in the same small continuation.
+
+    When a save journal is attached (`attach_journal`), every valid turn is
+    autosaved to it incrementally.
+
+    Every request of the session goes through a MeteredClient (`self.ai`),
+    which adds its token usage to the engine's counters, saved with the game,
+    and to `daily_usage`, the per-day counters shared by every adventure.
+    Past the `token_budget` thresholds the session degrades instead of
+    stopping: smaller context window and no prefetch, then the light model.
+    """
+
+    def __init__(self, ai, engine: Optional[GameEngine] = None, prefetch_enabled: bool = False,
+                 structured_output: bool = False, token_budget: Optional[TokenBudget] = None,
+                 daily_usage: Optional[DailyUsage] = None):
+        self.engine = engine or GameEngine()
+        self.daily_usage = daily_usage or DailyUsage()
+        self.ai = MeteredClient(ai, lambda: self.engine.token_usage, self.daily_usage)
+        self.token_budget = token_budget or TokenBudget.from_env()
+        self.budget_level = LEVEL_NORMAL
+        self._context_budget = self.engine.context_window.token_budget
+        self.prefetch_enabled = prefetch_enabled
+        self.structured_output = structured_output
+        self.repair_stats = {"trimmed": 0, "continuation": 0, "truncated": 0, "full_retry": 0, "failed": 0}
+        self.journal = None
+        self.prefetcher = TurnPrefetcher(self.ai)
+        self.summarizer = StorySummarizer(self.ai, self.engine)
+        self.world_state_pipeline = WorldStatePipeline(self.ai, self.engine)
+
+    def new_game(self, hero_name: str, universe_prompt: str, style_instruction: str, custom_universe_prompt: str = "",
+                 metadata: Optional[Dict[str, str]] = None):
+        """Reset the state and set up the system prompt of a new adventure"""
+        self.cancel_background_tasks()
+        self.engine.clear_game_state()
+        self.engine.set_hero_name(hero_name)
+        self.engine.metadata = dict(metadata or {})
+        hero_name = self.engine.hero_name
+
+        if custom_universe_prompt:
+            base_prompt = f"Lance une aventure sur ce thème : {custom_universe_prompt}. Le héros est {hero_name}."
+            logging.info("Starting game with custom universe. Hero: %s, Prompt: %s", hero_name, custom_universe_prompt)
+        else:
+            base_prompt = universe_prompt.replace("{hero_name}", hero_name)
+            logging.info("Starting game with preset universe. Hero: %s", hero_name)
+
+        prompt_system = self.engine.build_system_prompt(base_prompt, style_instruction)
+        self.engine.add_system_message(prompt_system)
+        logging.debug("System prompt set: %s", prompt_system)
+
+    def load(self, save_data: Dict[str, Any]):
+        """Restore a saved adventure"""
+        self.cancel_background_tasks()
+        self.engine.load_game_state(save_data)
+
+    def attach_journal(self, journal, compact: bool = False, compacted: bool = False):
+        """Autosave to `journal` from now on; `compact` writes the current state as its snapshot.
+
+        `compacted` means the caller already wrote a snapshot of this game into
+        it (e.g. off the event loop); changes made since are journaled at the
+        next autosave.
+        """
+        if self.journal is not None and self.journal is not journal:
+            self.journal.close()
+        self.journal = journal
+        if journal is None or compacted:
+            return
+        if compact:
+            journal.compact(self.engine.get_save_data())
+        else:
+            journal.attach(self.engine.get_save_data())
+
+    def autosave(self):
+        """Append this turn's changes to the attached save journal"""
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(self.engine.get_save_data())
+        except OSError as e:
+            logging.error("Autosave failed: %s", e, exc_info=True)
+
+    def generation_options(self) -> Dict[str, Any]:
+        """Request options of the default generation (also used by the prefetched branches)"""
+        return {"response_schema": STORY_RESPONSE_SCHEMA} if self.structured_output else {}
+
+    async def _generate(self, messages: List[Dict[str, str]], use_cache: bool) -> str:
+        return await self.ai.complete(messages, use_cache=use_cache, **self.generation_options())
+
+    async def play_turn(self, user_input: str, is_continuation: bool = False, max_retries: int = 2,
+                        generate: Optional[Callable[[List[Dict[str, str]], bool], Awaitable[str]]] = None,
+                        on_retry: Optional[Callable[[int], None]] = None) -> Tuple[str, List[str]]:
+        """Play one turn and return (narrative, choices); choices is empty on failure.
+
+        A custom `generate` (e.g. streaming) is expected to send plain text
+        requests: the next turn is then prefetched without structured output.
+        """
+        self.apply_token_budget()
+        options = self.generation_options() if generate is None else {}
+        with tracer.turn(continuation=is_continuation) as turn:
+            text, choices = await self._play_turn(user_input, is_continuation, max_retries, generate or self._generate,
+                                                  on_retry, turn, options)
+            turn["valid"] = bool(choices)
+            return text, choices
+
+    async def _play_turn(self, user_input: str, is_continuation: bool, max_retries: int,
+                         generate: Callable[[List[Dict[str, str]], bool], Awaitable[str]],
+                         on_retry: Optional[Callable[[int], None]], turn: Dict[str, Any],
+                         options: Dict[str, Any]) -> Tuple[str, List[str]]:
+        previous_response = None
+
+        for attempt in range(max_retries + 1):
+            turn["attempts"] = attempt + 1
+            logging.debug("Playing turn. Input: '%s', Continuation: %s, Attempt: %s/%s", user_input, is_continuation, attempt + 1, max_retries + 1)
+            with tracer.span("prompt_build"):
+                prompt = self.engine.build_prompt_with_context(user_input, is_continuation, previous_response)
+
+            message = None
+            if not previous_response:
+                prefetched = self.prefetcher.take(user_input, prompt)
+                self.engine.add_user_message(prompt)
+                logging.debug("Appended user message to story log: %s", prompt)
+                if prefetched:
+                    message = await self._await_prefetched(prefetched)
+                    turn["prefetched"] = message is not None
+            if message is None:
+                with tracer.span("context_window"):
+                    messages = self.engine.build_request_messages()
+                # Une réponse invalide peut être en cache : ne pas la resservir
+                with tracer.span("generate"):
+                    message = await generate(messages, previous_response is None)
+
+            truncated = getattr(message, "finish_reason", None) == "MAX_TOKENS"
+            # Le journal garde toujours la forme texte (récit + choix numérotés)
+            message = normalize_response(message)
+            self.engine.add_assistant_message(message)
+            with tracer.span("extract_choices"):
+                text, choices = self.engine.parse_message(message)
+            if truncated:
+                # Le dernier choix reçu peut être coupé : seul le récit est gardé
+                turn["truncated"] = True
+                text, choices = truncated_narrative(message.replace("{hero_name}", self.engine.hero_name)), []
+            if len(choices) != 4:
+                repaired = await self._repair(text, choices, truncated)
+                if repaired is not None:
+                    self.engine.remove_last_message()
+                    text, choices = repaired
+                    self.engine.add_assistant_message(format_story(text, choices))
+            if len(choices) == 4:
+                with tracer.span("background_start"):
+                    self._start_background_work(text, choices, options)
+                with tracer.span("autosave"):
+                    self.autosave()
+                logging.info("AI response was valid.")
+                return text, choices
+
+            self.engine.remove_last_message()
+            previous_response = message
+            if attempt < max_retries:
+                self.repair_stats["full_retry"] += 1
+                logging.warning("Invalid AI response format. Retrying... (Retries left: %s)", max_retries - attempt - 1)
+                if on_retry:
+                    on_retry(max_retries - attempt - 1)
+
+        logging.error("AI failed to generate a valid response after all retries.")
+        self.repair_stats["failed"] += 1
+        return "", []
+
+    async def _repair(self, narrative: str, choices: List[str],
+                      truncated: bool = False) -> Optional[Tuple[str, List[str]]]:
+        """Return (narrative, 4 choices) for an otherwise usable narrative, or None to regenerate the turn
+
+        A `truncated` narrative is completed by the same request.
+        """
+        if len(choices) > 4:
+            logging.info("Repaired AI response by keeping the first 4 of %s choices.", len(choices))
+            self.repair_stats["trimmed"] += 1
+            return narrative, choices[:4]
+        if len(narrative) < MIN_REPAIRABLE_NARRATIVE:
+            return None
+
+        if truncated:
+            prompt = (
+                f"Voici le début de la dernière scène d'une aventure dont le héros est {self.engine.hero_name}, "
+                f"coupé en cours de rédaction :\n\n{narrative}\n\n"
+                "Écris uniquement la fin de la scène en une ou deux phrases, en reprenant exactement là où le texte "
+                "s'arrête, puis 4 choix d'action numérotés de 1 à 4, un par ligne."
+            )
+        else:
+            prompt = (
+                f"Voici la dernière scène d'une aventure dont le héros est {self.engine.hero_name} :\n\n{narrative}\n\n"
+                "Propose uniquement 4 choix d'action pour la suite, numérotés de 1 à 4, un par ligne, sans autre texte."
+            )
+        try:
+            raw = await self.ai.complete(
+                [{"role": "user", "content": prompt}],
+                max_output_tokens=CONTINUATION_MAX_OUTPUT_TOKENS if truncated else REPAIR_MAX_OUTPUT_TOKENS,
+                temperature=0.7,
+                model=self.ai.light_model,
+                thinking_budget=0,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning("Choice repair request failed, regenerating the turn: %s", e)
+            return None
+
+        ending, repaired = split_story(raw.replace("{hero_name}", self.engine.hero_name))
+        if len(repaired) < 4:
+            logging.warning("Choice repair returned %s choices, regenerating the turn.", len(repaired))
+            return None
+        if truncated:
+            logging.info("Completed truncated AI response with a continuation request.")
+            self.repair_stats["truncated"] += 1
+            return _join_continuation(narrative, ending), repaired[:4]
+        logging.info("Repaired AI response with a choices-only request.")
+        self.repair_stats["continuation"] += 1
+        return narrative, repaired[:4]
+
+    async def _await_prefetched(self, task) -> Optional[str]:
+        """Return the prefetched response, or None if the branch failed"""
+        try:
+            message = await task
+            logging.info("Serving prefetched AI response.")
+            return message
+        except Exception as e:
+            logging.warning("Prefetched branch failed, requesting live response: %s", e)
+            return None
+
+    def apply_token_budget(self) -> int:
+        """Set the degradation matching the tokens spent so far; returns the level"""
+        level = self.token_budget.level(self.engine.token_usage, self.daily_usage)
+        if level != self.budget_level:
+            log = logging.info if level == LEVEL_NORMAL else logging.warning
+            log("Token budget level: %s (%s).", LEVEL_NAMES[level], self.describe_tokens())
+            self.budget_level = level
+        if level == LEVEL_NORMAL:
+            self.engine.context_window.token_budget = self._context_budget
+        else:
+            self.engine.context_window.token_budget = int(self._context_budget * self.token_budget.reduced_context_ratio)
+        self.ai.use_light_model = level == LEVEL_EXCEEDED
+        return level
+
+    def describe_tokens(self) -> str:
+        """One-line token summary (this adventure, today) for logs and the UI"""
+        return describe(self.engine.token_usage, self.daily_usage, self.token_budget)
+
+    def token_report(self) -> Dict[str, Any]:
+        """Tokens spent by this adventure, by every adventure today, and the budget level"""
+        usage = self.engine.token_usage
+        level = self.token_budget.level(usage, self.daily_usage)
+        return {**usage.session, "today": self.daily_usage.today_total(), "budget_level": LEVEL_NAMES[level]}
+
+    def _start_background_work(self, narrative: str, choices: List[str], options: Dict[str, Any]):
+        """Work that runs while the player reads the new turn; `options` are the turn's request options"""
+        # Le préchargement dépense des tokens pour des branches souvent jetées : coupé dès le premier seuil
+        if self.prefetch_enabled and self.budget_level == LEVEL_NORMAL:
+            prompts = {choice: self.engine.build_prompt_with_context(choice) for choice in choices}
+            self.prefetcher.start(self.engine.build_request_messages(), prompts, options)
+        self.summarizer.schedule()
+        self.world_state_pipeline.submit(narrative)
+
+    def cancel_background_tasks(self):
+        """Drop prefetched branches, pending summaries and fact extraction"""
+        self.prefetcher.cancel()
+        self.summarizer.cancel()
+        self.world_state_pipeline.cancel()
@@ -0,0 +1,86 @@
+"""
+Rolling background summarization of turns evicted from the context window
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+
+class StorySummarizer:
+    """Compresses old story turns into a running synopsis, off the critical path.
+
+    `schedule()` is called once the choices are on screen; it starts a single
+    background task that folds the newly evicted turns into the synopsis with a
+    cheap, bounded AI call. The synopsis then replaces those turns in every
+    following request. A pass covers at most `max_batch` messages and
+    `max_batch_tokens` tokens, oldest first; a long backlog (e.g. an old save
+    without synopsis) is folded in over several passes.
+    """
+
+    def __init__(self, ai, engine, min_batch: int = 4, max_output_tokens: int = 512,
+                 max_batch: int = 40, max_batch_tokens: int = 6000):
+        self.ai = ai
+        self.engine = engine
+        self.min_batch = min_batch
+        self.max_output_tokens = max_output_tokens
+        self.max_batch = max_batch
+        self.max_batch_tokens = max_batch_tokens
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self):
+        """Start a summary pass if enough turns have left the context window"""
+        if self._task is not None and not self._task.done():
+            return
+        if len(self._next_batch()[0]) < self.min_batch:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    def _next_batch(self):
+        return self.engine.get_messages_to_summarize(self.max_batch, self.max_batch_tokens)
+
+    async def _run(self):
+        """Summarize batch after batch until the backlog is covered or a pass fails"""
+        while True:
+            messages, upto = self._next_batch()
+            if len(messages) < self.min_batch or not await self._summarize(messages, upto):
+                return
+
+    def _build_prompt(self, messages: List[Dict[str, str]]) -> str:
+        turns = "\n\n".join(
+            f"{'Joueur' if m['role'] == 'user' else 'Récit'}: {m['content']}" for m in messages
+        )
+        previous = self.engine.synopsis or "(aucun)"
+        return (
+            "Tu tiens le résumé d'une aventure interactive. "
+            "Intègre les nouveaux événements au résumé existant en gardant les personnages, lieux, "
+            "objets, décisions du joueur et intrigues en cours. Réponds uniquement par le résumé mis à jour, "
+            "en un ou deux paragraphes.\n\n"
+            f"Résumé existant:\n{previous}\n\n"
+            f"Nouveaux événements:\n{turns}\n\n"
+            "Résumé mis à jour:"
+        )
+
+    async def _summarize(self, messages: List[Dict[str, str]], upto: int) -> bool:
+        prompt = self._build_prompt(messages)
+        try:
+            synopsis = await self.ai.complete(
+                [{"role": "user", "content": prompt}],
+                max_output_tokens=self.max_output_tokens,
+                temperature=0.2,
+                model=self.ai.light_model,
+                thinking_budget=0,
+                priority=self.ai.PRIORITY_BACKGROUND,
+            )
+            self.engine.apply_summary(synopsis, upto)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error("Could not summarize old turns: %s", e, exc_info=True)
+            return False
+
+    def cancel(self):
+        """Drop any summary pass in flight (new game or load)"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
@@ -0,0 +1,192 @@
+"""
+Token accounting - usage counters (per adventure and per day), budgets and the metered AI client
+"""
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+USAGE_FIELDS = ("requests", "prompt", "output", "thoughts", "total")
+# Jours gardés pour le compteur quotidien
+KEEP_DAYS = 31
+
+# Niveaux de dégradation quand un budget est atteint
+LEVEL_NORMAL = 0
+LEVEL_REDUCED = 1    # fenêtre de contexte réduite, pas de préchargement
+LEVEL_EXCEEDED = 2   # en plus, modèle léger pour les tours
+LEVEL_NAMES = {LEVEL_NORMAL: "normal", LEVEL_REDUCED: "reduced", LEVEL_EXCEEDED: "exceeded"}
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def _count(target: Dict[str, int], usage: Dict[str, int]):
+    target["requests"] += 1
+    for field in USAGE_FIELDS[1:]:
+        target[field] += usage.get(field, 0)
+
+
+class TokenUsage:
+    """Cumulative token counts of one adventure.
+
+    Fed with the `usage` dicts the AI client attaches to its responses
+    ({"prompt", "output", "thoughts", "total"}); stored in the save data as
+    {"session": {...}}.
+    """
+
+    def __init__(self, session: Optional[Dict[str, int]] = None):
+        self.session = {field: 0 for field in USAGE_FIELDS}
+        self.session.update(session or {})
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> "TokenUsage":
+        # Les "days" des anciennes sauvegardes sont ignorés : le compteur quotidien est partagé (DailyUsage)
+        return cls((data or {}).get("session"))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"session": dict(self.session)}
+
+    def add(self, usage: Optional[Dict[str, int]]):
+        """Count one request; responses without usage (cache hits) cost nothing"""
+        if not usage or not usage.get("total"):
+            return
+        _count(self.session, usage)
+
+    def session_total(self) -> int:
+        return self.session["total"]
+
+
+class DailyUsage:
+    """Token counts per day, shared by every adventure played.
+
+    Stored as {"YYYY-MM-DD": {...}} outside the saves, so starting or
+    loading a game does not reset the daily budget. `persist(data)` is
+    called after every change (e.g. to write the shared file).
+    """
+
+    def __init__(self, days: Optional[Dict[str, Dict[str, int]]] = None,
+                 persist: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.days = {day: dict(counts) for day, counts in (days or {}).items()}
+        self.persist = persist
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]], persist=None) -> "DailyUsage":
+        return cls(data, persist)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {day: dict(counts) for day, counts in self.days.items()}
+
+    def add(self, usage: Optional[Dict[str, int]], day: Optional[str] = None):
+        """Count one request for `day` (today by default)"""
+        if not usage or not usage.get("total"):
+            return
+        day = day or today()
+        counts = self.days.get(day)
+        if counts is None:
+            counts = self.days[day] = {field: 0 for field in USAGE_FIELDS}
+            for old_day in sorted(self.days)[:-KEEP_DAYS]:
+                del self.days[old_day]
+        _count(counts, usage)
+        if self.persist is not None:
+            self.persist(self.to_json())
+
+    def today_total(self) -> int:
+        return self.days.get(today(), {}).get("total", 0)
+
+
+class TokenBudget:
+    """Session and daily token limits, and how far past them the game is.
+
+    From `soft_ratio` of a limit the game is REDUCED (smaller context window,
+    no speculative prefetch); past the limit it is EXCEEDED and turns also
+    use the light model. Play never stops. No limit means no degradation.
+    """
+
+    def __init__(self, session_limit: Optional[int] = None, daily_limit: Optional[int] = None,
+                 soft_ratio: float = 0.8, reduced_context_ratio: float = 0.5):
+        self.session_limit = session_limit
+        self.daily_limit = daily_limit
+        self.soft_ratio = soft_ratio
+        self.reduced_context_ratio = reduced_context_ratio
+
+    @classmethod
+    def from_env(cls) -> "TokenBudget":
+        """Budget configured from TOKEN_BUDGET_* environment variables"""
+        return cls(
+            session_limit=_env_int("TOKEN_BUDGET_SESSION"),
+            daily_limit=_env_int("TOKEN_BUDGET_DAILY"),
+            soft_ratio=float(os.getenv("TOKEN_BUDGET_SOFT_RATIO", "0.8")),
+            reduced_context_ratio=float(os.getenv("TOKEN_BUDGET_REDUCED_CONTEXT", "0.5")),
+        )
+
+    def level(self, usage: TokenUsage, daily: DailyUsage) -> int:
+        ratio = 0.0
+        if self.session_limit:
+            ratio = max(ratio, usage.session_total() / self.session_limit)
+        if self.daily_limit:
+            ratio = max(ratio, daily.today_total() / self.daily_limit)
+        if ratio >= 1.0:
+            return LEVEL_EXCEEDED
+        if ratio >= self.soft_ratio:
+            return LEVEL_REDUCED
+        return LEVEL_NORMAL
+
+
+class MeteredClient:
+    """Wraps an AI client for one session: counts the usage of every response
+    in the adventure's counters and in the shared daily counters.
+
+    Everything else is forwarded to the wrapped client, so the session, its
+    background pipelines and the front-ends use it in place of the client.
+    While `use_light_model` is set, requests that do not pick a model get the
+    client's light model.
+    """
+
+    def __init__(self, ai, usage_source, daily: DailyUsage):
+        self.ai = ai
+        # Appelable : le moteur peut remplacer son TokenUsage (chargement d'une partie)
+        self._usage_source = usage_source
+        self.daily = daily
+        self.use_light_model = False
+
+    def __getattr__(self, name):
+        return getattr(self.ai, name)
+
+    def _model(self, kwargs: Dict[str, Any]):
+        if self.use_light_model and kwargs.get("model") is None:
+            kwargs["model"] = self.ai.light_model
+
+    def _record(self, response):
+        usage = getattr(response, "usage", None)
+        self._usage_source().add(usage)
+        self.daily.add(usage)
+
+    async def complete(self, messages, **kwargs):
+        self._model(kwargs)
+        response = await self.ai.complete(messages, **kwargs)
+        self._record(response)
+        return response
+
+    async def stream(self, messages, **kwargs):
+        self._model(kwargs)
+        stream = self.ai.stream(messages, **kwargs)
+        async for chunk in stream:
+            yield chunk
+        self._record(getattr(stream, "result", None))
+
+
+def describe(usage: TokenUsage, daily_usage: DailyUsage, budget: TokenBudget) -> str:
+    """One-line summary for logs and the UI"""
+    parts = [f"{usage.session_total()} tokens cette partie"]
+    if budget.session_limit:
+        parts[0] += f" / {budget.session_limit}"
+    daily = f"{daily_usage.today_total()} aujourd'hui"
+    if budget.daily_limit:
+        daily += f" / {budget.daily_limit}"
+    parts.append(daily)
+    return ", ".join(parts)
@@ -0,0 +1,82 @@
+"""
+Background world-state extraction - batches narratives into bounded AI calls
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import List, Optional
+
+
+class WorldStatePipeline:
+    """Extracts key facts from new narratives without delaying the player.
+
+    Narratives are queued by `submit()`; once `batch_size` of them are waiting a
+    worker folds them into a single extraction request with a small output
+    budget and merges the result through `GameEngine.update_world_state_from_facts`.
+    The queue is capped: when it is full the two oldest entries are merged so no
+    narrative is lost and the request size stays bounded.
+    """
+
+    def __init__(self, ai, engine, batch_size: int = 2, max_queue: int = 6, max_output_tokens: int = 256):
+        self.ai = ai
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_output_tokens = max_output_tokens
+        self._queue: deque = deque()
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, narrative: str):
+        """Queue a narrative for extraction"""
+        if not narrative.strip():
+            return
+        if len(self._queue) >= self.max_queue:
+            oldest = self._queue.popleft()
+            if self._queue:
+                self._queue[0] = f"{oldest}\n\n{self._queue[0]}"
+            else:
+                narrative = f"{oldest}\n\n{narrative}"
+            logging.debug("World-state queue full, merged the two oldest narratives.")
+        self._queue.append(narrative)
+
+        if len(self._queue) >= self.batch_size and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while len(self._queue) >= self.batch_size:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            await self._extract(batch)
+
+    def _build_prompt(self, narratives: List[str]) -> str:
+        paragraphs = "\n\n".join(narratives)
+        return (
+            "Lis les paragraphes suivants et extrais les faits importants sous forme de 'clé: valeur'. "
+            "Concentre-toi sur les noms des personnages (PNJ), leurs rôles ou caractéristiques, et les lieux importants. "
+            "Écris chaque fait sur une ligne séparée, sans autre texte. "
+            "Utilise le format: [Nom/Lieu]: [description/caractéristique].\n\n"
+            f"Paragraphes à analyser:\n{paragraphs}\n\n"
+            "Réponse:"
+        )
+
+    async def _extract(self, narratives: List[str]):
+        try:
+            raw_facts = await self.ai.complete(
+                [{"role": "user", "content": self._build_prompt(narratives)}],
+                max_output_tokens=self.max_output_tokens,
+                temperature=0.2,
+                model=self.ai.light_model,
+                thinking_budget=0,
+                priority=self.ai.PRIORITY_BACKGROUND,
+            )
+            self.engine.update_world_state_from_facts(raw_facts)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error("Could not update world state: %s", e, exc_info=True)
+
+    def cancel(self):
+        """Drop queued narratives and any extraction in flight (new game or load)"""
+        self._queue.clear()
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        self._worker = None
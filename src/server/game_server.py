@@ -0,0 +1,375 @@
+"""
+Multi-session game server - many concurrent adventures behind one pooled AI client
+
+HTTP API (JSON):
+    POST   /sessions                 {"hero", "universe", "style", "custom_universe"} -> first turn
+    GET    /sessions/{id}            current narrative and choices
+    POST   /sessions/{id}/choice     {"choice"} -> next turn
+    DELETE /sessions/{id}
+    GET    /sessions/{id}/ws         WebSocket: {"type": "choice", "choice": ...} -> turn messages
+    GET    /health                   server statistics
+"""
+import asyncio
+import logging
+import os
+import re
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from aiohttp import web, WSMsgType
+
+from ..core.story_session import StorySession
+from ..core.token_budget import DailyUsage
+from ..services.ai_service import AIClient
+from ..services.retry_policy import AIRequestError, CircuitOpenError
+from ..services.cache_service import ResponseCache
+from ..services import data_service as dm
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+class SessionEntry:
+    """An in-memory session; kept small so thousands fit in one process"""
+    __slots__ = ("session", "last_active", "lock")
+
+    def __init__(self, session: StorySession):
+        self.session = session
+        self.last_active = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class SessionManager:
+    """Keeps active sessions in memory and evicts idle ones to the save store.
+
+    Sessions are ordered by last activity, so both idle eviction and the
+    `max_sessions` cap evict from the front of the dict in O(1).
+    """
+
+    def __init__(self, ai, store_dir: str, idle_timeout: float = 900, max_sessions: int = 10000,
+                 structured_output: bool = False, daily_usage: Optional[DailyUsage] = None):
+        self.ai = ai
+        self.structured_output = structured_output
+        # Budget quotidien commun à toutes les sessions
+        self.daily_usage = daily_usage or DailyUsage()
+        self.store_dir = store_dir
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        # Sessions évincées dont l'écriture n'est pas terminée : {id: (données, tâche)}
+        self._evicting: dict = {}
+        self.evicted = 0
+        self.restored = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _store_path(self, session_id: str) -> str:
+        return os.path.join(self.store_dir, f"{session_id}.json")
+
+    def _new_session(self) -> StorySession:
+        # Pas de pré-chargement côté serveur : il multiplierait le volume de requêtes
+        return StorySession(self.ai, prefetch_enabled=False, structured_output=self.structured_output,
+                            daily_usage=self.daily_usage)
+
+    def create(self) -> tuple:
+        session_id = secrets.token_urlsafe(16)
+        entry = SessionEntry(self._new_session())
+        self._sessions[session_id] = entry
+        self._enforce_capacity(keep=session_id)
+        return session_id, entry
+
+    async def get(self, session_id: str) -> Optional[SessionEntry]:
+        """Return the session, restoring it from the store if it was evicted"""
+        if not SESSION_ID_PATTERN.match(session_id):
+            return None
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            evicting = self._evicting.get(session_id)
+            if evicting is not None:
+                # Écriture pas encore terminée : repartir des données en mémoire
+                save_data = {**evicting[0], "story_log": list(evicting[0]["story_log"])}
+            else:
+                save_data = await self._load_stored(session_id)
+            # Une autre requête a pu restaurer la session pendant la lecture
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            if save_data is None:
+                return None
+            entry = SessionEntry(self._new_session())
+            entry.session.load(save_data)
+            self._sessions[session_id] = entry
+            self.restored += 1
+            self._enforce_capacity(keep=session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        entry.last_active = time.monotonic()
+        return entry
+
+    async def _load_stored(self, session_id: str) -> Optional[dict]:
+        """Save data of an evicted session; None if the id was never stored (or was deleted)"""
+        path = self._store_path(session_id)
+        # load_json remplace un fichier absent ou illisible par {} : vérifier avant de restaurer
+        if not dm.write_pending(path) and not await dm.run_io(os.path.exists, path):
+            return None
+        save_data = await dm.load_json_async(path)
+        if not save_data.get("story_log"):
+            logging.warning("Stored session %s is empty or unreadable.", session_id)
+            return None
+        return save_data
+
+    def discard(self, session_id: str):
+        """Drop a session from memory without storing it (its first turn failed)"""
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            entry.session.cancel_background_tasks()
+
+    async def delete(self, session_id: str) -> bool:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            entry.session.cancel_background_tasks()
+        if not SESSION_ID_PATTERN.match(session_id):
+            return entry is not None
+        evicting = self._evicting.get(session_id)
+        if evicting is not None:
+            # Laisser finir l'écriture, sinon elle recréerait le fichier supprimé
+            await evicting[1]
+        path = self._store_path(session_id)
+        if await dm.run_io(os.path.exists, path):
+            await dm.run_io(os.remove, path)
+            return True
+        return entry is not None
+
+    def _evict(self, session_id: str):
+        """Move a session to the store; the file is written off the event loop"""
+        entry = self._sessions.pop(session_id)
+        entry.session.cancel_background_tasks()
+        save_data = entry.session.engine.get_save_data()
+        task = asyncio.ensure_future(dm.save_json_async(self._store_path(session_id), save_data))
+        self._evicting[session_id] = (save_data, task)
+        task.add_done_callback(lambda done: self._evicted(session_id, done))
+        self.evicted += 1
+
+    def _evicted(self, session_id: str, task: asyncio.Future):
+        if self._evicting.get(session_id, (None, None))[1] is task:
+            del self._evicting[session_id]
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Could not store evicted session %s: %s", session_id, task.exception())
+
+    def _enforce_capacity(self, keep: str):
+        """Evict the least recently used idle sessions above `max_sessions`"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for session_id, entry in list(self._sessions.items()):
+            if excess <= 0:
+                break
+            if session_id != keep and not entry.lock.locked():
+                self._evict(session_id)
+                excess -= 1
+
+    def evict_idle(self):
+        """Move sessions idle for longer than `idle_timeout` to the save store"""
+        deadline = time.monotonic() - self.idle_timeout
+        count = 0
+        for session_id, entry in list(self._sessions.items()):
+            if entry.last_active > deadline:
+                break
+            if entry.lock.locked():
+                continue
+            self._evict(session_id)
+            count += 1
+        if count:
+            logging.info("Evicted %s idle sessions (%s still active).", count, len(self._sessions))
+
+    async def evict_all(self):
+        """Store every session and wait until the files are written"""
+        for session_id in list(self._sessions):
+            self._evict(session_id)
+        await asyncio.gather(*(task for _, task in list(self._evicting.values())), return_exceptions=True)
+
+
+class GameServer:
+    """aiohttp application serving StorySessions over HTTP and WebSocket"""
+
+    def __init__(self, ai, store_dir: str = os.path.join(dm.SAVE_DIR, "server"),
+                 idle_timeout: float = 900, max_sessions: int = 10000, sweep_interval: float = 60,
+                 structured_output: bool = False):
+        self.ai = ai
+        daily_usage = DailyUsage.from_json(
+            dm.load_json(dm.TOKEN_USAGE_FILE),
+            persist=lambda data: asyncio.ensure_future(dm.save_json_async(dm.TOKEN_USAGE_FILE, data))
+        )
+        self.sessions = SessionManager(ai, store_dir, idle_timeout, max_sessions, structured_output, daily_usage)
+        self.sweep_interval = sweep_interval
+        self.universes = dm.load_all_universes()
+        self.styles = dm.load_all_styles()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/sessions", self.create_session),
+            web.get("/sessions/{session_id}", self.get_session),
+            web.post("/sessions/{session_id}/choice", self.choose),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.get("/sessions/{session_id}/ws", self.websocket),
+            web.get("/health", self.health),
+        ])
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+
+    async def _on_startup(self, app):
+        await self.ai.start()
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _on_cleanup(self, app):
+        if self._sweeper:
+            self._sweeper.cancel()
+        await self.sessions.evict_all()
+        await dm.flush_writes()
+        await self.ai.aclose()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sessions.evict_idle()
+
+    def _turn_payload(self, session_id: str, entry: SessionEntry, narrative: str, choices: list) -> dict:
+        return {"session_id": session_id, "narrative": narrative, "choices": choices, "tokens": entry.session.token_report()}
+
+    async def _play(self, session_id: str, entry: SessionEntry, user_input: str, is_continuation: bool = False) -> dict:
+        async with entry.lock:
+            try:
+                narrative, choices = await entry.session.play_turn(user_input, is_continuation)
+            except CircuitOpenError as e:
+                raise web.HTTPServiceUnavailable(text=str(e), headers={"Retry-After": str(int(e.retry_after))})
+            except AIRequestError as e:
+                raise web.HTTPBadGateway(text=f"Erreur de l'IA : {e}")
+        entry.last_active = time.monotonic()
+        if not choices:
+            raise web.HTTPBadGateway(text="L'IA n'a pas pu générer une réponse valide.")
+        return self._turn_payload(session_id, entry, narrative, choices)
+
+    async def _read_json(self, request) -> dict:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Corps JSON invalide.")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="Corps JSON invalide.")
+        return body
+
+    @staticmethod
+    def _text_field(body: dict, key: str, default: str = "") -> str:
+        value = body.get(key, default)
+        if not isinstance(value, str):
+            raise web.HTTPBadRequest(text=f"Champ '{key}' invalide : texte attendu.")
+        return value
+
+    async def _entry_or_404(self, request) -> tuple:
+        session_id = request.match_info["session_id"]
+        entry = await self.sessions.get(session_id)
+        if entry is None:
+            raise web.HTTPNotFound(text=f"Session inconnue : {session_id}")
+        return session_id, entry
+
+    async def create_session(self, request):
+        body = await self._read_json(request)
+        universe = self._text_field(body, "universe")
+        custom_universe = self._text_field(body, "custom_universe")
+        style = self._text_field(body, "style")
+        hero = self._text_field(body, "hero", "Tim")
+        if not custom_universe and universe not in self.universes:
+            raise web.HTTPBadRequest(text=f"Univers inconnu : {universe}")
+        if style not in self.styles:
+            raise web.HTTPBadRequest(text=f"Style inconnu : {style}")
+
+        session_id, entry = self.sessions.create()
+        try:
+            entry.session.new_game(
+                hero_name=hero,
+                universe_prompt=self.universes.get(universe, {}).get("prompt", ""),
+                style_instruction=self.styles[style],
+                custom_universe_prompt=custom_universe
+            )
+            turn = await self._play(session_id, entry, "Commence l'aventure.")
+        except BaseException:
+            # Le client n'a jamais reçu l'identifiant : la session serait inaccessible
+            self.sessions.discard(session_id)
+            raise
+        return web.json_response(turn)
+
+    async def get_session(self, request):
+        session_id, entry = await self._entry_or_404(request)
+        narrative, choices = entry.session.engine.get_last_narrative_and_choices()
+        return web.json_response(self._turn_payload(session_id, entry, narrative, choices))
+
+    async def choose(self, request):
+        session_id, entry = await self._entry_or_404(request)
+        body = await self._read_json(request)
+        choice = self._text_field(body, "choice").strip()
+        if not choice:
+            raise web.HTTPBadRequest(text="Choix manquant.")
+        return web.json_response(await self._play(session_id, entry, choice))
+
+    async def delete_session(self, request):
+        if not await self.sessions.delete(request.match_info["session_id"]):
+            raise web.HTTPNotFound()
+        return web.json_response({"deleted": True})
+
+    async def websocket(self, request):
+        session_id, entry = await self._entry_or_404(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        narrative, choices = entry.session.engine.get_last_narrative_and_choices()
+        await ws.send_json({"type": "turn", **self._turn_payload(session_id, entry, narrative, choices)})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                data = msg.json()
+                if not isinstance(data, dict):
+                    raise web.HTTPBadRequest(text="Message non reconnu.")
+                choice = data.get("choice")
+                if data.get("type") == "choice" and isinstance(choice, str) and choice.strip():
+                    turn = await self._play(session_id, entry, choice.strip())
+                elif data.get("type") == "continue":
+                    turn = await self._play(session_id, entry, "Continuer", is_continuation=True)
+                else:
+                    await ws.send_json({"type": "error", "error": "Message non reconnu."})
+                    continue
+                await ws.send_json({"type": "turn", **turn})
+            except web.HTTPException as e:
+                await ws.send_json({"type": "error", "error": e.text})
+            except Exception as e:
+                logging.error("WebSocket turn failed for session %s: %s", session_id, e, exc_info=True)
+                await ws.send_json({"type": "error", "error": str(e)})
+        return ws
+
+    async def health(self, request):
+        return web.json_response({
+            "active_sessions": len(self.sessions),
+            "evicted_sessions": self.sessions.evicted,
+            "restored_sessions": self.sessions.restored,
+            "ai_requests": self.ai.request_count,
+            "ai_retries": self.ai.retries_by_class,
+            "circuit_breaker": self.ai.circuit_breaker.state,
+            "scheduler": self.ai.scheduler.stats(),
+        })
+
+
+def run_server(host: str = "127.0.0.1", port: int = 8080, max_concurrent_requests: int = 32,
+               idle_timeout: float = 900, max_sessions: int = 10000, structured_output: bool = False):
+    """Serve adventures until interrupted"""
+    ai = AIClient(
+        cache=ResponseCache.from_env(),
+        pool_limit=max_concurrent_requests,
+        pool_limit_per_host=max_concurrent_requests,
+        max_concurrent_requests=max_concurrent_requests,
+    )
+    server = GameServer(ai, idle_timeout=idle_timeout, max_sessions=max_sessions, structured_output=structured_output)
+    logging.info("Game server listening on http://%s:%s", host, port)
+    web.run_app(server.app, host=host, port=port, print=None)
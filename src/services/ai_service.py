@@ -1,13 +1,292 @@
 import os
+import time
+import heapq
 import asyncio
+import itertools
+import contextlib
+import json
 import aiohttp
 import logging
 from dotenv import load_dotenv
 
+from ..utils.logger_config import log_payload
+from ..utils.tracing import tracer
+from .cache_service import ResponseCache
+from .retry_policy import (
+    AIRequestError, CircuitBreaker, RetryPolicy,
+    classify_finish_reason, classify_status, parse_retry_after,
+)
+
 load_dotenv()
 
-class AIClient:
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+# Priorités du planificateur (plus petit = servi en premier)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PREFETCH: "prefetch", PRIORITY_BACKGROUND: "background"}
+
+
+def _env_float(name: str) -> float | None:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+class GeminiContents(list):
+    """
+    The `contents` of a request payload, plus the UTF-8 JSON of each entry.
+
+    Story messages cache their entry (see core.story_log.Message.gemini), so
+    the request body is assembled from those fragments and only new messages
+    are serialized.
+    """
+
     def __init__(self):
+        super().__init__()
+        self.fragments: list[bytes] = []
+
+    def add(self, entry: dict, fragment: bytes | None = None):
+        self.append(entry)
+        self.fragments.append(fragment or json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+
+
+def encode_payload(data: dict) -> bytes:
+    """Request body of a payload, reusing the serialized `contents` entries when available."""
+    contents = data.get("contents")
+    if not isinstance(contents, GeminiContents):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+    rest = json.dumps({key: value for key, value in data.items() if key != "contents"}, ensure_ascii=False)
+    return b"".join((b'{"contents": [', b", ".join(contents.fragments), b"]", b", " + rest[1:].encode("utf-8") if len(rest) > 2 else b"}"))
+
+
+def parse_usage(metadata: dict | None) -> dict:
+    """Token counts of a Gemini usageMetadata block."""
+    metadata = metadata or {}
+    usage = {
+        "prompt": metadata.get("promptTokenCount", 0),
+        "output": metadata.get("candidatesTokenCount", 0),
+        "thoughts": metadata.get("thoughtsTokenCount", 0),
+    }
+    usage["total"] = metadata.get("totalTokenCount") or sum(usage.values())
+    return usage
+
+
+class AIResponse(str):
+    """
+    Text of an AI response, with what the API reported about it.
+
+    A str subclass, so callers that only need the text are unchanged.
+    `usage` holds the token counts from usageMetadata (see parse_usage; all
+    zero for a response served from the cache), `finish_reason` the
+    candidate's finishReason and `model` the model that produced it.
+    """
+
+    def __new__(cls, text: str, usage: dict | None = None, finish_reason: str | None = "STOP",
+                model: str | None = None, cached: bool = False):
+        response = super().__new__(cls, text)
+        response.usage = usage or parse_usage(None)
+        response.finish_reason = finish_reason
+        response.model = model
+        response.cached = cached
+        return response
+
+    @property
+    def text(self) -> str:
+        return str(self)
+
+
+class AIStream:
+    """
+    Async iterator over the text chunks of a streamed response.
+
+    Once the stream is exhausted, `result` holds the whole response as an
+    AIResponse (usage comes with the last chunk).
+    """
+
+    def __init__(self, chunks_factory):
+        self.result: AIResponse | None = None
+        self._chunks = chunks_factory(self)
+
+    def __aiter__(self):
+        return self._chunks
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket of `rate_per_minute` units, holding at most
+    `capacity` (one minute's worth by default). The level may go negative
+    when a request turns out larger than estimated; later requests repay it.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds before `amount` units are available (0 if they are now)."""
+        self._refill()
+        # Une requête plus grosse que le seau attend seulement qu'il soit plein
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class RequestScheduler:
+    """
+    Admits AI requests in priority order under requests/min, tokens/min and
+    concurrency limits.
+
+    Waiters are served strictly by (priority, arrival): while an interactive
+    turn is queued, no background request can start. A 429 with Retry-After
+    pauses every admission, so the whole client backs off together.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 max_concurrent: int | None = None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._paused_until = 0.0
+
+        # Métriques
+        self.max_queue_depth = 0
+        self._waits: dict[int, list] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._heap if not entry[3].done())
+
+    def _delay(self, tokens: int) -> float:
+        """Seconds before a request of `tokens` may start (0 = now)."""
+        delay = self._paused_until - time.monotonic()
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.time_until(1))
+        if self.token_bucket:
+            delay = max(delay, self.token_bucket.time_until(tokens))
+        return max(0.0, delay)
+
+    def _admit(self, tokens: int):
+        self.active += 1
+        if self.request_bucket:
+            self.request_bucket.consume(1)
+        if self.token_bucket:
+            self.token_bucket.consume(tokens)
+
+    def _record_wait(self, priority: int, waited: float):
+        stats = self._waits.setdefault(priority, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        """Wait for this request's turn; pair with release()."""
+        if not self._heap and (self.max_concurrent is None or self.active < self.max_concurrent) and self._delay(tokens) == 0:
+            self._admit(tokens)
+            self._record_wait(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), tokens, future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._heap))
+        queued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admise puis annulée avant d'avoir démarré : rendre la place
+                self.release()
+            else:
+                future.cancel()
+                self._dispatch()
+            raise
+        self._record_wait(priority, time.monotonic() - queued_at)
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def record_usage(self, extra_tokens: int):
+        """Charge tokens that were not known at admission (e.g. the output)."""
+        if self.token_bucket and extra_tokens > 0:
+            self.token_bucket.consume(extra_tokens)
+
+    def pause(self, seconds: float):
+        """Hold every admission for `seconds` (server asked us to back off)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._heap:
+            priority, _, tokens, future = self._heap[0]
+            if future.done():
+                heapq.heappop(self._heap)
+                continue
+            if self.max_concurrent is not None and self.active >= self.max_concurrent:
+                return
+            delay = self._delay(tokens)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._heap)
+            self._admit(tokens)
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0):
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Queue depth and wait times per priority, for /health and benchmarks."""
+        waits = {
+            PRIORITY_NAMES.get(priority, str(priority)): {
+                "requests": count,
+                "mean_wait": round(total / count, 4) if count else 0.0,
+                "max_wait": round(longest, 4),
+            }
+            for priority, (count, total, longest) in sorted(self._waits.items())
+        }
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "active": self.active,
+            "waits": waits,
+        }
+
+
+class AIClient:
+    # Exposées sur le client pour que src/core n'ait pas à importer ce module
+    PRIORITY_INTERACTIVE = PRIORITY_INTERACTIVE
+    PRIORITY_PREFETCH = PRIORITY_PREFETCH
+    PRIORITY_BACKGROUND = PRIORITY_BACKGROUND
+
+    def __init__(self, pool_limit: int = 10, pool_limit_per_host: int = 10,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 60.0,
+                 request_timeout: float = 45.0, cache: ResponseCache | None = None,
+                 max_concurrent_requests: int | None = None, base_url: str | None = None,
+                 retry_policy: RetryPolicy | None = None, circuit_breaker: CircuitBreaker | None = None,
+                 requests_per_minute: float | None = None, tokens_per_minute: float | None = None):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             logging.critical("API key GEMINI_API_KEY not found in environment variables.")
@@ -16,8 +295,74 @@ class AIClient:
             "x-goog-api-key": self.api_key,
             "Content-Type": "application/json"
         }
+        # GEMINI_BASE_URL permet de viser un serveur local (benchmarks/mock_gemini.py)
+        self.base_url = (base_url or os.getenv("GEMINI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
         self.model = "gemini-2.5-flash"
-        logging.info(f"AIClient initialized with model: {self.model}")
+        self.light_model = "gemini-2.5-flash-lite"
+
+        # Pool de connexions partagé entre tous les appels (évite un handshake TCP+TLS par tour)
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._session: aiohttp.ClientSession | None = None
+        # Quotas et concurrence partagés par toutes les sessions ; les tours de jeu passent avant le travail de fond
+        self.scheduler = RequestScheduler(
+            requests_per_minute=requests_per_minute or _env_float("AI_REQUESTS_PER_MINUTE"),
+            tokens_per_minute=tokens_per_minute or _env_float("AI_TOKENS_PER_MINUTE"),
+            max_concurrent=max_concurrent_requests,
+        )
+
+        # Compteurs pour les benchmarks et le suivi
+        self.request_count = 0
+        self.retry_count = 0
+        self.retries_by_class: dict[str, int] = {}
+
+        # Backoff exponentiel par classe d'erreur, et coupe-circuit partagé par toutes les sessions
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+        # Cache optionnel des réponses (même requête -> même réponse, sans appel API)
+        self.cache = cache
+        logging.info("AIClient initialized with model: %s", self.model)
+
+    async def start(self):
+        """Open the long-lived HTTP session and its keep-alive connection pool."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.pool_limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+        )
+        logging.info("AIClient session started (pool limit: %s, DNS cache TTL: %ss)", self.pool_limit, self.dns_cache_ttl)
+
+    async def aclose(self):
+        """Close the HTTP session and release pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info("AIClient session closed.")
+        self._session = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, starting it lazily if needed."""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
 
     def _extract_response_content(self, result):
         """
@@ -33,21 +378,24 @@ class AIClient:
             
             # Vérifier finishReason pour détecter les blocages
             finish_reason = candidate.get("finishReason")
-            if finish_reason and finish_reason != "STOP":
-                logging.warning(f"Response blocked. Finish reason: {finish_reason}")
+            if finish_reason == "MAX_TOKENS":
+                # Réponse tronquée : le texte partiel reste utilisable (réparé par l'appelant)
+                logging.warning("Response truncated. Finish reason: %s", finish_reason)
+            elif finish_reason and finish_reason != "STOP":
+                logging.warning("Response blocked. Finish reason: %s", finish_reason)
                 return None, finish_reason
             
             # Vérifier la présence de content
             if "content" not in candidate:
                 logging.error("No content in candidate")
-                return None, "NO_CONTENT"
+                return None, finish_reason or "NO_CONTENT"
             
             content = candidate["content"]
             
             # Vérifier la présence de parts
             if "parts" not in content or not content["parts"]:
                 logging.error("No parts in content")
-                return None, "NO_PARTS"
+                return None, finish_reason or "NO_PARTS"
             
             # Extraire le texte
             parts = content["parts"]
@@ -55,25 +403,29 @@ class AIClient:
                 logging.error("No text in first part")
                 return None, "NO_TEXT"
             
-            return parts[0]["text"], "SUCCESS"
+            return parts[0]["text"], finish_reason or "STOP"
             
         except (KeyError, IndexError, TypeError) as e:
-            logging.error(f"Error extracting response content: {e}")
-            logging.debug(f"Response structure: {result}")
+            logging.error("Error extracting response content: %s", e)
+            log_payload("Response structure: %s", result)
             return None, f"EXTRACTION_ERROR: {str(e)}"
 
-    async def complete(self, messages: list[dict[str, str]]) -> str:
-        # Contexte plus large avec gemini-2.5-flash
-        if len(messages) > 20:  # Beaucoup plus de contexte autorisé
-            # Garder le système + les 18 derniers
-            messages = [messages[0]] + messages[-18:]
-            logging.info(f"Context truncated to {len(messages)} messages")
+    def _build_payload(self, messages: list[dict[str, str]], max_output_tokens: int = 8192,
+                       temperature: float = 0.8, thinking_budget: int | None = None,
+                       response_schema: dict | None = None) -> dict:
+        """Convert story messages into a Gemini request payload."""
+        # Le tri du contexte (budget de tokens) est fait en amont par ContextWindow
         # Convert messages to Gemini format
-        contents = []
+        contents = GeminiContents()
         for message in messages:
+            gemini = getattr(message, "gemini", None)
+            if gemini is not None:
+                # Message du StoryLog : entrée déjà sérialisée lors d'une requête précédente
+                contents.add(*gemini())
+                continue
             # Map roles: system/user -> user, assistant -> model
             role = "user" if message.get("role") in ["system", "user"] else "model"
-            contents.append({
+            contents.add({
                 "role": role,
                 "parts": [{"text": message["content"]}]
             })
@@ -82,8 +434,8 @@ class AIClient:
         data = {
             "contents": contents,
             "generationConfig": {
-                "temperature": 0.8,
-                "maxOutputTokens": 8192
+                "temperature": temperature,
+                "maxOutputTokens": max_output_tokens
             },
             "safetySettings": [
                 {
@@ -104,80 +456,276 @@ class AIClient:
                 }
             ]
         }
-        
-        logging.debug(f"Sending request to AI. Data: {data}")
+        if thinking_budget is not None:
+            # Sans ça, le raisonnement interne consomme le budget de sortie (MAX_TOKENS)
+            data["generationConfig"]["thinkingConfig"] = {"thinkingBudget": thinking_budget}
+        if response_schema is not None:
+            # Sortie structurée : le modèle renvoie directement un JSON conforme au schéma
+            data["generationConfig"]["responseMimeType"] = "application/json"
+            data["generationConfig"]["responseSchema"] = response_schema
+        return data
+
+    def _endpoint(self, method: str, model: str | None = None) -> str:
+        """Return the model URL for a Gemini API method."""
+        return f"{self.base_url}/models/{model or self.model}:{method}"
+
+    async def _http_error(self, response) -> AIRequestError:
+        """Build the AIRequestError for a non-200 response."""
+        error_text = await response.text()
+        logging.error("API Error: %s", error_text)
+        try:
+            body = json.loads(error_text)
+        except ValueError:
+            body = None
+        return AIRequestError(
+            f"API Error {response.status}: {error_text}",
+            classify_status(response.status), response.status,
+            parse_retry_after(response.headers, body),
+        )
+
+    @staticmethod
+    def _payload_tokens(data: dict) -> int:
+        """Rough input size of a request (~4 characters per token)."""
+        return sum(len(part.get("text", "")) for content in data["contents"] for part in content["parts"]) // 4
+
+    @staticmethod
+    def _stage(name: str, priority: int) -> str:
+        """Trace stage of a request step; background requests are kept apart from turns."""
+        return name if priority == PRIORITY_INTERACTIVE else f"{name}.{PRIORITY_NAMES[priority]}"
+
+    async def _post_stream(self, data: dict, body: bytes, model: str, priority: int, usage: dict, outcome: dict):
+        """
+        Yield the text chunks of one streamGenerateContent call; `usage` receives
+        the reported token counts and `outcome` the finish reason.
+        """
+        session = await self._get_session()
+        try:
+            queued = time.perf_counter()
+            async with self.scheduler.slot(priority, self._payload_tokens(data)):
+                sent = time.perf_counter()
+                tracer.record(self._stage("queue", priority), (sent - queued) * 1000)
+                async with session.post(self._endpoint("streamGenerateContent", model), params={"alt": "sse"}, data=body) as response:
+                    if response.status != 200:
+                        raise await self._http_error(response)
+
+                    finish_reason = None
+                    first_chunk = True
+                    decode_time = 0.0
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        decode_start = time.perf_counter()
+                        try:
+                            chunk = json.loads(line[len("data:"):].strip())
+                        except ValueError as e:
+                            raise AIRequestError(f"Fragment de réponse illisible: {e}", "malformed", 200)
+                        decode_time += time.perf_counter() - decode_start
+                        if "usageMetadata" in chunk:
+                            # Compteurs cumulés : le dernier fragment porte le total
+                            usage.update(parse_usage(chunk["usageMetadata"]))
+                        candidates = chunk.get("candidates") or []
+                        if not candidates:
+                            continue
+                        candidate = candidates[0]
+                        finish_reason = candidate.get("finishReason") or finish_reason
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                if first_chunk:
+                                    # En streaming, le premier octet utile est le premier fragment de texte
+                                    tracer.record(self._stage("ttfb", priority), (time.perf_counter() - sent) * 1000, streamed=True)
+                                    first_chunk = False
+                                yield part["text"]
+                    tracer.record(self._stage("network", priority), (time.perf_counter() - sent) * 1000, streamed=True)
+                    tracer.record(self._stage("json_decode", priority), decode_time * 1000, streamed=True)
 
-        retries = 3
-        for attempt in range(retries):
+                outcome["finish_reason"] = finish_reason or "STOP"
+                if finish_reason == "MAX_TOKENS":
+                    logging.warning("Streamed response truncated. Finish reason: %s", finish_reason)
+                elif finish_reason and finish_reason != "STOP":
+                    logging.warning("Streamed response interrupted. Finish reason: %s", finish_reason)
+                    raise AIRequestError(f"Réponse interrompue: {finish_reason}", classify_finish_reason(finish_reason), 200)
+        except asyncio.TimeoutError:
+            raise AIRequestError("Délai de réponse de l'IA dépassé.", "timeout")
+        except aiohttp.ClientError as e:
+            raise AIRequestError(f"Erreur réseau: {e}", "network")
+
+    def stream(self, messages: list[dict[str, str]], use_cache: bool = True,
+               priority: int = PRIORITY_INTERACTIVE, model: str | None = None) -> AIStream:
+        """
+        Stream the AI response, yielding text chunks as they arrive.
+
+        Uses streamGenerateContent with server-sent events so the first words
+        can be rendered before the full response has been generated. Failures
+        are retried per the retry policy only until the first chunk is out.
+        The returned AIStream holds the full AIResponse once exhausted.
+        """
+        return AIStream(lambda stream: self._stream(stream, messages, use_cache, priority, model or self.model))
+
+    async def _stream(self, stream: AIStream, messages: list[dict[str, str]], use_cache: bool,
+                      priority: int, model: str):
+        with tracer.span(self._stage("payload", priority), messages=len(messages)):
+            data = self._build_payload(messages)
+        cache_key, cached = self._cache_lookup(model, data, use_cache)
+        if cached is not None:
+            stream.result = cached
+            yield cached
+            return
+        with tracer.span(self._stage("payload_encode", priority)):
+            body = encode_payload(data)
+        log_payload("Sending streaming request to AI. Data: %s", data)
+
+        retries_by_class: dict[str, int] = {}
+        attempt = 0
+        while True:
+            self._begin_attempt(attempt)
+            chunks = []
+            usage = {}
+            outcome = {}
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent", headers=self.headers, json=data, timeout=45) as response:
-                        result = await response.json()
-                        logging.debug(f"Response status: {response.status}")
-                        logging.debug(f"Received raw response from AI: {result}")
-                        
-                        if response.status != 200:
-                            logging.error(f"API Error: {result}")
-                            raise Exception(f"API Error {response.status}: {result}")
-                        
-                        # Extraction robuste avec gestion d'erreurs
-                        response_content, status = self._extract_response_content(result)
-                        
-                        if response_content is not None:
-                            logging.info("Successfully received and parsed AI response.")
-                            return response_content
-                        else:
-                            # Gestion des différents types d'erreurs
-                            if status == "SAFETY":
-                                error_msg = "Contenu bloqué par les filtres de sécurité. Tentative avec un prompt modifié..."
-                                logging.warning(error_msg)
-                                if attempt < retries - 1:
-                                    # Réessayer avec un prompt plus neutre
-                                    await asyncio.sleep(2)
-                                    continue
-                                else:
-                                    raise Exception("Contenu systématiquement bloqué par les filtres de sécurité après plusieurs tentatives.")
-                            
-                            elif status in ["NO_CANDIDATES", "NO_CONTENT", "NO_PARTS", "NO_TEXT"]:
-                                error_msg = f"Structure de réponse invalide: {status}"
-                                logging.error(error_msg)
-                                if attempt < retries - 1:
-                                    await asyncio.sleep(1)
-                                    continue
-                                else:
-                                    raise Exception(f"Structure de réponse invalide: {status}")
-                            
-                            else:
-                                error_msg = f"Erreur d'extraction inconnue: {status}"
-                                logging.error(error_msg)
-                                if attempt < retries - 1:
-                                    await asyncio.sleep(1)
-                                    continue
-                                else:
-                                    raise Exception(f"Erreur d'extraction: {status}")
-                        
-            except aiohttp.ClientError as e:
-                logging.warning(f"AI request failed (attempt {attempt + 1}/{retries}): {e}")
-                # Try to get response body for debugging
-                try:
-                    if hasattr(e, 'response') and e.response is not None:
-                        error_text = await e.response.text()
-                        logging.error(f"Error response body: {error_text}")
-                except Exception:
-                    pass
-                if attempt < retries - 1:
-                    await asyncio.sleep(1)
-                    continue
-                else:
-                    logging.error("AI request failed after all retries.", exc_info=True)
-                    raise e
-            except Exception as e:
-                logging.error("An unexpected error occurred during AI request.", exc_info=True)
-                if attempt < retries - 1:
-                    await asyncio.sleep(1)
-                    continue
-                else:
-                    raise e
-        
-        logging.critical("Failed to get a response from the AI after all retries.")
-        raise Exception("Failed to get a response from the AI after several retries.")
\ No newline at end of file
+                async for text in self._post_stream(data, body, model, priority, usage, outcome):
+                    chunks.append(text)
+                    yield text
+            except AIRequestError as e:
+                # Le début du texte est déjà affiché : impossible de réessayer proprement
+                if chunks or not await self._backoff(e, attempt, retries_by_class, priority):
+                    raise
+                attempt += 1
+                continue
+
+            self.circuit_breaker.record_success()
+            logging.info("Successfully streamed AI response.")
+            response_text = "".join(chunks)
+            stream.result = AIResponse(response_text, usage or None, outcome.get("finish_reason", "STOP"), model)
+            self._record_usage(data, stream.result)
+            # Une réponse tronquée ne doit pas être resservie telle quelle
+            if cache_key and stream.result.finish_reason != "MAX_TOKENS":
+                self.cache.put(cache_key, response_text)
+            return
+
+    def _cache_lookup(self, model: str, data: dict, use_cache: bool = True):
+        """
+        Return (cache_key, cached_response); the key is None when caching is off.
+        With use_cache=False the cached entry is bypassed but will be overwritten.
+        """
+        if self.cache is None or not self.cache.is_cacheable(data):
+            return None, None
+        cache_key = self.cache.make_key(model, data)
+        if not use_cache:
+            return cache_key, None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logging.info("Serving AI response from cache.")
+            cached = AIResponse(cached, model=model, cached=True)
+        return cache_key, cached
+
+    def _record_usage(self, data: dict, response: AIResponse):
+        """Charge the scheduler's token quota with what the request really cost."""
+        # À l'admission, seule une estimation de l'entrée a été comptée
+        if response.usage["total"]:
+            self.scheduler.record_usage(response.usage["total"] - self._payload_tokens(data))
+        else:
+            self.scheduler.record_usage(len(response) // 4)
+
+    def _begin_attempt(self, attempt: int):
+        """Check the circuit breaker and count the request."""
+        self.circuit_breaker.before_request()
+        self.request_count += 1
+        if attempt:
+            self.retry_count += 1
+
+    async def _backoff(self, error: AIRequestError, attempt: int, retries_by_class: dict[str, int],
+                       priority: int = PRIORITY_INTERACTIVE) -> bool:
+        """Record a failed attempt; sleep and return True if it should be retried."""
+        self.circuit_breaker.record_failure(error.error_class)
+        if not self.retry_policy.should_retry(error, attempt, retries_by_class):
+            logging.error("AI request failed (%s) after %s attempt(s): %s", error.error_class, attempt + 1, error)
+            return False
+        if error.error_class == "rate_limit" and error.retry_after:
+            # Quota atteint : toutes les requêtes du client attendent, pas seulement celle-ci
+            self.scheduler.pause(error.retry_after)
+        retries_by_class[error.error_class] = retries_by_class.get(error.error_class, 0) + 1
+        self.retries_by_class[error.error_class] = self.retries_by_class.get(error.error_class, 0) + 1
+        delay = self.retry_policy.delay(error, attempt)
+        logging.warning("AI request failed (%s), retrying in %.1fs (attempt %s/%s): %s", error.error_class, delay, attempt + 1, self.retry_policy.max_attempts, error)
+        with tracer.span(self._stage("retry", priority), error_class=error.error_class, attempt=attempt + 1):
+            await asyncio.sleep(delay)
+        return True
+
+    async def _post_generate(self, data: dict, body: bytes, model: str, priority: int) -> AIResponse:
+        """One generateContent call; raises AIRequestError with its error class."""
+        session = await self._get_session()
+        try:
+            queued = time.perf_counter()
+            async with self.scheduler.slot(priority, self._payload_tokens(data)):
+                sent = time.perf_counter()
+                tracer.record(self._stage("queue", priority), (sent - queued) * 1000)
+                async with session.post(self._endpoint("generateContent", model), data=body) as response:
+                    logging.debug("Response status: %s", response.status)
+                    if response.status != 200:
+                        raise await self._http_error(response)
+                    tracer.record(self._stage("ttfb", priority), (time.perf_counter() - sent) * 1000)
+                    raw = await response.read()
+                    tracer.record(self._stage("network", priority), (time.perf_counter() - sent) * 1000, model=model, bytes=len(raw))
+            try:
+                with tracer.span(self._stage("json_decode", priority)):
+                    result = json.loads(raw)
+            except ValueError as e:
+                raise AIRequestError(f"Réponse illisible: {e}", "malformed", 200)
+            log_payload("Received raw response from AI: %s", result)
+        except asyncio.TimeoutError:
+            raise AIRequestError("Délai de réponse de l'IA dépassé.", "timeout")
+        except aiohttp.ClientError as e:
+            raise AIRequestError(f"Erreur réseau: {e}", "network")
+
+        # Extraction robuste avec gestion d'erreurs
+        result = result if isinstance(result, dict) else {}
+        response_content, status = self._extract_response_content(result)
+        if response_content is None:
+            error_class = classify_finish_reason(status)
+            if error_class == "safety":
+                raise AIRequestError("Contenu bloqué par les filtres de sécurité.", "safety", 200)
+            raise AIRequestError(f"Structure de réponse invalide: {status}", error_class, 200)
+        return AIResponse(response_content, parse_usage(result.get("usageMetadata")), status, model)
+
+    async def complete(self, messages: list[dict[str, str]], max_output_tokens: int = 8192,
+                       temperature: float = 0.8, model: str | None = None,
+                       thinking_budget: int | None = None, use_cache: bool = True,
+                       priority: int = PRIORITY_INTERACTIVE, response_schema: dict | None = None) -> AIResponse:
+        """
+        Request a full response, as an AIResponse (text plus usage and finish reason). The optional arguments allow cheaper, bounded
+        calls (background summaries, fact extraction) on the same session;
+        `priority` orders them behind interactive turns in the scheduler, and
+        `response_schema` requests JSON structured output.
+        Failures are retried according to the retry policy; raises AIRequestError
+        (CircuitOpenError while the API is considered down).
+        """
+        model = model or self.model
+        with tracer.span(self._stage("payload", priority), messages=len(messages)):
+            data = self._build_payload(messages, max_output_tokens, temperature, thinking_budget, response_schema)
+        cache_key, cached = self._cache_lookup(model, data, use_cache)
+        if cached is not None:
+            return cached
+        # Encodé une seule fois, même si la requête est réessayée
+        with tracer.span(self._stage("payload_encode", priority)):
+            body = encode_payload(data)
+        log_payload("Sending request to AI. Data: %s", data)
+
+        retries_by_class: dict[str, int] = {}
+        attempt = 0
+        while True:
+            self._begin_attempt(attempt)
+            try:
+                response_content = await self._post_generate(data, body, model, priority)
+            except AIRequestError as e:
+                if not await self._backoff(e, attempt, retries_by_class, priority):
+                    raise
+                attempt += 1
+                continue
+
+            self.circuit_breaker.record_success()
+            logging.info("Successfully received and parsed AI response.")
+            self._record_usage(data, response_content)
+            if cache_key and response_content.finish_reason != "MAX_TOKENS":
+                self.cache.put(cache_key, response_content.text)
+            return response_content
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for AI responses.
+
+    Entries are keyed by a stable hash of the model, the converted `contents`
+    and the `generationConfig`. A small in-memory LRU tier sits in front of an
+    optional SQLite tier that persists responses between runs.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float | None = None,
+                 disk_path: str | None = None, max_disk_entries: int = 10000,
+                 cache_nondeterministic: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        # Avec une température > 0, la même requête peut légitimement donner une autre histoire :
+        # seules les requêtes à température 0 sont mises en cache, sauf si on l'accepte explicitement
+        self.cache_nondeterministic = cache_nondeterministic
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        if disk_path:
+            dir_name = os.path.dirname(disk_path)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            self._db = sqlite3.connect(disk_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+            logging.info("Response cache disk tier opened at %s", disk_path)
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured from AI_CACHE_* environment variables."""
+        ttl = os.getenv("AI_CACHE_TTL")
+        return cls(
+            max_entries=int(os.getenv("AI_CACHE_SIZE", "256")),
+            ttl=float(ttl) if ttl else None,
+            disk_path=os.getenv("AI_CACHE_PATH") or None,
+            cache_nondeterministic=os.getenv("AI_CACHE_NONDETERMINISTIC", "0") == "1",
+        )
+
+    @staticmethod
+    def make_key(model: str, payload: dict) -> str:
+        """Stable hash of the parts of a request that determine its response."""
+        contents = payload.get("contents")
+        fragments = getattr(contents, "fragments", None)
+        material = json.dumps(
+            {
+                "model": model,
+                "contents": contents if fragments is None else None,
+                "generationConfig": payload.get("generationConfig"),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha256(material.encode("utf-8"))
+        if fragments is not None:
+            # Entrées déjà sérialisées (clés dans un ordre fixe) : les hacher telles quelles
+            for fragment in fragments:
+                digest.update(b"\n")
+                digest.update(fragment)
+        return digest.hexdigest()
+
+    def is_cacheable(self, payload: dict) -> bool:
+        """Whether responses to this payload may be served from the cache."""
+        if self.cache_nondeterministic:
+            return True
+        return payload.get("generationConfig", {}).get("temperature", 1.0) == 0
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> str | None:
+        entry = self._memory.get(key)
+        if entry is not None:
+            created, response = entry
+            if not self._expired(created):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return response
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                response, created = row
+                if not self._expired(created):
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, created, response)
+                    self.hits += 1
+                    return response
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        self._remember(key, now, response)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._evict_disk()
+            self._db.commit()
+
+    def _remember(self, key: str, created: float, response: str):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
+
+    def clear(self):
+        self._memory.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
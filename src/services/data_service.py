@@ -1,15 +1,34 @@
 import os
 import json
+import copy
+import asyncio
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Constants ---
+# Écritures répétées d'un même fichier dans ce délai (secondes) : seule la dernière est écrite
+WRITE_COALESCE_DELAY = 0.25
 SAVE_DIR = "saves"
+# Format des nouvelles sauvegardes : "json" (lisible) ou "isave" (binaire compressé, chargé à la demande)
+SAVE_EXTENSION = ".isave" if os.getenv("SAVE_FORMAT", "json").lower() == "isave" else ".json"
+SAVE_EXTENSIONS = (".json", ".isave")
+AUTOSAVE_FILE = os.path.join(SAVE_DIR, f"autosave{SAVE_EXTENSION}")
+# Tokens consommés par jour, toutes parties confondues (budget quotidien)
+TOKEN_USAGE_FILE = os.path.join(SAVE_DIR, "token_usage.json")
 CUSTOM_UNIVERSES_FILE = "custom_universes.json"
 PRESET_UNIVERSES_FILE = "preset_universes.json"
 PRESET_STYLES_FILE = "preset_styles.json"
 CUSTOM_STYLES_FILE = "custom_styles.json"
 
 # --- Utility Functions ---
+def json_default(obj):
+    """json `default` hook: objects exposing `to_json()` (story log, messages) are saved as plain data."""
+    to_json = getattr(obj, "to_json", None)
+    if to_json is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_json()
+
 def load_json(file_path, default_data=None):
     """Loads a JSON file and returns its content."""
     if default_data is None:
@@ -18,30 +37,120 @@ def load_json(file_path, default_data=None):
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                logging.info(f"Successfully loaded JSON from {file_path}")
+                logging.info("Successfully loaded JSON from %s", file_path)
                 return data
         except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Error loading {file_path}: {e}", exc_info=True)
+            logging.error("Error loading %s: %s", file_path, e, exc_info=True)
             return default_data
-    logging.warning(f"File not found: {file_path}. Returning default data.")
+    logging.warning("File not found: %s. Returning default data.", file_path)
     return default_data
 
 def save_json(file_path, data):
-    """Saves data to a JSON file."""
+    """Saves data to a JSON file (atomically: a crash never leaves a truncated file)."""
     try:
-        dir_name = os.path.dirname(file_path)
-        if dir_name:
-            os.makedirs(dir_name, exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-            logging.info(f"Successfully saved JSON to {file_path}")
-    except IOError as e:
-        logging.error(f"Error saving to {file_path}: {e}", exc_info=True)
+        atomic_write_json(file_path, data, indent=4)
+        logging.info("Successfully saved JSON to %s", file_path)
+    except OSError as e:
+        logging.error("Error saving to %s: %s", file_path, e, exc_info=True)
+
+def atomic_write_json(file_path, data, indent=None):
+    """Writes JSON through a temp file, fsync and rename, so readers never see a partial file."""
+    dir_name = os.path.dirname(file_path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False, default=json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+def atomic_write_text(file_path, text):
+    """Writes already serialized content with the same temp file + fsync + rename sequence."""
+    dir_name = os.path.dirname(file_path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+# --- Asynchronous I/O (off the event loop) ---
+_io_executor = None
+_pending_writes = {}
+_write_tasks = {}
+
+def io_executor():
+    """Thread pool shared by all file I/O run off the event loop (created on first use)."""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="data-io")
+    return _io_executor
+
+async def run_io(func, *args):
+    """Runs a blocking file operation in the I/O thread pool and returns its result."""
+    return await asyncio.get_running_loop().run_in_executor(io_executor(), functools.partial(func, *args))
+
+async def load_json_async(file_path, default_data=None):
+    """load_json() in the I/O thread pool; a write still pending for the file is returned instead."""
+    if file_path in _pending_writes:
+        return copy.deepcopy(_pending_writes[file_path])
+    task = _write_tasks.get(file_path)
+    if task is not None and not task.done():
+        # Données déjà retirées de la file mais pas encore sur le disque
+        await asyncio.shield(task)
+    return await run_io(load_json, file_path, default_data)
+
+async def save_json_async(file_path, data):
+    """
+    Saves data to a JSON file from the I/O thread pool, atomically.
+
+    Saves of the same file within WRITE_COALESCE_DELAY seconds are merged:
+    only the latest data is written. Returns once it is on disk.
+    """
+    _pending_writes[file_path] = data
+    task = _write_tasks.get(file_path)
+    if task is None or task.done():
+        task = _write_tasks[file_path] = asyncio.get_running_loop().create_task(_flush_file(file_path))
+    await asyncio.shield(task)
+
+async def _flush_file(file_path):
+    while file_path in _pending_writes:
+        await asyncio.sleep(WRITE_COALESCE_DELAY)
+        data = _pending_writes.pop(file_path)
+        try:
+            # Sérialisé sur la boucle : l'appelant peut modifier ses dicts pendant l'écriture du fichier
+            text = json.dumps(data, indent=4, ensure_ascii=False, default=json_default)
+            await run_io(atomic_write_text, file_path, text)
+            logging.info("Successfully saved JSON to %s", file_path)
+        except OSError as e:
+            logging.error("Error saving to %s: %s", file_path, e, exc_info=True)
+
+def write_pending(file_path):
+    """Whether an asynchronous save of the file is queued or in progress."""
+    task = _write_tasks.get(file_path)
+    return task is not None and not task.done()
+
+async def flush_writes():
+    """Waits for every pending asynchronous save (call before exiting)."""
+    tasks = [task for task in _write_tasks.values() if not task.done()]
+    if tasks:
+        await asyncio.gather(*tasks)
+
+def load_all_universes():
+    """Returns preset and custom universes merged (customs override presets)."""
+    return {**load_json(PRESET_UNIVERSES_FILE), **load_json(CUSTOM_UNIVERSES_FILE)}
+
+def load_all_styles():
+    """Returns preset and custom styles merged (customs override presets)."""
+    return {**load_json(PRESET_STYLES_FILE), **load_json(CUSTOM_STYLES_FILE)}
 
 def init_default_files():
     """Creates default JSON configuration files if they don't exist."""
     if not os.path.exists(PRESET_UNIVERSES_FILE):
-        logging.info(f"{PRESET_UNIVERSES_FILE} not found, creating default.")
+        logging.info("%s not found, creating default.", PRESET_UNIVERSES_FILE)
         default_universes = {
             "Fantasy Classique": {
                 "prompt": "Le héros, {hero_name}, est un aventurier dans un royaume médiéval fantastique. Il se trouve dans un endroit aléatoire - que ce soit une forêt mystérieuse, une route de montagne, une cité marchande, des ruines anciennes, ou tout autre lieu que tu inventeras. Ce monde n'est pas aussi simple qu'il y paraît - les habitants cachent des secrets, les nobles ont des agendas politiques, et même les quêtes les plus simples ont des conséquences inattendues.\n\n**Instructions pour l'IA :**\n- Propose toujours des choix avec des dilemmes moraux\n- Les PNJ ont leurs propres motivations et ne sont pas toujours honnêtes\n- Inclus un choix créatif ou inattendu dans chaque situation\n- Les actions ont des conséquences qui reviennent plus tard\n- Évite les solutions parfaites - tout a un prix"
@@ -53,7 +162,7 @@ def init_default_files():
         save_json(PRESET_UNIVERSES_FILE, default_universes)
 
     if not os.path.exists(PRESET_STYLES_FILE):
-        logging.info(f"{PRESET_STYLES_FILE} not found, creating default.")
+        logging.info("%s not found, creating default.", PRESET_STYLES_FILE)
         default_styles = {
             "Classique": "Raconte l'histoire de manière directe et factuelle.",
             "Poétique": "Utilise un langage riche et imagé, avec des métaphores et des descriptions évocatrices pour raconter l'histoire.",
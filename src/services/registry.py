@@ -0,0 +1,181 @@
+import os
+import json
+import bisect
+import asyncio
+import hashlib
+import logging
+
+from . import data_service as dm
+
+
+class Registry:
+    """
+    Presets and custom entries of one kind (universes or styles), held in memory.
+
+    Customs override presets of the same name. `reload()` only stats the two
+    files; a file is re-read when its mtime or size changed, and re-parsed only
+    if its content hash changed too, so the app's own writes and touched files
+    cost one read. `watch()` polls for edits made outside the app.
+
+    Names are kept in a case-insensitive sorted index: `names(prefix, limit)`
+    serves the option menus in O(log n + limit) however large the library
+    grows. Listeners registered with `subscribe()` are called after every change.
+    Custom entries are written back through `persist(path, customs)`
+    (dm.save_json by default).
+    """
+
+    def __init__(self, preset_path: str, custom_path: str, persist=None):
+        self.preset_path = preset_path
+        self.custom_path = custom_path
+        self.persist = persist or dm.save_json
+        self.presets: dict = {}
+        self.customs: dict = {}
+        self.entries: dict = {}
+        self.file_reads = 0
+        # Par fichier : (mtime, taille) vus au dernier passage et empreinte du contenu
+        self._files: dict[str, tuple] = {}
+        self._index: list[tuple[str, str]] = []
+        self._listeners: list = []
+        self.reload()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def get(self, name: str, default=None):
+        return self.entries.get(name, default)
+
+    def is_preset(self, name: str) -> bool:
+        return name in self.presets
+
+    def subscribe(self, callback):
+        """Call `callback(registry)` after each change"""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error("Registry listener failed: %s", e, exc_info=True)
+
+    # --- Index ---
+    def names(self, prefix: str = "", limit: int | None = None) -> list[str]:
+        """Entry names starting with `prefix` (case-insensitive), in alphabetical order"""
+        key = prefix.casefold()
+        start = bisect.bisect_left(self._index, (key, ""))
+        names = []
+        for folded, name in self._index[start:start + limit if limit else None]:
+            if not folded.startswith(key):
+                break
+            names.append(name)
+        return names
+
+    def _rebuild(self):
+        self.entries = {**self.presets, **self.customs}
+        self._index = sorted((name.casefold(), name) for name in self.entries)
+
+    def _index_add(self, name: str):
+        entry = (name.casefold(), name)
+        position = bisect.bisect_left(self._index, entry)
+        if position == len(self._index) or self._index[position] != entry:
+            self._index.insert(position, entry)
+
+    def _index_remove(self, name: str):
+        entry = (name.casefold(), name)
+        position = bisect.bisect_left(self._index, entry)
+        if position < len(self._index) and self._index[position] == entry:
+            del self._index[position]
+
+    # --- Edits ---
+    def set(self, name: str, value):
+        """Add or replace a custom entry and save the custom file"""
+        self.customs[name] = value
+        if name not in self.entries:
+            self._index_add(name)
+        self.entries[name] = value
+        self.persist(self.custom_path, self.customs)
+        self._notify()
+
+    def remove(self, name: str) -> bool:
+        """Delete a custom entry (a preset it overrode becomes visible again)"""
+        if name not in self.customs:
+            return False
+        del self.customs[name]
+        if name in self.presets:
+            self.entries[name] = self.presets[name]
+        else:
+            del self.entries[name]
+            self._index_remove(name)
+        self.persist(self.custom_path, self.customs)
+        self._notify()
+        return True
+
+    # --- Files ---
+    def _read_changed(self) -> dict:
+        """New content of the files that changed on disk (safe to run in a worker thread)"""
+        changes = {}
+        for path in (self.preset_path, self.custom_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if path in self._files:
+                    changes[path] = (None, None, {})
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            known = self._files.get(path)
+            if known is not None and known[0] == signature:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+            except OSError as e:
+                logging.error("Error reading %s: %s", path, e)
+                continue
+            self.file_reads += 1
+            digest = hashlib.sha1(raw).hexdigest()
+            if known is not None and known[1] == digest:
+                changes[path] = (signature, digest, None)
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError as e:
+                # Fichier en cours d'édition à la main : garder les entrées connues
+                logging.error("Error loading %s: %s", path, e)
+                continue
+            changes[path] = (signature, digest, data if isinstance(data, dict) else {})
+        return changes
+
+    def _apply(self, changes: dict) -> bool:
+        changed = False
+        for path, (signature, digest, data) in changes.items():
+            if dm.write_pending(path):
+                # Notre propre écriture n'est pas terminée : le fichier lu est plus ancien que la mémoire
+                continue
+            if signature is None:
+                self._files.pop(path, None)
+            else:
+                self._files[path] = (signature, digest)
+            if data is None:
+                continue
+            target = "presets" if path == self.preset_path else "customs"
+            if data != getattr(self, target):
+                setattr(self, target, data)
+                changed = True
+        if changed:
+            self._rebuild()
+            logging.info("Registry reloaded from disk: %s presets, %s customs.", len(self.presets), len(self.customs))
+            self._notify()
+        return changed
+
+    def reload(self) -> bool:
+        """Re-read the files changed since the last check; True if the entries changed"""
+        return self._apply(self._read_changed())
+
+    async def watch(self, interval: float = 2.0):
+        """Poll the files every `interval` seconds, reading them off the event loop"""
+        while True:
+            await asyncio.sleep(interval)
+            self._apply(await dm.run_io(self._read_changed))
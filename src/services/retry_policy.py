@@ -0,0 +1,188 @@
+import time
+import random
+import logging
+from email.utils import parsedate_to_datetime
+
+
+class AIRequestError(Exception):
+    """
+    A failed AI request, tagged with the error class used by RetryPolicy.
+
+    Classes: "rate_limit" (429), "server" (5xx), "timeout", "network",
+    "malformed" (undecodable or incomplete payload), "safety", "max_tokens",
+    "client" (other 4xx, never retried).
+    """
+
+    def __init__(self, message: str, error_class: str, status: int | None = None,
+                 retry_after: float | None = None):
+        super().__init__(message)
+        self.error_class = error_class
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(AIRequestError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"Service IA indisponible, nouvel essai possible dans {retry_after:.0f}s.",
+            "circuit_open", retry_after=retry_after,
+        )
+
+
+def classify_status(status: int) -> str:
+    """Map a non-200 HTTP status to an error class."""
+    if status == 429:
+        return "rate_limit"
+    if status >= 500:
+        return "server"
+    return "client"
+
+
+def classify_finish_reason(reason: str) -> str:
+    """Map a non-STOP finishReason or an extraction status to an error class."""
+    if reason == "MAX_TOKENS":
+        return "max_tokens"
+    if reason in ("SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"):
+        return "safety"
+    return "malformed"
+
+
+def parse_retry_after(headers, body=None) -> float | None:
+    """
+    Seconds to wait from a Retry-After header (delta or HTTP date), falling
+    back to the RetryInfo detail ("retryDelay": "12s") of a Gemini error body.
+    """
+    value = headers.get("Retry-After") if headers else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if isinstance(body, dict):
+        for detail in body.get("error", {}).get("details", []) or []:
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return max(0.0, float(delay[:-1]))
+                except ValueError:
+                    pass
+    return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter and per-error-class attempt budgets.
+
+    A request is retried while its class still has budget and the total
+    number of attempts stays under `max_attempts`. Retry-After hints from
+    the server override the computed backoff, up to `max_retry_after`.
+    """
+
+    DEFAULT_BUDGETS = {
+        "rate_limit": 3,
+        "server": 2,
+        "timeout": 1,
+        "network": 2,
+        "malformed": 1,
+        "safety": 1,
+        "max_tokens": 1,
+        "client": 0,
+    }
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 max_retry_after: float = 60.0, budgets: dict[str, int] | None = None,
+                 rng: random.Random | None = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budgets = {**self.DEFAULT_BUDGETS, **(budgets or {})}
+        self.rng = rng or random.Random()
+
+    def should_retry(self, error: AIRequestError, attempt: int, retries_by_class: dict[str, int]) -> bool:
+        """attempt is 0-based; retries_by_class counts retries already spent for this request."""
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if error.retry_after is not None and error.retry_after > self.max_retry_after:
+            # Le serveur demande d'attendre trop longtemps : mieux vaut échouer tout de suite
+            return False
+        return retries_by_class.get(error.error_class, 0) < self.budgets.get(error.error_class, 0)
+
+    def delay(self, error: AIRequestError, attempt: int) -> float:
+        """Seconds to sleep before the next attempt."""
+        if error.retry_after is not None:
+            # Un peu de gigue pour que les clients limités ne reviennent pas tous en même temps
+            return error.retry_after + self.rng.uniform(0, self.base_delay)
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the API is degraded.
+
+    After `failure_threshold` consecutive failures of a tripping class
+    (rate limits, 5xx, timeouts, network errors), the circuit opens for
+    `reset_timeout` seconds. Then a single probe request is let through
+    (half-open): success closes the circuit, failure opens it again.
+    Other failures (safety blocks, malformed responses) leave the state as is.
+    """
+
+    TRIPPING_CLASSES = frozenset({"rate_limit", "server", "timeout", "network"})
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_started: float | None = None
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        if self.state == "closed":
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+            logging.info("Circuit breaker half-open: sending a probe request.")
+        if self.state == "half_open":
+            now = time.monotonic()
+            # Une sonde annulée ne doit pas bloquer le circuit indéfiniment
+            if self._probe_started is None or now - self._probe_started > self.reset_timeout:
+                self._probe_started = now
+                return
+        raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        if self.state != "closed":
+            logging.info("Circuit breaker closed: AI service recovered.")
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self, error_class: str):
+        if error_class not in self.TRIPPING_CLASSES:
+            # Erreur liée à la requête elle-même (contenu, format) : ni succès ni panne,
+            # l'état du circuit ne change pas ; une sonde terminée libère sa place
+            if self.state == "half_open":
+                self._probe_started = None
+            return
+        self.failures += 1
+        if self.state == "open":
+            # Réponses de requêtes parties avant l'ouverture du circuit
+            return
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self._probe_started = None
+        self.trips += 1
+        logging.warning("Circuit breaker opened after %s consecutive failures; failing fast for %.0fs.", self.failures, self.reset_timeout)
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+
+from . import data_service as dm
+from .save_journal import SaveJournal, journal_path
+
+# Version du schéma (PRAGMA user_version) : l'index est reconstruit depuis les fichiers s'il change
+SCHEMA_VERSION = 2
+# Lecture à rebours de la fin du journal, pour trouver le dernier enregistrement complet
+TAIL_CHUNK = 65536
+
+SORT_COLUMNS = {
+    "updated": "updated DESC",
+    "name": "name COLLATE NOCASE ASC",
+    "turns": "turns DESC",
+    "created": "created DESC",
+}
+
+
+class SaveCatalog:
+    """
+    SQLite index of the saves in `save_dir`, so they can be listed, sorted and
+    searched without opening them.
+
+    Each row keeps the save's metadata (hero, universe, style, turn count,
+    creation and last-played times), the size and mtime of its snapshot, and
+    `journal_offset`: the byte offset in its journal up to which records are
+    already counted in the row. `record()` is fed by the autosave with the
+    data already in memory. `refresh()` only stats the files: a save whose
+    journal grew past its offset (played by another process, or autosaved
+    without a catalog) is brought up to date by reading the new records from
+    that offset; only saves whose snapshot changed are re-read in full.
+    """
+
+    def __init__(self, save_dir: str = dm.SAVE_DIR, path: str | None = None):
+        self.save_dir = save_dir
+        os.makedirs(save_dir, exist_ok=True)
+        self._db = sqlite3.connect(path or os.path.join(save_dir, "catalog.db"))
+        # Une mise à jour par tour : WAL évite un fsync complet à chaque fois
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            # Simple index des fichiers : le premier refresh() le remplit de nouveau
+            self._db.execute("DROP TABLE IF EXISTS saves")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS saves ("
+            "name TEXT PRIMARY KEY, hero_name TEXT, universe TEXT, style TEXT, "
+            "turns INTEGER NOT NULL, messages INTEGER NOT NULL, "
+            "created REAL NOT NULL, updated REAL NOT NULL, "
+            "snapshot_bytes INTEGER NOT NULL, snapshot_mtime REAL NOT NULL, journal_offset INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS saves_updated ON saves (updated)")
+        self._db.commit()
+
+    @staticmethod
+    def name_of(save_path: str) -> str:
+        # Avec l'extension : `x.json` et `x.isave` sont deux sauvegardes distinctes
+        return os.path.basename(save_path)
+
+    def path_of(self, name: str) -> str:
+        if name.endswith(dm.SAVE_EXTENSIONS):
+            return os.path.join(self.save_dir, name)
+        for extension in dm.SAVE_EXTENSIONS:
+            save_path = os.path.join(self.save_dir, f"{name}{extension}")
+            if os.path.exists(save_path):
+                return save_path
+        return os.path.join(self.save_dir, f"{name}{dm.SAVE_EXTENSION}")
+
+    @staticmethod
+    def _file_stats(save_path: str) -> tuple:
+        """(snapshot bytes, snapshot mtime, journal bytes, latest mtime) of a save"""
+        snapshot = os.stat(save_path)
+        journal = journal_path(save_path)
+        journal_stat = os.stat(journal) if os.path.exists(journal) else None
+        if journal_stat is None:
+            return snapshot.st_size, snapshot.st_mtime, 0, snapshot.st_mtime
+        return snapshot.st_size, snapshot.st_mtime, journal_stat.st_size, max(snapshot.st_mtime, journal_stat.st_mtime)
+
+    @staticmethod
+    def _journal_end(save_path: str, size: int) -> int:
+        """Offset just past the last complete record of a journal of `size` bytes"""
+        if size == 0:
+            return 0
+        with open(journal_path(save_path), "rb") as f:
+            end = size
+            while end > 0:
+                start = max(0, end - TAIL_CHUNK)
+                f.seek(start)
+                chunk = f.read(end - start)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    return start + newline + 1
+                end = start
+        return 0
+
+    def record(self, save_path: str, save_data: dict, updated: float | None = None):
+        """Insert or update the entry of a save from its in-memory data
+
+        Called right after the journal was flushed: its whole content is
+        reflected in `save_data`.
+        """
+        story_log = save_data.get("story_log", [])
+        # Un journal chargé paresseusement compte ses tours depuis son index, sans décoder les messages
+        count_role = getattr(story_log, "count_role", None)
+        turns = count_role("assistant") if count_role else sum(1 for message in story_log if message.get("role") == "assistant")
+        metadata = save_data.get("metadata") or {}
+        snapshot_bytes, snapshot_mtime, journal_bytes, _ = self._file_stats(save_path)
+        # Un enregistrement tronqué en fin de journal n'a pas été rejoué : il n'est pas compté
+        journal_offset = self._journal_end(save_path, journal_bytes)
+        updated = updated or time.time()
+        self._db.execute(
+            "INSERT INTO saves (name, hero_name, universe, style, turns, messages, created, updated, "
+            "snapshot_bytes, snapshot_mtime, journal_offset) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET hero_name = excluded.hero_name, universe = excluded.universe, "
+            "style = excluded.style, turns = excluded.turns, messages = excluded.messages, "
+            "updated = excluded.updated, snapshot_bytes = excluded.snapshot_bytes, "
+            "snapshot_mtime = excluded.snapshot_mtime, journal_offset = excluded.journal_offset",
+            (
+                self.name_of(save_path), save_data.get("hero_name"), metadata.get("universe"), metadata.get("style"),
+                turns, len(story_log),
+                updated, updated, snapshot_bytes, snapshot_mtime, journal_offset,
+            ),
+        )
+        self._db.commit()
+
+    def _catch_up(self, save_path: str, row: tuple, journal_bytes: int, updated: float) -> bool:
+        """Apply the journal records written after the row's offset; False if the save must be re-read"""
+        name, hero_name, universe, style, turns, messages, journal_offset = row
+        offset = journal_offset
+        with open(journal_path(save_path), "rb") as f:
+            f.seek(journal_offset)
+            for line in f.read(journal_bytes - journal_offset).splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Offset qui ne tombe pas sur un début d'enregistrement : relecture complète
+                    return False
+                op = record.get("op")
+                if op == "append":
+                    messages += 1
+                    turns += record["message"].get("role") == "assistant"
+                elif op == "state":
+                    hero_name = record.get("hero_name", hero_name)
+                    metadata = record.get("metadata")
+                    if metadata is not None:
+                        universe, style = metadata.get("universe"), metadata.get("style")
+                elif op == "truncate":
+                    # Les rôles des messages retirés ne sont pas dans l'index
+                    return False
+                offset += len(line)
+        self._db.execute(
+            "UPDATE saves SET hero_name = ?, universe = ?, style = ?, turns = ?, messages = ?, "
+            "updated = ?, journal_offset = ? WHERE name = ?",
+            (hero_name, universe, style, turns, messages, updated, offset, name),
+        )
+        return True
+
+    def remove(self, save_path: str):
+        self._db.execute("DELETE FROM saves WHERE name = ?", (self.name_of(save_path),))
+        self._db.commit()
+
+    def refresh(self):
+        """Reconcile the index with the save directory (stat only; unchanged saves are not read)"""
+        indexed = {
+            row[0]: row
+            for row in self._db.execute(
+                "SELECT name, hero_name, universe, style, turns, messages, journal_offset, "
+                "snapshot_bytes, snapshot_mtime FROM saves"
+            )
+        }
+        reindexed = caught_up = 0
+        for file_name in os.listdir(self.save_dir):
+            if not file_name.endswith(dm.SAVE_EXTENSIONS) or file_name == os.path.basename(dm.TOKEN_USAGE_FILE):
+                continue
+            save_path = os.path.join(self.save_dir, file_name)
+            name = self.name_of(save_path)
+            snapshot_bytes, snapshot_mtime, journal_bytes, updated = self._file_stats(save_path)
+            row = indexed.pop(name, None)
+            if row is not None and row[7:] == (snapshot_bytes, snapshot_mtime):
+                journal_offset = row[6]
+                if journal_bytes == journal_offset:
+                    continue
+                # Même instantané, journal rallongé : seuls les nouveaux enregistrements sont lus
+                if journal_bytes > journal_offset and self._catch_up(save_path, row[:7], journal_bytes, updated):
+                    caught_up += 1
+                    continue
+            save_data = SaveJournal.read(save_path)
+            if save_data is None:
+                continue
+            self.record(save_path, save_data, updated=updated)
+            if hasattr(save_data["story_log"], "close"):
+                # Sauvegarde binaire : libérer la projection mémoire du fichier
+                save_data["story_log"].close()
+            reindexed += 1
+        if indexed:
+            self._db.executemany("DELETE FROM saves WHERE name = ?", [(name,) for name in indexed])
+        self._db.commit()
+        if reindexed or caught_up or indexed:
+            logging.info("Save catalog refreshed: %s saves indexed, %s caught up from their journal, %s removed.",
+                         reindexed, caught_up, len(indexed))
+
+    def list_saves(self, search: str = "", order_by: str = "updated", limit: int | None = None) -> list[dict]:
+        """Saves matching `search` (name, hero or universe), sorted by `order_by`"""
+        query = "SELECT name, hero_name, universe, style, turns, messages, created, updated FROM saves"
+        params: list = []
+        if search:
+            query += " WHERE name LIKE ? OR hero_name LIKE ? OR universe LIKE ?"
+            params = [f"%{search}%"] * 3
+        query += f" ORDER BY {SORT_COLUMNS.get(order_by, SORT_COLUMNS['updated'])}"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        columns = ("name", "hero_name", "universe", "style", "turns", "messages", "created", "updated")
+        return [dict(zip(columns, row)) for row in self._db.execute(query, params)]
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,326 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import logging
+from collections.abc import MutableSequence
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle : deflate (zlib) sinon
+    zstandard = None
+
+# Fichier .isave :
+#   en-tête   MAGIC, version (u8), codec (u8)
+#   blocs     BLOCK_SIZE messages compressés ensemble : [rôle u8][longueur u32][texte utf-8]...
+#   état      JSON compressé (héros, monde, synopsis, métadonnées...)
+#   index     nombre de messages, taille de bloc, rôles (1 octet par message), table des blocs (offset, longueur)
+#   pied      offset et longueur de l'index, MAGIC
+EXTENSION = ".isave"
+MAGIC = b"ISV1"
+VERSION = 1
+CODEC_DEFLATE = 1
+CODEC_ZSTD = 2
+BLOCK_SIZE = 32
+ROLES = ("system", "user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+_HEADER = struct.Struct("<4sBB")
+_RECORD = struct.Struct("<BI")
+_BLOCK_ENTRY = struct.Struct("<QI")
+_INDEX_HEAD = struct.Struct("<II")
+_STATE_ENTRY = struct.Struct("<QI")
+_FOOTER = struct.Struct("<QI4s")
+
+
+def is_binary(path: str) -> bool:
+    return path.endswith(EXTENSION)
+
+
+def default_codec() -> int:
+    return CODEC_ZSTD if zstandard is not None else CODEC_DEFLATE
+
+
+# Niveau 3 : la compaction réécrit tout le fichier, la vitesse compte plus que les derniers octets
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 3)
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("This save is zstd-compressed; install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _encode_block(messages) -> bytes:
+    parts = []
+    for message in messages:
+        content = message["content"].encode("utf-8")
+        parts.append(_RECORD.pack(ROLE_CODES.get(message["role"], ROLE_CODES["user"]), len(content)))
+        parts.append(content)
+    return b"".join(parts)
+
+
+def _decode_block(data: bytes) -> list:
+    messages, pos = [], 0
+    while pos < len(data):
+        role, length = _RECORD.unpack_from(data, pos)
+        pos += _RECORD.size
+        messages.append({"role": ROLES[role], "content": data[pos:pos + length].decode("utf-8")})
+        pos += length
+    return messages
+
+
+class SaveReader:
+    """Memory-mapped read access to an .isave file: state, roles and message blocks."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.codec = _HEADER.unpack_from(self._map, 0)
+            index_offset, index_length, end_magic = _FOOTER.unpack_from(self._map, len(self._map) - _FOOTER.size)
+            if magic != MAGIC or end_magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a valid save file.")
+            pos = index_offset
+            self.message_count, self.block_size = _INDEX_HEAD.unpack_from(self._map, pos)
+            pos += _INDEX_HEAD.size
+            self.roles = bytes(self._map[pos:pos + self.message_count])
+            pos += self.message_count
+            (block_count,) = struct.unpack_from("<I", self._map, pos)
+            pos += 4
+            self.blocks = [_BLOCK_ENTRY.unpack_from(self._map, pos + i * _BLOCK_ENTRY.size) for i in range(block_count)]
+            pos += block_count * _BLOCK_ENTRY.size
+            self._state_entry = _STATE_ENTRY.unpack_from(self._map, pos)
+        except Exception:
+            self.close()
+            raise
+
+    def read_state(self) -> dict:
+        offset, length = self._state_entry
+        return json.loads(_decompress(self.codec, self._map[offset:offset + length]))
+
+    def read_block(self, block: int) -> list:
+        offset, length = self.blocks[block]
+        return _decode_block(_decompress(self.codec, self._map[offset:offset + length]))
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class LazyStoryLog(MutableSequence):
+    """
+    Story log backed by an .isave file: messages are decoded block by block on
+    first access, so loading a long campaign only materializes the turns the
+    context window and the screen actually read.
+
+    It behaves like the plain list it replaces. Appends and truncations at the
+    end keep the lazy mapping; any other structural change materializes the
+    whole log first.
+    """
+
+    def __init__(self, reader: SaveReader):
+        self._reader = reader
+        self._items: list = [None] * reader.message_count
+
+    @property
+    def loaded_count(self) -> int:
+        return sum(1 for item in self._items if item is not None)
+
+    def _backed(self, index: int) -> bool:
+        return self._reader is not None and index < self._reader.message_count
+
+    def _load(self, index: int) -> dict:
+        item = self._items[index]
+        if item is None:
+            block = index // self._reader.block_size
+            first = block * self._reader.block_size
+            for offset, message in enumerate(self._reader.read_block(block)):
+                if first + offset < len(self._items) and self._items[first + offset] is None:
+                    self._items[first + offset] = message
+            item = self._items[index]
+        return item
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._load(i) for i in range(*index.indices(len(self._items)))]
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError("story log index out of range")
+        return self._load(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.materialize()
+        self._items[index] = value
+
+    def __delitem__(self, index):
+        start = index.indices(len(self._items))[0] if isinstance(index, slice) else index % max(len(self._items), 1)
+        is_suffix = isinstance(index, slice) and index.step in (None, 1) and index.indices(len(self._items))[1] >= len(self._items)
+        if not is_suffix and start != len(self._items) - 1:
+            # Supprimer au milieu décalerait les indices des blocs encore sur disque
+            self.materialize()
+        del self._items[index]
+
+    def insert(self, index, value):
+        if index < len(self._items):
+            self.materialize()
+        self._items.insert(index, value)
+
+    def clear(self):
+        self._items = []
+
+    def __iter__(self):
+        # Les blocs non chargés sont décodés pour l'itération sans être gardés en mémoire
+        size = self._reader.block_size if self._reader is not None else 1
+        index = 0
+        while index < len(self._items):
+            item = self._items[index]
+            if item is not None or not self._backed(index):
+                yield item
+                index += 1
+                continue
+            block = index // size
+            messages = self._reader.read_block(block)
+            for offset, message in enumerate(messages):
+                position = block * size + offset
+                if position >= len(self._items):
+                    break
+                if position >= index:
+                    yield self._items[position] if self._items[position] is not None else message
+            index = block * size + len(messages)
+
+    def role_at(self, index: int) -> str:
+        """Role of a message, from the index when it is not loaded"""
+        item = self._items[index]
+        if item is None and self._backed(index):
+            return ROLES[self._reader.roles[index]]
+        return self._load(index)["role"]
+
+    def count_role(self, role: str) -> int:
+        """Number of messages with `role`, read from the index for unloaded messages"""
+        code = ROLE_CODES.get(role)
+        return sum(
+            1 for index, item in enumerate(self._items)
+            if (item["role"] == role if item is not None else self._backed(index) and self._reader.roles[index] == code)
+        )
+
+    def to_json(self) -> list:
+        return list(self)
+
+    def materialize(self):
+        """Load every message and detach from the file"""
+        if self._reader is not None:
+            self._items = list(self)
+            self.close()
+
+    def rebind(self, reader: SaveReader):
+        """Point at a freshly written file holding the same messages"""
+        self.close()
+        self._reader = reader
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def read_save(path: str) -> dict:
+    """Save data with a lazily loaded story log (plus `journal_seq`)"""
+    reader = SaveReader(path)
+    save_data = reader.read_state()
+    save_data["story_log"] = LazyStoryLog(reader)
+    logging.info("Opened %s: %s messages in %s blocks.", path, reader.message_count, len(reader.blocks))
+    return save_data
+
+
+def read_save_state(path: str) -> dict:
+    """Everything but the story log, without touching the message blocks"""
+    reader = SaveReader(path)
+    try:
+        return reader.read_state()
+    finally:
+        reader.close()
+
+
+def write_save(path: str, save_data: dict, codec: int | None = None):
+    """Write save data as .isave (temp file + fsync + rename)"""
+    replace_save(path, write_save_temp(path, save_data, codec), save_data["story_log"])
+
+
+def write_save_temp(path: str, save_data: dict, codec: int | None = None) -> str:
+    """Write save data to the temp file next to `path` (fsynced); returns its path.
+
+    Only reads `save_data`: it can run in a worker thread on a detached copy,
+    the file being put in place by `replace_save` afterwards.
+    """
+    codec = codec or default_codec()
+    story_log = save_data["story_log"]
+    state = {key: value for key, value in save_data.items() if key != "story_log"}
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, codec))
+        blocks, roles, batch = [], bytearray(), []
+
+        def flush_batch():
+            payload = _compress(codec, _encode_block(batch))
+            blocks.append((f.tell(), len(payload)))
+            f.write(payload)
+            batch.clear()
+
+        for message in story_log:
+            roles.append(ROLE_CODES.get(message["role"], ROLE_CODES["user"]))
+            batch.append(message)
+            if len(batch) == BLOCK_SIZE:
+                flush_batch()
+        if batch:
+            flush_batch()
+
+        state_payload = _compress(codec, json.dumps(state, ensure_ascii=False).encode("utf-8"))
+        state_offset = f.tell()
+        f.write(state_payload)
+
+        index_offset = f.tell()
+        index = [_INDEX_HEAD.pack(len(roles), BLOCK_SIZE), bytes(roles), struct.pack("<I", len(blocks))]
+        index.extend(_BLOCK_ENTRY.pack(offset, length) for offset, length in blocks)
+        index.append(_STATE_ENTRY.pack(state_offset, len(state_payload)))
+        index = b"".join(index)
+        f.write(index)
+        f.write(_FOOTER.pack(index_offset, len(index), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def replace_save(path: str, tmp_path: str, story_log):
+    """Put a written temp file in place of `path`, moving `story_log` (the live one) onto the new file"""
+    # Journal chargé depuis un .isave, directement ou via le StoryLog du moteur
+    source = getattr(story_log, "source", story_log)
+    if isinstance(source, LazyStoryLog):
+        # Fermer la projection avant de remplacer le fichier (obligatoire sous Windows)
+        source.close()
+    try:
+        os.replace(tmp_path, path)
+    finally:
+        # Ancien ou nouveau fichier : les messages non chargés y sont aux mêmes positions
+        if hasattr(story_log, "rebase"):
+            story_log.rebase(LazyStoryLog(SaveReader(path)))
+        elif isinstance(story_log, LazyStoryLog):
+            story_log.rebind(SaveReader(path))
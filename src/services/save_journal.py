@@ -0,0 +1,366 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import logging
+
+from . import data_service as dm
+from .save_codec import is_binary, read_save, read_save_state, replace_save, write_save, write_save_temp
+
+STATE_KEYS = ("world_state", "hero_name", "synopsis", "summary_upto", "metadata", "token_usage")
+# Derniers messages écrits gardés pour détecter un retour en arrière (regénération d'un tour)
+SYNCED_TAIL = 16
+
+
+def journal_path(save_path: str) -> str:
+    """Journal file that goes with a snapshot (`name.json` -> `name.json.jsonl`, `name.isave` -> `name.isave.jsonl`)."""
+    return save_path + ".jsonl"
+
+
+def adopt_legacy_journal(save_path: str):
+    """Rename the journal of an older save (`name.jsonl`) to the path `journal_path` expects.
+
+    Only done when a single snapshot uses that name: with both `name.json`
+    and `name.isave` the old journal cannot be attributed and is left alone.
+    """
+    stem = os.path.splitext(save_path)[0]
+    legacy, current = stem + ".jsonl", journal_path(save_path)
+    if os.path.exists(current) or not os.path.exists(legacy):
+        return
+    if sum(os.path.exists(stem + extension) for extension in dm.SAVE_EXTENSIONS) != 1:
+        logging.warning("Journal %s is shared by several saves, ignoring it.", legacy)
+        return
+    os.replace(legacy, current)
+    logging.info("Journal %s renamed to %s.", legacy, current)
+
+
+def _fsync_fd(fd: int):
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SaveJournal:
+    """
+    Append-only save: a JSON snapshot plus a JSONL journal of later changes.
+
+    `record()` appends only what changed since the last call (new messages,
+    a truncation, the world state / synopsis), so a per-turn autosave costs
+    O(new messages). Writes are flushed at once but fsynced at most every
+    `fsync_interval` seconds, from the I/O thread pool when an event loop is
+    running (`close()` fsyncs synchronously). Every `compact_every` records the state is
+    folded into a new snapshot (temp file + fsync + rename) and the journal
+    restarts; under a running event loop that snapshot is written from the
+    I/O thread pool and the records of the turns played meanwhile follow it.
+    The snapshot stores the last journal sequence number it
+    contains, so a crash between both steps never replays a record twice.
+
+    The snapshot has the same layout as a plain save, so older saves load
+    unchanged (they simply have no journal). A `.isave` path keeps the
+    snapshot in the compressed binary format of save_codec instead, whose
+    story log is loaded lazily. An optional SaveCatalog is kept up to date
+    after every write.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 2.0, compact_every: int = 200, catalog=None):
+        self.path = path
+        self.catalog = catalog
+        self.journal_path = journal_path(path)
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self._file = None
+        self._seq = 0
+        self._records_since_snapshot = 0
+        self._dirty = False
+        self._last_fsync = 0.0
+        self._sync_handle: asyncio.TimerHandle | None = None
+        self._sync_task: asyncio.Future | None = None
+        # Nombre de messages écrits, les derniers d'entre eux (références) et dernier état écrit
+        self._synced_len = 0
+        self._synced_tail: list = []
+        self._state: dict = {}
+        # Compaction en cours hors de la boucle, et dernières données à journaliser après elle
+        self._compacting = False
+        self._compaction: asyncio.Future | None = None
+        self._deferred: dict | None = None
+
+    @staticmethod
+    def read(path: str) -> dict | None:
+        """Snapshot plus journal replay; None if the save does not exist or is unreadable."""
+        if not os.path.exists(path):
+            return None
+        if is_binary(path):
+            try:
+                save_data = read_save(path)
+            except (OSError, ValueError) as e:
+                logging.error("Error loading %s: %s", path, e, exc_info=True)
+                return None
+        else:
+            # load_json rend {} pour un fichier illisible : une sauvegarde a toujours un journal de récit
+            save_data = dm.load_json(path)
+            if not isinstance(save_data, dict) or "story_log" not in save_data:
+                logging.error("Save %s is empty or unreadable.", path)
+                return None
+        story_log = save_data.setdefault("story_log", [])
+        snapshot_seq = save_data.pop("journal_seq", 0)
+        adopt_legacy_journal(path)
+        path = journal_path(path)
+        if not os.path.exists(path):
+            return save_data
+
+        replayed = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("torn record")
+                    record = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal : tout ce qui précède est valide
+                    logging.warning("Ignoring torn record at the end of %s.", path)
+                    break
+                if record.get("seq", 0) <= snapshot_seq:
+                    continue
+                op = record.get("op")
+                if op == "append":
+                    story_log.append(record["message"])
+                elif op == "truncate":
+                    del story_log[record["length"]:]
+                elif op == "state":
+                    save_data.update({key: record[key] for key in STATE_KEYS if key in record})
+                replayed += 1
+        logging.info("Loaded save %s: snapshot + %s journal records.", path, replayed)
+        return save_data
+
+    def attach(self, save_data: dict):
+        """Continue journaling after `save_data` was loaded from this save."""
+        self.open()
+        self._mark_synced(save_data["story_log"])
+        self._state = self._state_of(save_data)
+
+    def _mark_synced(self, story_log):
+        self._synced_len = len(story_log)
+        self._synced_tail = story_log[-SYNCED_TAIL:]
+
+    def record(self, save_data: dict):
+        """Append the changes since the last record (called after every turn)."""
+        story_log = save_data["story_log"]
+        tail, tail_start = self._synced_tail, self._synced_len - len(self._synced_tail)
+        common = min(self._synced_len, len(story_log))
+        # Longueur du préfixe inchangé ; les messages remplacés sont tronqués puis réécrits.
+        # Le journal ne fait qu'ajouter ou tronquer en fin : seuls les derniers messages écrits sont comparés.
+        if common <= tail_start:
+            prefix = common
+        elif story_log[common - 1] is tail[common - 1 - tail_start]:
+            prefix = common
+        else:
+            prefix = tail_start
+            while prefix < common and story_log[prefix] is tail[prefix - tail_start]:
+                prefix += 1
+
+        records = []
+        if prefix < self._synced_len:
+            records.append({"op": "truncate", "length": prefix})
+        records.extend({"op": "append", "message": message} for message in story_log[prefix:])
+        state = self._state_of(save_data)
+        if state != self._state:
+            # Seules les clés modifiées : le compteur de tokens change à chaque tour, pas le synopsis
+            records.append({"op": "state", **{key: value for key, value in state.items() if self._state.get(key) != value}})
+        if not records:
+            return
+
+        if self._compacting:
+            # Le journal va être vidé : ces changements seront écrits après l'instantané
+            self._deferred = save_data
+            return
+        if self._records_since_snapshot + len(records) > self.compact_every:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                self.compact(save_data)
+                return
+            # Marquée tout de suite : les records d'ici au démarrage de la tâche sont différés aussi
+            self._compacting = True
+            self._compaction = asyncio.ensure_future(self._compact_in_background(save_data))
+            return
+
+        self.open()
+        lines = []
+        for record in records:
+            self._seq += 1
+            lines.append(json.dumps({"seq": self._seq, **record}, ensure_ascii=False, default=dm.json_default))
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        self._dirty = True
+        self._records_since_snapshot += len(records)
+        self._mark_synced(story_log)
+        self._state = state
+        self._schedule_sync()
+        self._update_catalog(save_data)
+
+    @staticmethod
+    def snapshot_of(save_data: dict) -> dict:
+        """Copy of `save_data` that another thread can write while the game goes on.
+
+        The state is deep-copied; the story log becomes a list of its
+        messages, which are never modified in place.
+        """
+        snapshot = copy.deepcopy({key: value for key, value in save_data.items() if key != "story_log"})
+        snapshot["story_log"] = list(save_data["story_log"])
+        return snapshot
+
+    def _write_snapshot(self, save_data: dict, seq: int):
+        if is_binary(self.path):
+            write_save(self.path, {**save_data, "journal_seq": seq})
+        else:
+            dm.atomic_write_json(self.path, {**save_data, "journal_seq": seq})
+
+    def compact(self, save_data: dict):
+        """Fold everything into a new snapshot and restart the journal."""
+        self.open()
+        self._write_snapshot(save_data, self._seq)
+        self._restart(save_data)
+
+    async def compact_async(self, save_data: dict):
+        """compact() with the file work done in the I/O thread pool; the game may go on meanwhile."""
+        snapshot = self.snapshot_of(save_data)
+        self._compacting = True
+        try:
+            if self._file is None:
+                await dm.run_io(self.open)
+            if is_binary(self.path):
+                tmp_path = await dm.run_io(write_save_temp, self.path, {**snapshot, "journal_seq": self._seq})
+                # Remplacement sur la boucle : le journal du moteur lit encore l'ancien fichier, il est
+                # fermé puis rattaché au nouveau (obligatoire sous Windows, sinon os.replace échoue)
+                replace_save(self.path, tmp_path, save_data["story_log"])
+            else:
+                await dm.run_io(self._write_snapshot, snapshot, self._seq)
+            if self._file is not None:
+                self._restart(snapshot)
+        finally:
+            self._compacting = False
+            deferred, self._deferred = self._deferred, None
+            if deferred is not None and self._file is not None:
+                self.record(deferred)
+
+    async def _compact_in_background(self, save_data: dict):
+        try:
+            await self.compact_async(save_data)
+        except OSError as e:
+            # Le journal reste valide : la compaction sera retentée au tour suivant
+            logging.error("Save compaction failed for %s: %s", self.path, e, exc_info=True)
+
+    def _restart(self, save_data: dict):
+        """Empty the journal once `save_data` is safely in the snapshot"""
+        self._file.close()
+        self._file = open(self.journal_path, "w", encoding="utf-8")
+        self._records_since_snapshot = 0
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._mark_synced(save_data["story_log"])
+        self._state = self._state_of(save_data)
+        logging.info("Save compacted into snapshot %s (%s messages).", self.path, self._synced_len)
+        self._update_catalog(save_data)
+
+    def _update_catalog(self, save_data: dict):
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.record(self.path, save_data)
+        except Exception as e:
+            # L'index se reconstruit depuis les fichiers : ne jamais bloquer la sauvegarde pour lui
+            logging.error("Could not update the save catalog for %s: %s", self.path, e)
+
+    def _schedule_sync(self):
+        """fsync the new records within `fsync_interval`, off the event loop when one is running"""
+        if self._sync_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self.sync()
+            return
+        delay = max(0.0, self._last_fsync + self.fsync_interval - time.monotonic())
+        self._sync_handle = loop.call_later(delay, self._sync_in_background)
+
+    def _sync_in_background(self):
+        self._sync_handle = None
+        if self._file is None or not self._dirty:
+            return
+        # Descripteur dupliqué : close() ou une compaction peuvent fermer le fichier pendant le fsync
+        fd = os.dup(self._file.fileno())
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._sync_task = asyncio.ensure_future(self._fsync_off_loop(fd))
+
+    async def _fsync_off_loop(self, fd: int):
+        try:
+            await dm.run_io(_fsync_fd, fd)
+        except OSError as e:
+            logging.error("Could not fsync journal %s: %s", self.journal_path, e)
+            self._dirty = True
+
+    def sync(self):
+        """fsync pending journal records (synchronously)."""
+        if self._file is not None and self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def open(self):
+        """Open the journal for appending, resuming after its last valid record (done on first write otherwise)."""
+        if self._file is not None:
+            return
+        dir_name = os.path.dirname(self.path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        adopt_legacy_journal(self.path)
+        self._seq = self._snapshot_seq()
+        self._records_since_snapshot = 0
+        if os.path.exists(self.journal_path):
+            # Reprendre la numérotation après le dernier enregistrement valide,
+            # et couper un enregistrement tronqué pour ne pas écrire à sa suite
+            valid_end = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("torn record")
+                        self._seq = max(self._seq, json.loads(line).get("seq", 0))
+                    except ValueError:
+                        break
+                    valid_end += len(line)
+                    self._records_since_snapshot += 1
+            if valid_end < os.path.getsize(self.journal_path):
+                logging.warning("Truncating torn record at the end of %s.", self.journal_path)
+                os.truncate(self.journal_path, valid_end)
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+
+    def _snapshot_seq(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        if is_binary(self.path):
+            try:
+                return read_save_state(self.path).get("journal_seq", 0)
+            except (OSError, ValueError):
+                return 0
+        return (dm.load_json(self.path, None) or {}).get("journal_seq", 0)
+
+    @staticmethod
+    def _state_of(save_data: dict) -> dict:
+        state = {key: save_data.get(key) for key in STATE_KEYS}
+        state["world_state"] = dict(state["world_state"] or {})
+        state["metadata"] = dict(state["metadata"] or {})
+        return state
@@ -0,0 +1,88 @@
+"""
+Event-driven integration of an asyncio event loop into Tk's main loop
+"""
+import asyncio
+import logging
+import tkinter
+
+# Intervalle de sondage quand la boucle asyncio ne peut pas être inspectée
+POLL_INTERVAL_MS = 10
+
+
+class TkAsyncioBridge:
+    """Drives an asyncio event loop from Tk's own event loop.
+
+    Tk watches the asyncio selector's file descriptor, so socket activity and
+    `call_soon_threadsafe` wake-ups reach the UI thread as soon as they happen.
+    The asyncio loop is then stepped once, and the next step is scheduled only
+    if callbacks are ready or a timer is due. When nothing is pending, no Tk
+    timer is armed and the process stays idle.
+
+    Requires Tk file handlers, which are only available on Unix platforms.
+    Knowing whether work is pending relies on private attributes of CPython's
+    selector event loop (`_selector`, `_ready`, `_scheduled`), present in
+    CPython 3.10 to 3.13. On a loop without them (another implementation or a
+    future asyncio) the bridge falls back to stepping the loop every
+    POLL_INTERVAL_MS with `after()`.
+    """
+
+    def __init__(self, root, loop: asyncio.AbstractEventLoop):
+        self.root = root
+        self.loop = loop
+        self._fd = None
+        self._timer = None
+        self.event_driven = self.can_inspect(loop)
+
+    @staticmethod
+    def is_supported(root, loop: asyncio.AbstractEventLoop) -> bool:
+        return hasattr(root.tk, "createfilehandler")
+
+    @staticmethod
+    def can_inspect(loop: asyncio.AbstractEventLoop) -> bool:
+        """Whether the loop exposes the internals needed to step it only when it has work"""
+        return all(hasattr(loop, name) for name in ("_selector", "_ready", "_scheduled"))
+
+    def start(self):
+        if self.event_driven:
+            # Descripteur epoll/kqueue du sélecteur asyncio : lisible dès qu'un socket l'est
+            self._fd = self.loop._selector.fileno()
+            self.root.tk.createfilehandler(self._fd, tkinter.READABLE, self._on_readable)
+            logging.info("asyncio loop is now driven by Tk's event loop.")
+        else:
+            logging.warning("asyncio loop internals unavailable, stepping it every %s ms from Tk.", POLL_INTERVAL_MS)
+        self.wake()
+
+    def stop(self):
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+        if self._fd is not None:
+            self.root.tk.deletefilehandler(self._fd)
+            self._fd = None
+
+    def wake(self):
+        """Step the asyncio loop as soon as Tk is idle (e.g. after creating a task)."""
+        self._arm(self.root.after_idle(self._step))
+
+    def _on_readable(self, fd, mask):
+        self._step()
+
+    def _arm(self, timer):
+        if self._timer is not None:
+            self.root.after_cancel(self._timer)
+        self._timer = timer
+
+    def _step(self):
+        self._arm(None)
+        # Une seule itération : les événements prêts sont traités puis la boucle rend la main
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+        if not self.event_driven:
+            self._arm(self.root.after(POLL_INTERVAL_MS, self._step))
+        # asyncio n'expose pas publiquement sa file de callbacks ni ses timers
+        elif self.loop._ready:
+            self._arm(self.root.after_idle(self._step))
+        elif self.loop._scheduled:
+            delay = self.loop._scheduled[0].when() - self.loop.time()
+            self._arm(self.root.after(max(0, int(delay * 1000) + 1), self._step))
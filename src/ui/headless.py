@@ -0,0 +1,107 @@
+"""
+Headless front-end - plays adventures in the console, without customtkinter
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import List, Optional
+
+from ..core.story_session import StorySession
+from ..core.token_budget import DailyUsage
+from ..services.ai_service import AIClient
+from ..services.cache_service import ResponseCache
+from ..services.retry_policy import AIRequestError
+from ..services import data_service as dm
+
+CHOICE_POLICIES = ("first", "random", "scripted")
+
+
+def pick_choice(policy: str, choices: List[str], turn: int, script: List[int], rng: random.Random) -> str:
+    """Select the choice to play for this turn (script entries are 1-based)"""
+    if policy == "random":
+        return rng.choice(choices)
+    if policy == "scripted" and turn < len(script):
+        return choices[(script[turn] - 1) % len(choices)]
+    return choices[0]
+
+
+async def run_headless(universe: str, style: str, hero: str = "Tim", turns: int = 5,
+                       policy: str = "first", script: Optional[List[int]] = None,
+                       custom_universe_prompt: str = "", seed: Optional[int] = None,
+                       quiet: bool = False, structured_output: bool = False) -> int:
+    """Play `turns` turns of an adventure and print the story; returns an exit code"""
+    if turns < 1:
+        print(f"Nombre de tours invalide : {turns} (au moins 1).")
+        return 2
+    universes = dm.load_all_universes()
+    styles = dm.load_all_styles()
+    if not custom_universe_prompt and universe not in universes:
+        print(f"Univers inconnu : '{universe}'. Disponibles : {', '.join(universes)}")
+        return 2
+    if style not in styles:
+        print(f"Style inconnu : '{style}'. Disponibles : {', '.join(styles)}")
+        return 2
+
+    rng = random.Random(seed)
+    script = script or []
+    latencies = []
+
+    try:
+        ai = AIClient(cache=ResponseCache.from_env())
+    except EnvironmentError as e:
+        print(f"[ERREUR] {e}")
+        return 2
+
+    async with ai:
+        daily_usage = DailyUsage.from_json(
+            dm.load_json(dm.TOKEN_USAGE_FILE),
+            persist=lambda data: asyncio.ensure_future(dm.save_json_async(dm.TOKEN_USAGE_FILE, data))
+        )
+        session = StorySession(ai, structured_output=structured_output, daily_usage=daily_usage)
+        session.new_game(
+            hero_name=hero,
+            universe_prompt=universes.get(universe, {}).get("prompt", ""),
+            style_instruction=styles[style],
+            custom_universe_prompt=custom_universe_prompt
+        )
+        user_input = "Commence l'aventure."
+        started = time.perf_counter()
+
+        try:
+            for turn in range(turns):
+                turn_start = time.perf_counter()
+                narrative, choices = await session.play_turn(user_input, max_retries=3 if turn == 0 else 2)
+                latencies.append(time.perf_counter() - turn_start)
+                if not choices:
+                    print(f"[Erreur] Tour {turn + 1} : l'IA n'a pas pu générer une réponse valide.")
+                    return 1
+
+                user_input = pick_choice(policy, choices, turn, script, rng)
+                if not quiet:
+                    print(f"\n=== Tour {turn + 1} ===\n{narrative}\n")
+                    for i, choice in enumerate(choices, 1):
+                        print(f"  {i}. {choice}")
+                    print(f"▶ Choix : {user_input}")
+            elapsed = time.perf_counter() - started
+        except AIRequestError as e:
+            print(f"[ERREUR] Tour {len(latencies) + 1} : {e}")
+            logging.error("Headless run aborted on turn %s: %s", len(latencies) + 1, e)
+            return 1
+        finally:
+            session.cancel_background_tasks()
+            # Compteur quotidien partagé : écrit avant de rendre la main
+            await dm.flush_writes()
+
+    print(
+        f"\n{turns} tours en {elapsed:.1f}s ({turns / elapsed:.2f} tours/s), "
+        f"latence moyenne {sum(latencies) / len(latencies):.2f}s, max {max(latencies):.2f}s"
+    )
+    tokens = session.token_report()
+    print(
+        f"{tokens['total']} tokens en {tokens['requests']} requêtes "
+        f"({tokens['prompt']} en entrée, {tokens['output']} en sortie, {tokens['thoughts']} de réflexion), "
+        f"budget : {tokens['budget_level']}"
+    )
+    logging.info("Headless run finished: %s turns in %.1fs", turns, elapsed)
+    return 0
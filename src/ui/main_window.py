@@ -1,31 +1,94 @@
 import customtkinter as ctk
-from tkinter import StringVar, simpledialog
+from tkinter import BooleanVar, StringVar, simpledialog
 import asyncio
 import re
 import traceback
 import os
+import time
 import logging
 
 from ..services.ai_service import AIClient
+from ..services.cache_service import ResponseCache
+from ..services.registry import Registry
+from ..services.save_catalog import SaveCatalog
+from ..services.save_journal import SaveJournal, journal_path
 from ..services import data_service as dm
 from ..core.engine import GameEngine
+from ..core.story_session import StorySession
+from ..core.token_budget import LEVEL_NORMAL, DailyUsage
+from ..utils.tracing import TURN_STAGES, tracer
+from .event_loop import TkAsyncioBridge
 
 class AsyncioTk(ctk.CTk):
-    """A CustomTkinter root window with an integrated asyncio event loop."""
+    """A CustomTkinter root window with an integrated asyncio event loop.
+
+    Two integration modes are available, selected by ASYNCIO_TK_MODE:
+    "event" (default where supported) lets Tk's main loop drive asyncio through
+    TkAsyncioBridge (which polls from Tk every 10 ms on asyncio loops it
+    cannot inspect); "poll" runs the legacy loop that updates Tk every 10 ms.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.running = True
-        self.loop = asyncio.get_event_loop()
+        self.loop = asyncio.new_event_loop()
+        self.bridge = None
 
     def on_closing(self):
         logging.info("Application window closing.")
         self.running = False
+        if self.bridge:
+            self.quit()
+
+    def run_forever(self):
+        """Runs the application until the window is closed."""
+        mode = os.getenv("ASYNCIO_TK_MODE", "event")
+        if mode == "event" and TkAsyncioBridge.is_supported(self, self.loop):
+            self.run_event_driven()
+        else:
+            logging.info("Using polling Tk/asyncio integration.")
+            self.loop.run_until_complete(self.run())
+
+    def run_event_driven(self):
+        """Runs Tk's main loop, stepping asyncio only when it has work to do."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.on_startup())
+        self.bridge = TkAsyncioBridge(self, self.loop)
+        self.bridge.start()
+        try:
+            self.mainloop()
+        finally:
+            self.bridge.stop()
+            self.loop.run_until_complete(self.on_shutdown())
+
+    async def on_startup(self):
+        """Hook awaited once the event loop is running, before the first frame."""
+        pass
+
+    async def on_shutdown(self):
+        """Hook awaited after the window is closed, before the loop exits."""
+        pass
 
     async def run(self):
-        while self.running:
-            self.update()
-            await asyncio.sleep(0.01)
+        await self.on_startup()
+        try:
+            while self.running:
+                self.update()
+                await asyncio.sleep(0.01)
+        finally:
+            await self.on_shutdown()
+
+# Tri proposé dans l'onglet Sauvegardes -> colonne du catalogue
+SAVE_SORT_OPTIONS = {"Plus récentes": "updated", "Nom": "name", "Nombre de tours": "turns", "Création": "created"}
+MAX_LISTED_SAVES = 200
+# Entrées proposées par les menus univers/style (filtrées par préfixe au-delà)
+MAX_MENU_ENTRIES = 200
+# Tours affichés au chargement d'une sauvegarde ; les plus anciens restent sur disque jusqu'à "Afficher tout l'historique"
+MAX_RENDERED_TURNS = 30
+# Onglet de débogage caché (Ctrl+Maj+D, ou DEBUG_PANEL=1) : percentiles par étape de tour
+PERF_TAB = "📊 Perf"
+PERF_REFRESH_MS = 1000
+
 
 class RPGApp(AsyncioTk):
     """The main application class for the RPG adventure game."""
@@ -45,30 +108,42 @@ class RPGApp(AsyncioTk):
         self.ai = None
         self.ai_available = False
         try:
-            self.ai = AIClient()
+            self.ai = AIClient(cache=ResponseCache.from_env())
             self.ai_available = True
             logging.info("AI Client initialized successfully")
         except EnvironmentError as e:
             self._handle_ai_initialization_error(e)
         except Exception as e:
-            logging.critical(f"Unexpected error initializing AIClient: {e}", exc_info=True)
+            logging.critical("Unexpected error initializing AIClient: %s", e, exc_info=True)
             self._handle_ai_initialization_error(e)
 
+        # --- Story Session (game flow, shared with the headless runner) ---
+        # Compteur quotidien commun à toutes les parties, réécrit après chaque requête
+        daily_usage = DailyUsage.from_json(
+            dm.load_json(dm.TOKEN_USAGE_FILE),
+            persist=lambda data: self.run_async(dm.save_json_async(dm.TOKEN_USAGE_FILE, data))
+        )
+        self.session = StorySession(self.ai, self.game_engine, daily_usage=daily_usage)
+
         # --- Data Loading ---
         dm.init_default_files()
         if not os.path.exists(dm.SAVE_DIR):
-            logging.info(f"Save directory '{dm.SAVE_DIR}' not found, creating it.")
+            logging.info("Save directory '%s' not found, creating it.", dm.SAVE_DIR)
             os.makedirs(dm.SAVE_DIR)
+        # Index des sauvegardes : l'onglet Sauvegardes ne rouvre jamais les fichiers
+        self.save_catalog = SaveCatalog(dm.SAVE_DIR)
+        self.save_catalog.refresh()
+        self._save_labels = {}
             
-        self.preset_universes = dm.load_json(dm.PRESET_UNIVERSES_FILE)
-        self.custom_universes = dm.load_json(dm.CUSTOM_UNIVERSES_FILE)
-        self.preset_styles = dm.load_json(dm.PRESET_STYLES_FILE)
-        self.custom_styles = dm.load_json(dm.CUSTOM_STYLES_FILE)
-        
-        self.all_universes = {**self.preset_universes, **self.custom_universes}
-        self.all_styles = {**self.preset_styles, **self.custom_styles}
+        # Univers et styles en mémoire ; les fichiers ne sont relus que s'ils changent
+        persist = lambda path, data: self.run_async(dm.save_json_async(path, data))
+        self.universes = Registry(dm.PRESET_UNIVERSES_FILE, dm.CUSTOM_UNIVERSES_FILE, persist=persist)
+        self.styles = Registry(dm.PRESET_STYLES_FILE, dm.CUSTOM_STYLES_FILE, persist=persist)
+        self._registry_watchers = []
 
         self._build_ui()
+        self.universes.subscribe(lambda _: self.update_all_universes_menu())
+        self.styles.subscribe(lambda _: self.update_style_menu())
         logging.info("UI built successfully.")
 
     def _build_ui(self):
@@ -106,6 +181,13 @@ class RPGApp(AsyncioTk):
         self._create_styles_tab(tab_view.add("🎨 Styles"))
         self._create_saves_tab(tab_view.add("💾 Sauvegardes"))
 
+        self.tab_view = tab_view
+        self.perf_text = None
+        self._perf_job = None
+        self.bind_all("<Control-Shift-D>", lambda event: self.toggle_perf_tab())
+        if os.getenv("DEBUG_PANEL") == "1":
+            self.toggle_perf_tab()
+
     def _create_play_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
 
@@ -121,16 +203,24 @@ class RPGApp(AsyncioTk):
         ctk.CTkLabel(uni_frame, text="Univers & Style", font=ctk.CTkFont(weight="bold")).pack(pady=(5,0))
         
         ctk.CTkLabel(uni_frame, text="Choix de l'univers : ").pack(pady=(5,0))
-        self.story_type_var = StringVar(value=list(self.all_universes.keys())[0] if self.all_universes else "")
-        self.story_type_menu = ctk.CTkOptionMenu(uni_frame, variable=self.story_type_var, values=list(self.all_universes.keys()))
+        self.universe_filter_entry = ctk.CTkEntry(uni_frame, placeholder_text="Filtrer les univers...")
+        self.universe_filter_entry.pack(pady=5, padx=10, fill="x")
+        self.universe_filter_entry.bind("<KeyRelease>", lambda event: self.update_all_universes_menu())
+        universe_names = self.universes.names(limit=MAX_MENU_ENTRIES)
+        self.story_type_var = StringVar(value=universe_names[0] if universe_names else "")
+        self.story_type_menu = ctk.CTkOptionMenu(uni_frame, variable=self.story_type_var, values=universe_names)
         self.story_type_menu.pack(pady=5, padx=10, fill="x")
 
         self.custom_story_entry = ctk.CTkEntry(uni_frame, placeholder_text="Ou décris ton propre univers ici...")
         self.custom_story_entry.pack(pady=5, padx=10, fill="x")
 
         ctk.CTkLabel(uni_frame, text="Style Narratif : ").pack(pady=(5,0))
-        self.style_var = StringVar(value=list(self.all_styles.keys())[0] if self.all_styles else "")
-        self.style_menu = ctk.CTkOptionMenu(uni_frame, variable=self.style_var, values=list(self.all_styles.keys()))
+        self.style_filter_entry = ctk.CTkEntry(uni_frame, placeholder_text="Filtrer les styles...")
+        self.style_filter_entry.pack(pady=5, padx=10, fill="x")
+        self.style_filter_entry.bind("<KeyRelease>", lambda event: self.update_style_menu())
+        style_names = self.styles.names(limit=MAX_MENU_ENTRIES)
+        self.style_var = StringVar(value=style_names[0] if style_names else "")
+        self.style_menu = ctk.CTkOptionMenu(uni_frame, variable=self.style_var, values=style_names)
         self.style_menu.pack(pady=5, padx=10, fill="x")
 
         action_frame = ctk.CTkFrame(tab)
@@ -139,6 +229,14 @@ class RPGApp(AsyncioTk):
         self.start_button.pack(pady=5, padx=10, fill="x")
         self.restart_button = ctk.CTkButton(action_frame, text="Recommencer", command=self.start_game_async)
         self.restart_button.pack(pady=5, padx=10, fill="x")
+        self.streaming_var = BooleanVar(value=True)
+        self.streaming_switch = ctk.CTkSwitch(action_frame, text="Affichage progressif", variable=self.streaming_var)
+        self.streaming_switch.pack(pady=5, padx=10, anchor="w")
+        self.prefetch_var = BooleanVar(value=False)
+        self.prefetch_switch = ctk.CTkSwitch(action_frame, text="Pré-chargement des choix", variable=self.prefetch_var)
+        self.prefetch_switch.pack(pady=5, padx=10, anchor="w")
+        self.token_label = ctk.CTkLabel(action_frame, text="", wraplength=220, justify="left")
+        self.token_label.pack(pady=5, padx=10, anchor="w")
 
     def _create_universes_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
@@ -208,21 +306,80 @@ class RPGApp(AsyncioTk):
         self.save_button = ctk.CTkButton(sl_frame, text="Sauvegarder la partie actuelle", command=self.save_game)
         self.save_button.pack(pady=5, padx=10, fill="x")
 
+        self.save_search_entry = ctk.CTkEntry(sl_frame, placeholder_text="Rechercher (nom, héros, univers)...")
+        self.save_search_entry.pack(pady=(10, 5), padx=10, fill="x")
+        self.save_search_entry.bind("<KeyRelease>", lambda event: self.update_load_menu())
+        self.save_sort_var = StringVar(value="Plus récentes")
+        ctk.CTkOptionMenu(
+            sl_frame, variable=self.save_sort_var, values=list(SAVE_SORT_OPTIONS),
+            command=lambda _: self.update_load_menu()
+        ).pack(pady=5, padx=10, fill="x")
+
         self.load_menu_var = StringVar(value="Choisir une sauvegarde")
         self.load_menu = ctk.CTkOptionMenu(sl_frame, variable=self.load_menu_var, values=[])
         self.load_menu.pack(pady=10, padx=10, fill="x")
         self.update_load_menu()
 
-        self.load_button = ctk.CTkButton(sl_frame, text="Charger la sauvegarde", command=self.load_game)
+        self.load_button = ctk.CTkButton(sl_frame, text="Charger la sauvegarde", command=lambda: self.run_async(self.load_game()))
         self.load_button.pack(pady=5, padx=10, fill="x")
 
         self.delete_button = ctk.CTkButton(sl_frame, text="Supprimer la sauvegarde", command=self.delete_save)
         self.delete_button.pack(pady=5, padx=10, fill="x")
 
+        self.history_button = ctk.CTkButton(sl_frame, text="Afficher tout l'historique", command=self.show_full_history)
+        self.history_button.pack(pady=5, padx=10, fill="x")
+
+    def toggle_perf_tab(self):
+        """Show or hide the tab with the p50/p95 of each turn stage."""
+        if self.perf_text is not None:
+            if self._perf_job is not None:
+                self.after_cancel(self._perf_job)
+                self._perf_job = None
+            self.tab_view.delete(PERF_TAB)
+            self.perf_text = None
+            return
+        tab = self.tab_view.add(PERF_TAB)
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(0, weight=1)
+        self.perf_text = ctk.CTkTextbox(tab, state="disabled", wrap="none", font=("Courier", 12))
+        self.perf_text.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
+        ctk.CTkButton(tab, text="Réinitialiser", command=tracer.reset).grid(row=1, column=0, padx=5, pady=5, sticky="ew")
+        self.tab_view.set(PERF_TAB)
+        self._refresh_perf_tab()
+
+    def _refresh_perf_tab(self):
+        self._perf_job = None
+        if self.perf_text is None:
+            return
+        stats = tracer.stats()
+        # Étapes du tour dans l'ordre, puis les requêtes de fond
+        stages = [stage for stage in TURN_STAGES if stage in stats] + sorted(set(stats) - set(TURN_STAGES))
+        lines = [f"{'étape':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}"]
+        for stage in stages:
+            row = stats[stage]
+            lines.append(f"{stage:<26}{row['count']:>6}{row['p50']:>10.1f}{row['p95']:>10.1f}")
+        if not stages:
+            lines.append("Aucun tour mesuré pour l'instant.")
+        self.perf_text.configure(state="normal")
+        self.perf_text.delete("1.0", "end")
+        self.perf_text.insert("end", "\n".join(lines))
+        self.perf_text.configure(state="disabled")
+        self._perf_job = self.after(PERF_REFRESH_MS, self._refresh_perf_tab)
+
     def display_log(self, message):
         """Appends a message to the main text box in the UI."""
+        with tracer.span("render_log"):
+            self.text.configure(state="normal")
+            self.text.insert("end", message + "\n\n")
+            self.text.configure(state="disabled")
+            self.text.see("end")
+
+    def render_transcript(self, messages):
+        """Replaces the text box content with the given messages in a single insert."""
         self.text.configure(state="normal")
-        self.text.insert("end", message + "\n\n")
+        self.text.delete("1.0", "end")
+        if messages:
+            self.text.insert("end", "\n\n".join(messages) + "\n\n")
         self.text.configure(state="disabled")
         self.text.see("end")
 
@@ -261,7 +418,9 @@ class RPGApp(AsyncioTk):
                 widget.configure(font=("Arial", self.choices_font_size))
 
     def run_async(self, coro):
-        asyncio.create_task(coro)
+        self.loop.create_task(coro)
+        if self.bridge:
+            self.bridge.wake()
 
     def start_game_async(self):
         logging.info("User clicked 'Start Adventure'.")
@@ -271,85 +430,99 @@ class RPGApp(AsyncioTk):
         if not self._check_ai_available():
             return
         
-        self.game_engine.clear_game_state()
-        self.text.configure(state="normal")
-        self.text.delete("1.0", "end")
-        self.text.configure(state="disabled")
-        
         universe_name = self.story_type_var.get()
-        custom_universe_prompt = self.custom_story_entry.get().strip()
         style_name = self.style_var.get()
-        style_instruction = self.all_styles.get(style_name, "Style par défaut.")
-        self.game_engine.set_hero_name(self.hero_name_entry.get())
-
-        # --- Build the System Prompt ---
-        if custom_universe_prompt:
-            base_prompt = f"Lance une aventure sur ce thème : {custom_universe_prompt}. Le héros est {self.game_engine.hero_name}."
-            logging.info(f"Starting game with custom universe. Hero: {self.game_engine.hero_name}, Prompt: {custom_universe_prompt}")
-        else:
-            base_prompt = self.all_universes.get(universe_name, {}).get("prompt", "").replace("{hero_name}", self.game_engine.hero_name)
-            logging.info(f"Starting game with preset universe. Hero: {self.game_engine.hero_name}, Universe: {universe_name}")
-
-        prompt_system = self.game_engine.build_system_prompt(base_prompt, style_instruction)
-        
-        self.game_engine.add_system_message(prompt_system)
-        logging.debug(f"System prompt set: {prompt_system}")
+        logging.info("Universe: %s, Style: %s", universe_name, style_name)
+        self.session.new_game(
+            hero_name=self.hero_name_entry.get(),
+            universe_prompt=self.universes.get(universe_name, {}).get("prompt", ""),
+            style_instruction=self.styles.get(style_name, "Style par défaut."),
+            custom_universe_prompt=self.custom_story_entry.get().strip(),
+            metadata={
+                "universe": "Univers personnalisé" if self.custom_story_entry.get().strip() else universe_name,
+                "style": style_name,
+            }
+        )
+        journal = SaveJournal(dm.AUTOSAVE_FILE, catalog=self.save_catalog)
+        try:
+            await journal.compact_async(self.game_engine.get_save_data())
+            self.session.attach_journal(journal, compacted=True)
+        except OSError as e:
+            # La partie se joue quand même, sans sauvegarde automatique
+            self.session.attach_journal(None)
+            self.display_log(f"[ERREUR] Sauvegarde automatique impossible : {e}")
+            logging.error("Could not start the autosave: %s", e, exc_info=True)
+        self.update_load_menu()
+        self.render_transcript([])
         self.display_log("Lancement de l'aventure...")
         await self.ask_ai("Commence l'aventure.", max_retries=3)
 
+    async def on_startup(self):
+        """Open the AI client's pooled HTTP session and watch the universe/style files once the loop is running."""
+        if self.ai:
+            await self.ai.start()
+        self._registry_watchers = [self.loop.create_task(registry.watch()) for registry in (self.universes, self.styles)]
+
+    async def on_shutdown(self):
+        """Release the AI client's pooled connections and flush the autosave and pending writes."""
+        for watcher in self._registry_watchers:
+            watcher.cancel()
+        await dm.flush_writes()
+        self.session.attach_journal(None)
+        self.save_catalog.close()
+        if self.ai:
+            await self.ai.aclose()
+            if self.ai.cache:
+                self.ai.cache.close()
+
     # --- Generic Item Management ---
-    def _add_or_update_item(self, name, description, item_dict, file_path, update_callback, item_type_name, name_entry, desc_textbox, is_structured=False):
+    def _add_or_update_item(self, name, description, registry, item_type_name, name_entry, desc_textbox, is_structured=False):
         if not name or not description:
             self.display_log(f"[ERREUR] Le nom et la description de l'{item_type_name}' ne peuvent pas être vides.")
-            logging.warning(f"Attempted to add/update {item_type_name} with empty name or description.")
+            logging.warning("Attempted to add/update %s with empty name or description.", item_type_name)
             return
 
-        if is_structured:
-            item_dict[name] = {"prompt": description}
-        else:
-            item_dict[name] = description
-            
-        dm.save_json(file_path, item_dict)
-        update_callback()
+        # Le registre écrit le fichier hors de la boucle et rafraîchit le menu
+        registry.set(name, {"prompt": description} if is_structured else description)
         self.display_log(f"[INFO] {item_type_name.capitalize()} '{name}' ajouté/mis à jour.")
-        logging.info(f"{item_type_name.capitalize()} '{name}' was added or updated.")
+        logging.info("%s '%s' was added or updated.", item_type_name.capitalize(), name)
         name_entry.delete(0, "end")
         desc_textbox.delete("0.0", "end")
 
-    def _delete_item(self, name_var, preset_dict, custom_dict, file_path, update_callback, item_type_name):
+    def _delete_item(self, name_var, registry, item_type_name):
         name = name_var.get()
-        if name in preset_dict:
+        if registry.is_preset(name):
             self.display_log(f"[ERREUR] Impossible de supprimer un {item_type_name} prédéfini.")
-            logging.warning(f"Attempted to delete a preset {item_type_name}: {name}")
+            logging.warning("Attempted to delete a preset %s: %s", item_type_name, name)
             return
         
-        if name in custom_dict:
-            logging.info(f"Deleting custom {item_type_name}: {name}")
-            del custom_dict[name]
-            dm.save_json(file_path, custom_dict)
-            update_callback()
+        if registry.remove(name):
+            logging.info("Deleted custom %s: %s", item_type_name, name)
             self.display_log(f"[INFO] {item_type_name.capitalize()} '{name}' supprimé.")
         else:
             self.display_log(f"[ERREUR] {item_type_name.capitalize()} personnalisé non trouvé ou non sélectionné.")
-            logging.warning(f"Attempted to delete non-existent custom {item_type_name}: {name}")
+            logging.warning("Attempted to delete non-existent custom %s: %s", item_type_name, name)
+
+    @staticmethod
+    def _refresh_menu(menu, variable, registry, filter_entry):
+        """Show the entries matching the filter, keeping the selection when it is still listed"""
+        names = registry.names(filter_entry.get().strip(), limit=MAX_MENU_ENTRIES)
+        menu.configure(values=names)
+        if variable.get() not in names:
+            variable.set(names[0] if names else "")
 
     # --- Universe Management ---
     def update_all_universes_menu(self):
-        self.all_universes = {**self.preset_universes, **self.custom_universes}
-        keys = list(self.all_universes.keys())
-        self.story_type_menu.configure(values=keys)
-        if keys: self.story_type_var.set(keys[0])
+        self._refresh_menu(self.story_type_menu, self.story_type_var, self.universes, self.universe_filter_entry)
         logging.debug("Universe menu updated.")
 
     def add_or_update_custom_universe(self):
         name = self.custom_uni_name_entry.get().strip()
-        logging.info(f"User clicked 'Add/Update Universe' for: {name}")
+        logging.info("User clicked 'Add/Update Universe' for: %s", name)
         self._add_or_update_item(
             name=name,
             description=self.custom_uni_desc_textbox.get("0.0", "end").strip(),
-            item_dict=self.custom_universes,
-            file_path=dm.CUSTOM_UNIVERSES_FILE,
-            update_callback=self.update_all_universes_menu,
+            registry=self.universes,
             item_type_name="univers",
             name_entry=self.custom_uni_name_entry,
             desc_textbox=self.custom_uni_desc_textbox,
@@ -358,27 +531,22 @@ class RPGApp(AsyncioTk):
 
     def delete_custom_universe(self):
         name = self.story_type_var.get()
-        logging.info(f"User clicked 'Delete Universe' for: {name}")
-        self._delete_item(self.story_type_var, self.preset_universes, self.custom_universes, dm.CUSTOM_UNIVERSES_FILE, self.update_all_universes_menu, "univers")
+        logging.info("User clicked 'Delete Universe' for: %s", name)
+        self._delete_item(self.story_type_var, self.universes, "univers")
 
     # --- Style Management ---
     def update_style_menu(self):
-        self.all_styles = {**self.preset_styles, **self.custom_styles}
-        keys = list(self.all_styles.keys())
-        self.style_menu.configure(values=keys)
-        if keys: self.style_var.set(keys[0])
+        self._refresh_menu(self.style_menu, self.style_var, self.styles, self.style_filter_entry)
         logging.debug("Style menu updated.")
 
     def add_or_update_custom_style(self):
         name = self.custom_style_name_entry.get().strip()
         description = self.custom_style_desc_textbox.get("0.0", "end").strip()
-        logging.info(f"User clicked 'Add/Update Style' for: {name}")
+        logging.info("User clicked 'Add/Update Style' for: %s", name)
         self._add_or_update_item(
             name=name,
             description=description,
-            item_dict=self.custom_styles,
-            file_path=dm.CUSTOM_STYLES_FILE,
-            update_callback=self.update_style_menu,
+            registry=self.styles,
             item_type_name="style",
             name_entry=self.custom_style_name_entry,
             desc_textbox=self.custom_style_desc_textbox
@@ -386,69 +554,92 @@ class RPGApp(AsyncioTk):
 
     def delete_custom_style(self):
         name = self.style_var.get()
-        logging.info(f"User clicked 'Delete Style' for: {name}")
-        self._delete_item(self.style_var, self.preset_styles, self.custom_styles, dm.CUSTOM_STYLES_FILE, self.update_style_menu, "style")
+        logging.info("User clicked 'Delete Style' for: %s", name)
+        self._delete_item(self.style_var, self.styles, "style")
 
     # --- AI Interaction ---
-    async def _update_world_state(self, new_narrative):
-        """Asks the AI to extract key facts from the new narrative."""
-        if not new_narrative.strip():
-            return
-
-        prompt = (
-            "Lis le paragraphe suivant et extrais les faits importants sous forme de 'clé: valeur'. "
-            "Concentre-toi sur les noms des personnages (PNJ), leurs rôles ou caractéristiques, et les lieux importants. "
-            "Écris chaque fait sur une ligne séparée. "
-            "Utilise le format: [Nom/Lieu]: [description/caractéristique].\n\n"
-            f"Paragraphe à analyser:\n{new_narrative}\n\n"
-            "Réponse:"
-        )
-        
-        try:
-            # Use a simpler, faster model for this extraction if possible, or just the same one
-            messages = [{"role": "user", "content": prompt}]
-            raw_facts = await self.ai.complete(messages) # This assumes 'complete' can be used for such tasks
-            
-            self.game_engine.update_world_state_from_facts(raw_facts)
-
-        except Exception as e:
-            logging.error(f"Could not update world state: {e}", exc_info=True)
-
-
-    async def ask_ai(self, user_input, is_continuation=False, max_retries=2, previous_response=None):
-        logging.debug(f"ask_ai called. Input: '{user_input}', Continuation: {is_continuation}, Retries left: {max_retries}")
-
-        prompt = self.game_engine.build_prompt_with_context(user_input, is_continuation, previous_response)
-        
-        if not previous_response:
-            self.game_engine.add_user_message(prompt)
-            logging.debug(f"Appended user message to story log: {prompt}")
+    async def ask_ai(self, user_input, is_continuation=False, max_retries=2):
+        logging.debug("ask_ai called. Input: '%s', Continuation: %s, Retries: %s", user_input, is_continuation, max_retries)
+        self.session.prefetch_enabled = self.prefetch_var.get()
+        generate = self._stream_ai_response if self.streaming_var.get() else None
 
         try:
-            message = await self.ai.complete(self.game_engine.story_log)
-            self.game_engine.add_assistant_message(message)
-            text, choices = self.game_engine.extract_choices(message)
+            # Le tour mesuré couvre aussi l'affichage de la réponse
+            with tracer.turn(streaming=generate is not None):
+                text, choices = await self.session.play_turn(
+                    user_input, is_continuation, max_retries,
+                    generate=generate,
+                    on_retry=lambda retries_left: self.display_log("Réponse de l'IA invalide. Nouvelle tentative...")
+                )
 
-            if len(choices) == 4:
-                self.display_log(text)
-                self.update_choices(choices)
-                # await self._update_world_state(text) # DISABLED: Causes MAX_TOKENS - TODO: Fix later
-                logging.info("AI response was valid. Updated UI and world state.")
-            elif max_retries > 0:
-                self.display_log("Réponse de l'IA invalide. Nouvelle tentative...")
-                logging.warning(f"Invalid AI response format. Retrying... (Retries left: {max_retries-1})")
-                self.game_engine.remove_last_message()
-                await self.ask_ai(user_input, is_continuation, max_retries - 1, previous_response=message)
-            else:
-                self.display_log("[Erreur Critique] L'IA n'a pas pu générer une réponse valide.")
-                logging.error("AI failed to generate a valid response after all retries.")
-                self.update_choices([])
+                if choices:
+                    self.display_log(text)
+                    self.update_choices(choices)
+                    logging.info("AI response was valid. Updated UI.")
+                else:
+                    self.display_log("[Erreur Critique] L'IA n'a pas pu générer une réponse valide.")
+                    self.update_choices([])
+            self.update_token_label()
 
         except Exception as e:
             self.display_log(f"[Erreur Inattendue] {e}")
-            logging.critical(f"An unexpected error occurred in ask_ai: {e}", exc_info=True)
+            logging.critical("An unexpected error occurred in ask_ai: %s", e, exc_info=True)
+
+    def update_token_label(self):
+        """Show the tokens spent by the adventure and whether the budget degraded it."""
+        text = self.session.describe_tokens()
+        if self.session.apply_token_budget() != LEVEL_NORMAL:
+            text += " — budget atteint, mode économe"
+        self.token_label.configure(text=text)
+
+    def _wake_loop(self):
+        """Lets the event-driven loop process cancellations made from a Tk callback."""
+        if self.bridge:
+            self.bridge.wake()
+
+    async def _stream_ai_response(self, messages, use_cache=True):
+        """
+        Streams the AI response into the text box as it is generated.
+
+        Narrative lines are shown as soon as they are complete and choice lines
+        are turned into (disabled) buttons as they appear. The preview is removed
+        once the stream ends so the caller can display the validated narrative.
+        """
+        self.text.mark_set("stream_start", "end-1c")
+        self.text.mark_gravity("stream_start", "left")
+        chunks, pending, choices = [], "", []
+        has_narrative = False
+        try:
+            # Client de la session : tokens comptés et budget appliqué
+            async for chunk in self.session.ai.stream(messages, use_cache=use_cache):
+                chunks.append(chunk)
+                *lines, pending = (pending + chunk).split("\n")
+                new_narrative = []
+                for line in lines:
+                    choice = self.game_engine.parse_choice_line(line)
+                    if choice is not None:
+                        choices.append(choice.replace("{hero_name}", self.game_engine.hero_name))
+                        self.update_choices(choices, enabled=False)
+                    elif has_narrative or line.strip():
+                        has_narrative = True
+                        new_narrative.append(line.replace("{hero_name}", self.game_engine.hero_name) + "\n")
+                if new_narrative:
+                    self.text.configure(state="normal")
+                    self.text.insert("end", "".join(new_narrative))
+                    self.text.configure(state="disabled")
+                    self.text.see("end")
+            return "".join(chunks)
+        finally:
+            self.text.configure(state="normal")
+            self.text.delete("stream_start", "end")
+            self.text.configure(state="disabled")
+            self.text.mark_unset("stream_start")
 
-    def update_choices(self, choices):
+    def update_choices(self, choices, enabled=True):
+        with tracer.span("render_choices", count=len(choices)):
+            self._render_choices(choices, enabled)
+
+    def _render_choices(self, choices, enabled):
         # Initialiser la taille de police des choix si nécessaire (augmentée de +2)
         if not hasattr(self, 'choices_font_size'):
             self.choices_font_size = 14
@@ -460,7 +651,8 @@ class RPGApp(AsyncioTk):
                     self.choices_frame, 
                     text=choice_text, 
                     command=lambda c=choice_text: self.run_async(self.on_choice_click(c)),
-                    font=("Arial", self.choices_font_size)
+                    font=("Arial", self.choices_font_size),
+                    state="normal" if enabled else "disabled"
                 )
                 b.pack(pady=6, padx=10, fill="x")
         else:
@@ -472,13 +664,13 @@ class RPGApp(AsyncioTk):
                 font=("Arial", self.choices_font_size)
             )
             b.pack(pady=6, padx=10, fill="x")
-        logging.debug(f"Updated UI with {len(choices)} choices.")
+        logging.debug("Updated UI with %s choices.", len(choices))
 
     def _handle_ai_initialization_error(self, error):
         """Handle AI initialization errors gracefully"""
         self.ai_available = False
         error_msg = f"[ERREUR CRITIQUE] Impossible d'initialiser l'IA: {error}"
-        logging.critical(f"AI initialization failed: {error}", exc_info=True)
+        logging.critical("AI initialization failed: %s", error, exc_info=True)
         
         # Show error in UI
         self.display_log(error_msg)
@@ -520,7 +712,7 @@ class RPGApp(AsyncioTk):
 
     def _handle_ai_error(self, error):
         """Handle AI errors gracefully during gameplay"""
-        logging.error(f"AI error during gameplay: {error}", exc_info=True)
+        logging.error("AI error during gameplay: %s", error, exc_info=True)
         self.display_log(f"[ERREUR IA] {error}")
         
         # Show error in choices area
@@ -544,7 +736,7 @@ class RPGApp(AsyncioTk):
         if not self._check_ai_available():
             return
             
-        logging.info(f"User chose: '{choice}'")
+        logging.info("User chose: '%s'", choice)
         self.display_log(f"▶ Choix : {choice}")
         # Show loading indicator
         self._show_loading_indicator("L'IA réfléchit...")
@@ -557,14 +749,31 @@ class RPGApp(AsyncioTk):
 
     # --- Save/Load Management ---
     def get_save_files(self):
-        return [f for f in os.listdir(dm.SAVE_DIR) if f.endswith(".json")]
+        return [os.path.basename(self.save_catalog.path_of(entry["name"])) for entry in self.save_catalog.list_saves()]
+
+    @staticmethod
+    def _save_label(entry):
+        details = [entry["hero_name"] or "?", entry["universe"] or "univers inconnu", f"{entry['turns']} tours"]
+        played = time.strftime("%d/%m/%Y %H:%M", time.localtime(entry["updated"]))
+        return f"{entry['name']} — {', '.join(details)} — {played}"
 
     def update_load_menu(self):
-        saves = self.get_save_files() or ["Aucune sauvegarde"]
-        self.load_menu.configure(values=saves)
-        self.load_menu_var.set(saves[0])
+        saves = self.save_catalog.list_saves(
+            search=self.save_search_entry.get().strip(),
+            order_by=SAVE_SORT_OPTIONS.get(self.save_sort_var.get(), "updated"),
+            limit=MAX_LISTED_SAVES
+        )
+        self._save_labels = {self._save_label(entry): entry["name"] for entry in saves}
+        labels = list(self._save_labels) or ["Aucune sauvegarde"]
+        self.load_menu.configure(values=labels)
+        self.load_menu_var.set(labels[0])
         logging.debug("Load menu updated.")
 
+    def _selected_save_path(self):
+        """Path of the save selected in the Saves tab, or None"""
+        name = self._save_labels.get(self.load_menu_var.get())
+        return self.save_catalog.path_of(name) if name else None
+
     def save_game(self):
         if not self.game_engine.story_log:
             self.display_log("[INFO] Impossible de sauvegarder une partie non commencée.")
@@ -572,34 +781,54 @@ class RPGApp(AsyncioTk):
             return
         save_name = simpledialog.askstring("Sauvegarder", "Nom de la sauvegarde :")
         if save_name:
-            logging.info(f"User is saving the game as '{save_name}'.")
-            save_data = self.game_engine.get_save_data()
-            dm.save_json(os.path.join(dm.SAVE_DIR, f"{save_name}.json"), save_data)
-            self.display_log(f"[INFO] Partie sauvegardée sous : {save_name}")
-            self.update_load_menu()
+            self.run_async(self._write_save(save_name))
         else:
             logging.info("User cancelled the save dialog.")
 
-    def load_game(self):
-        save_name = self.load_menu_var.get()
-        if save_name == "Aucune sauvegarde": return
-        logging.info(f"User is loading game: '{save_name}'")
-        file_path = os.path.join(dm.SAVE_DIR, save_name)
+    async def _write_save(self, save_name):
+        logging.info("User is saving the game as '%s'.", save_name)
+        journal = SaveJournal(os.path.join(dm.SAVE_DIR, f"{save_name}{dm.SAVE_EXTENSION}"))
+        try:
+            # Instantané écrit hors de la boucle ; un tour joué pendant l'écriture ira dans le journal
+            await journal.compact_async(self.game_engine.get_save_data())
+        except OSError as e:
+            self.display_log(f"[ERREUR] Impossible de sauvegarder la partie : {e}")
+            logging.error("Failed to save '%s': %s", save_name, e, exc_info=True)
+            return
+        # La sauvegarde devient la cible de la sauvegarde automatique des tours suivants
+        journal.catalog = self.save_catalog
+        self.session.attach_journal(journal, compacted=True)
+        self.session.autosave()
+        try:
+            self.save_catalog.record(journal.path, self.game_engine.get_save_data())
+        except Exception as e:
+            logging.error("Could not update the save catalog for %s: %s", journal.path, e)
+        self.display_log(f"[INFO] Partie sauvegardée sous : {save_name}")
+        self.update_load_menu()
+
+    async def load_game(self):
+        file_path = self._selected_save_path()
+        if file_path is None: return
+        save_name = self.save_catalog.name_of(file_path)
+        logging.info("User is loading game: '%s'", save_name)
         try:
-            save_data = dm.load_json(file_path, None)
+            save_data = await dm.run_io(SaveJournal.read, file_path)
             if save_data is None:
                 self.display_log(f"[ERREUR] Sauvegarde '{save_name}' vide ou corrompue.")
-                logging.error(f"Save file '{save_name}' is empty or corrupted.")
+                logging.error("Save file '%s' is empty or corrupted.", save_name)
                 return
-            
-            self.game_engine.load_game_state(save_data)
-
-            self.text.configure(state="normal")
-            self.text.delete("1.0", "end")
-            # Re-populate the story display from the loaded log
-            for message in self.game_engine.story_log:
-                if message["role"] == "assistant":
-                    self.display_log(self.game_engine.extract_choices(message["content"])[0])
+            journal = SaveJournal(file_path, catalog=self.save_catalog)
+            await dm.run_io(journal.open)
+
+            self.session.load(save_data)
+            self.session.attach_journal(journal)
+
+            # Re-populate the story display with the last turns of the loaded log
+            narratives = self.game_engine.get_narratives(limit=MAX_RENDERED_TURNS)
+            if len(narratives) == MAX_RENDERED_TURNS:
+                narratives.insert(0, "[INFO] Tours précédents masqués (onglet Sauvegardes > Afficher tout l'historique).")
+            self.render_transcript(narratives)
+            self.update_token_label()
             
             # Set up the next choices
             narrative, choices = self.game_engine.get_last_narrative_and_choices()
@@ -607,19 +836,32 @@ class RPGApp(AsyncioTk):
                 self.update_choices(choices)
 
             self.display_log(f"[INFO] Partie '{save_name}' chargée.")
-            logging.info(f"Game '{save_name}' loaded successfully. World state: {self.game_engine.world_state}")
+            logging.info("Game '%s' loaded successfully. World state: %s", save_name, self.game_engine.world_state)
         except Exception as e:
             self.display_log(f"[ERREUR] Impossible de charger la sauvegarde : {e}")
-            logging.error(f"Failed to load save '{save_name}': {e}", exc_info=True)
+            logging.error("Failed to load save '%s': %s", save_name, e, exc_info=True)
+
+    def show_full_history(self):
+        """Render every turn of the current story (older turns are loaded from the save on demand)"""
+        self.render_transcript(self.game_engine.get_narratives())
 
     def delete_save(self):
-        save_name = self.load_menu_var.get()
-        if save_name == "Aucune sauvegarde": return
-        logging.info(f"User is deleting save: '{save_name}'")
+        file_path = self._selected_save_path()
+        if file_path is None: return
+        save_name = self.save_catalog.name_of(file_path)
+        logging.info("User is deleting save: '%s'", save_name)
         try:
-            os.remove(os.path.join(dm.SAVE_DIR, save_name))
+            if self.session.journal and os.path.abspath(self.session.journal.path) == os.path.abspath(file_path):
+                self.session.attach_journal(None)
+                if hasattr(self.game_engine.story_log, "materialize"):
+                    # La partie en cours lit encore ses anciens tours dans ce fichier
+                    self.game_engine.story_log.materialize()
+            os.remove(file_path)
+            if os.path.exists(journal_path(file_path)):
+                os.remove(journal_path(file_path))
+            self.save_catalog.remove(file_path)
             self.display_log(f"[INFO] Sauvegarde '{save_name}' supprimée.")
             self.update_load_menu()
         except Exception as e:
             self.display_log(f"[ERREUR] Impossible de supprimer la sauvegarde : {e}")
-            logging.error(f"Failed to delete save '{save_name}': {e}", exc_info=True)
\ No newline at end of file
+            logging.error("Failed to delete save '%s': %s", save_name, e, exc_info=True)
\ No newline at end of file
@@ -1,9 +1,50 @@
-import logging
 import os
-from logging.handlers import RotatingFileHandler
+import json
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+
+from .tracing import tracer
+
+# Réglages relus par setup_logging(), une fois le .env chargé
+# Niveau minimal des journaux ; les appels en dessous ne coûtent qu'un test de niveau
+LOG_LEVEL = "INFO"
+# Requêtes et réponses complètes de l'IA : niveau, taille maximale et fraction journalisée
+LOG_PAYLOAD_LEVEL = "DEBUG"
+LOG_PAYLOAD_MAX_CHARS = 2000
+LOG_PAYLOAD_SAMPLE_RATE = 1.0
+
+
+def _read_settings():
+    global LOG_LEVEL, LOG_PAYLOAD_LEVEL, LOG_PAYLOAD_MAX_CHARS, LOG_PAYLOAD_SAMPLE_RATE
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_PAYLOAD_LEVEL = os.getenv("LOG_PAYLOAD_LEVEL", "DEBUG").upper()
+    LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+
+_read_settings()
+
+_listener: QueueListener | None = None
+_encoder = json.JSONEncoder(ensure_ascii=False, default=str)
+
 
 def setup_logging():
-    """Configure the logging for the application."""
+    """Configure the logging for the application.
+
+    Records are put on a queue by the calling thread and written to the
+    rotating file and the console by a listener thread, so a turn never
+    waits on disk I/O. LOG_* and TRACE_* settings are read here, after
+    loading `.env`.
+    """
+    global _listener
+    load_dotenv()
+    _read_settings()
+    tracer.configure_from_env()
     log_dir = 'logs'
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -12,12 +53,14 @@ def setup_logging():
 
     # Configure root logger
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(LOG_LEVEL)
 
     # Prevent logging from propagating to the root logger's default handlers
     logger.propagate = False
 
     # Remove existing handlers to avoid duplicates
+    if _listener is not None:
+        _listener.stop()
     if logger.hasHandlers():
         logger.handlers.clear()
 
@@ -28,20 +71,78 @@ def setup_logging():
     file_handler.setLevel(logging.DEBUG)
     file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO) # Show only INFO and above on console
     console_formatter = logging.Formatter('%(levelname)s: %(message)s')
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+
+    # Les handlers lents tournent dans le thread du listener
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
 
     logging.info("Logger has been configured.")
 
+
+def stop_logging():
+    """Write the queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class PayloadPreview:
+    """A payload rendered as truncated JSON, only when a handler formats it"""
+
+    __slots__ = ("payload", "max_chars")
+
+    def __init__(self, payload, max_chars: int | None = None):
+        self.payload = payload
+        self.max_chars = LOG_PAYLOAD_MAX_CHARS if max_chars is None else max_chars
+
+    def __str__(self):
+        if isinstance(self.payload, bytes):
+            text = self.payload[:self.max_chars * 4 if self.max_chars else None].decode("utf-8", "replace")
+        elif isinstance(self.payload, str):
+            text = self.payload
+        else:
+            # Encodage par morceaux : on s'arrête dès que la limite est atteinte
+            chunks, size = [], 0
+            for chunk in _encoder.iterencode(self.payload):
+                chunks.append(chunk)
+                size += len(chunk)
+                if self.max_chars and size > self.max_chars:
+                    break
+            text = "".join(chunks)
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... [truncated]"
+        return text
+
+
+def log_payload(message: str, payload, logger: logging.Logger | None = None):
+    """Log a large request/response at LOG_PAYLOAD_LEVEL, truncated and sampled.
+
+    `message` gets the preview through a single `%s`. Nothing is serialized
+    when the level is disabled or the call is not sampled.
+    """
+    logger = logger or logging.getLogger()
+    level = logging.getLevelName(LOG_PAYLOAD_LEVEL)
+    if not isinstance(level, int) or not logger.isEnabledFor(level):
+        return
+    if LOG_PAYLOAD_SAMPLE_RATE < 1.0 and random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    logger.log(level, message, PayloadPreview(payload))
+
+
 if __name__ == '__main__':
     setup_logging()
     logging.debug("This is a debug message for the file.")
     logging.info("This is an info message for console and file.")
     logging.warning("This is a warning.")
-    logging.error("This is an error.")
\ No newline at end of file
+    logging.error("This is an error.")
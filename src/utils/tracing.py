@@ -0,0 +1,181 @@
+"""
+Turn tracing - timed spans per stage, kept in rolling windows and written as JSONL
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import itertools
+import contextlib
+import contextvars
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+# Valeurs lues à l'import ; Tracer.configure_from_env() les relit une fois le .env chargé (setup_logging)
+# Fichier JSONL des spans, sur demande (ex. logs/trace.jsonl) ; par défaut seulement les fenêtres en mémoire
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Taille d'un fichier de trace avant rotation, et nombre d'anciens fichiers gardés
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10*1024*1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "2"))
+# Nombre de mesures gardées par étape pour les percentiles
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "500"))
+
+# Étapes d'un tour, dans l'ordre où elles se produisent (les requêtes de fond ont un suffixe, ex. "network.background")
+TURN_STAGES = (
+    "turn", "prompt_build", "context_window", "generate", "payload", "payload_encode", "queue", "ttfb",
+    "network", "json_decode", "retry", "extract_choices", "background_start", "autosave", "render_log", "render_choices",
+)
+
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("trace_turn", default=None)
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Tracer:
+    """
+    Records how long each stage of a turn takes.
+
+    `span(stage)` times a block (sync or async code alike) and tags it with
+    the current turn, opened by `turn()`: asyncio tasks started inside a turn
+    inherit it through contextvars. Durations are kept per stage in a rolling
+    window of the last `window` measurements, from which `stats()` computes
+    p50/p95, and, when a `path` is set, written as one JSON object per line
+    to that rotating file by a listener thread, so tracing never blocks the
+    event loop on disk I/O.
+    """
+
+    def __init__(self, path: str | None = TRACE_FILE or None, window: int = TRACE_WINDOW,
+                 max_bytes: int = TRACE_MAX_BYTES, backup_count: int = TRACE_BACKUP_COUNT):
+        self.path = path
+        self.window = window
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = True
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self._turn_ids = itertools.count(1)
+        self._logger: logging.Logger | None = None
+        self._listener: QueueListener | None = None
+
+    def configure_from_env(self):
+        """Re-read the TRACE_* environment variables (e.g. after loading `.env`)"""
+        path = os.getenv("TRACE_FILE") or None
+        if path != self.path:
+            self.close()
+            self.path = path
+        self.max_bytes = int(os.getenv("TRACE_MAX_BYTES", str(self.max_bytes)))
+        self.backup_count = int(os.getenv("TRACE_BACKUP_COUNT", str(self.backup_count)))
+        window = int(os.getenv("TRACE_WINDOW", str(self.window)))
+        if window != self.window:
+            self.window = window
+            self._samples = {stage: deque(samples, maxlen=window) for stage, samples in self._samples.items()}
+
+    # --- Recording ---
+    @contextlib.contextmanager
+    def turn(self, **attrs):
+        """Group the spans recorded inside under one turn id (nested calls join the open turn).
+
+        Yields the attributes of the "turn" span, so the caller can add to them.
+        """
+        current = _current_turn.get()
+        if current is not None:
+            current[1].update(attrs)
+            yield current[1]
+            return
+        token = _current_turn.set((next(self._turn_ids), attrs))
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            self.record("turn", (time.perf_counter() - start) * 1000, **attrs)
+            _current_turn.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, stage: str, **attrs):
+        """Time the enclosed block as `stage`; `attrs` go to the trace file"""
+        if not self.enabled:
+            yield attrs
+            return
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000, **attrs)
+
+    def record(self, stage: str, duration_ms: float, **attrs):
+        """Add a measurement taken elsewhere (e.g. summed over a stream)"""
+        if not self.enabled:
+            return
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+        samples.append(duration_ms)
+        self._counts[stage] = self._counts.get(stage, 0) + 1
+        if self.path:
+            current = _current_turn.get()
+            event = {"ts": round(time.time(), 3), "turn": current and current[0], "stage": stage, "ms": round(duration_ms, 3)}
+            event.update(attrs)
+            self._file_logger().info(json.dumps(event, ensure_ascii=False, default=str))
+
+    # --- Statistics ---
+    def stats(self) -> dict[str, dict]:
+        """{stage: {count, p50, p95, max}} over each stage's rolling window, in ms"""
+        stats = {}
+        for stage, samples in list(self._samples.items()):
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            stats[stage] = {
+                "count": self._counts[stage],
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95),
+                "max": ordered[-1],
+            }
+        return stats
+
+    def reset(self):
+        self._samples.clear()
+        self._counts.clear()
+
+    # --- Trace file ---
+    def _file_logger(self) -> logging.Logger:
+        if self._logger is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            log_queue = queue.SimpleQueue()
+            self._listener = QueueListener(log_queue, handler)
+            self._listener.start()
+            atexit.register(self.close)
+            # Logger à part : les spans ne passent ni par le niveau ni par les handlers de l'application
+            logger = logging.getLogger(f"{__name__}.{id(self)}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(QueueHandler(log_queue))
+            self._logger = logger
+        return self._logger
+
+    def close(self):
+        """Write the queued spans and stop the trace file thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._logger is not None:
+            self._logger.handlers.clear()
+            self._logger = None
+
+
+# Traceur partagé par le moteur, le client IA et l'interface
+tracer = Tracer()
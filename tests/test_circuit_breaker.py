@@ -0,0 +1,30 @@
+from src.services.retry_policy import CircuitBreaker
+
+
+def test_non_tripping_failure_does_not_close_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+    breaker.record_failure("server")
+    breaker.record_failure("server")
+    assert breaker.state == "open"
+
+    breaker.record_failure("safety")
+
+    assert breaker.state == "open"
+    assert breaker.failures == 2
+
+
+def test_non_tripping_failure_keeps_half_open_and_consecutive_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.0)
+    breaker.record_failure("timeout")
+    breaker.record_failure("malformed")
+    assert breaker.failures == 1
+
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    breaker.before_request()
+    assert breaker.state == "half_open"
+
+    breaker.record_failure("max_tokens")
+    assert breaker.state == "half_open"
+    # La sonde terminée laisse passer la suivante
+    breaker.before_request()
@@ -0,0 +1,71 @@
+import os
+
+from src.services.save_catalog import SaveCatalog
+from src.services.save_journal import SaveJournal, journal_path
+
+
+def _save_data(turns: int) -> dict:
+    story_log = [{"role": "system", "content": "Aventure de Tim."}]
+    for turn in range(turns):
+        story_log.append({"role": "user", "content": f"Choix {turn}"})
+        story_log.append({"role": "assistant", "content": f"Tour {turn}.\n1. a\n2. b\n3. c\n4. d"})
+    return {"story_log": story_log, "hero_name": "Tim", "metadata": {"universe": "Fantasy", "style": "épique"}}
+
+
+def _play(save_path: str, save_data: dict, turns: int, catalog=None):
+    """Autosave `turns` more turns of `save_data` to its journal"""
+    journal = SaveJournal(save_path, catalog=catalog)
+    journal.attach(save_data)
+    for turn in range(turns):
+        save_data["story_log"] = save_data["story_log"] + [
+            {"role": "user", "content": f"Suite {turn}"},
+            {"role": "assistant", "content": f"Suite {turn}.\n1. a\n2. b\n3. c\n4. d"},
+        ]
+        journal.record(save_data)
+    journal.close()
+
+
+def test_refresh_reads_only_the_journal_records_past_the_stored_offset(tmp_path, monkeypatch):
+    save_path = str(tmp_path / "partie.json")
+    catalog = SaveCatalog(str(tmp_path))
+    save_data = _save_data(3)
+    journal = SaveJournal(save_path, catalog=catalog)
+    journal.compact(save_data)
+    journal.close()
+    _play(save_path, save_data, 2, catalog)
+    [entry] = catalog.list_saves()
+    assert entry["turns"] == 5
+    offset = catalog._db.execute("SELECT journal_offset FROM saves").fetchone()[0]
+    assert offset == os.path.getsize(journal_path(save_path))
+
+    # Tours joués sans catalogue (autre processus) : seul le journal a grandi
+    _play(save_path, save_data, 4)
+    monkeypatch.setattr(SaveJournal, "read", staticmethod(lambda path: None))
+    catalog.refresh()
+
+    [entry] = catalog.list_saves()
+    assert entry["turns"] == 9
+    assert entry["messages"] == len(save_data["story_log"])
+    assert catalog._db.execute("SELECT journal_offset FROM saves").fetchone()[0] == os.path.getsize(journal_path(save_path))
+    catalog.close()
+
+
+def test_refresh_rereads_a_save_whose_journal_truncated_turns(tmp_path):
+    save_path = str(tmp_path / "partie.json")
+    catalog = SaveCatalog(str(tmp_path))
+    save_data = _save_data(3)
+    journal = SaveJournal(save_path, catalog=catalog)
+    journal.compact(save_data)
+    journal.close()
+
+    # Tour regénéré hors catalogue : le journal tronque puis réécrit
+    journal = SaveJournal(save_path)
+    journal.attach(save_data)
+    save_data["story_log"] = save_data["story_log"][:-2]
+    journal.record(save_data)
+    journal.close()
+    catalog.refresh()
+
+    [entry] = catalog.list_saves()
+    assert entry["turns"] == 2
+    catalog.close()
@@ -0,0 +1,47 @@
+import asyncio
+
+from src.core.story_session import StorySession
+from src.services.ai_service import AIResponse, AIClient
+
+NARRATIVE = "Tim pousse la porte de la taverne. " * 6 + "Au fond de la salle, une silhouette encapuchonnée lève les"
+
+
+class FakeAI:
+    """Client that returns its scripted responses in order and records the requests"""
+
+    light_model = "light"
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def complete(self, messages, **kwargs):
+        self.requests.append((messages, kwargs))
+        return self.responses.pop(0)
+
+
+def test_max_tokens_keeps_partial_text():
+    client = AIClient.__new__(AIClient)
+    result = {"candidates": [{"finishReason": "MAX_TOKENS", "content": {"parts": [{"text": NARRATIVE}]}}]}
+
+    assert client._extract_response_content(result) == (NARRATIVE, "MAX_TOKENS")
+
+
+def test_truncated_turn_is_continued_instead_of_regenerated():
+    ai = FakeAI(
+        AIResponse(NARRATIVE + "\n\n1. Saluer l'inconnu\n2. Comman", finish_reason="MAX_TOKENS"),
+        AIResponse("yeux vers lui.\n\n1. Saluer l'inconnu\n2. Commander à boire\n3. Sortir\n4. Attendre"),
+    )
+    session = StorySession(ai)
+    session.new_game("Tim", "Aventure de {hero_name}.", "")
+
+    text, choices = asyncio.run(session.play_turn("Entrer dans la taverne"))
+
+    assert text == NARRATIVE + " yeux vers lui."
+    assert choices == ["Saluer l'inconnu", "Commander à boire", "Sortir", "Attendre"]
+    assert session.repair_stats["truncated"] == 1
+    assert session.repair_stats["full_retry"] == 0
+    # Une seule requête de suite, bornée, après la réponse tronquée
+    assert len(ai.requests) == 2
+    assert NARRATIVE in ai.requests[1][0][0]["content"]
+    assert session.engine.story_log[-1]["content"].startswith(NARRATIVE + " yeux vers lui.")
@@ -0,0 +1,39 @@
+from src.core.engine import MAX_WORLD_FACTS, GameEngine
+
+
+def _engine_with_turns(turns: int = 200) -> GameEngine:
+    engine = GameEngine()
+    engine.add_system_message("Aventure fantasy avec Tim.")
+    for turn in range(turns):
+        engine.add_user_message(f"Choix {turn} : " + "avancer prudemment " * 10)
+        engine.add_assistant_message(f"Tour {turn}. " + "Le vent souffle sur la plaine. " * 20)
+    return engine
+
+
+def _story_messages(messages) -> int:
+    return sum(1 for message in messages if message["role"] != "system")
+
+
+def test_many_facts_leave_room_for_recent_turns():
+    baseline = _story_messages(_engine_with_turns().build_request_messages())
+
+    engine = _engine_with_turns()
+    for batch in range(40):
+        engine.update_world_state_from_facts(
+            "\n".join(f"PNJ {batch}-{n}: marchand du port, doit une faveur à Tim" for n in range(20))
+        )
+    messages = engine.build_request_messages()
+
+    assert len(engine.world_state) == MAX_WORLD_FACTS
+    assert _story_messages(messages) >= 0.75 * baseline
+    facts = next(m["content"] for m in messages if m["content"].startswith("Faits établis:"))
+    # Les faits les plus récents sont gardés
+    assert "PNJ 39-19:" in facts
+
+
+def test_updated_fact_is_deduplicated_and_kept_as_most_recent():
+    engine = GameEngine()
+    engine.update_world_state_from_facts("Elara: forgeronne\nPort: ville marchande")
+    engine.update_world_state_from_facts("elara: reine en exil")
+
+    assert list(engine.world_state.items()) == [("Port", "ville marchande"), ("elara", "reine en exil")]